@@ -13,8 +13,12 @@ from app.core.db import db_dsn
 from app.users.models import User
 from app.users.enum import UserRole
 from app.cart.models import Cart, CartItem
-from app.catalog.models import Product, Category
+from app.catalog.models import Product, Category, ProductPriceHistory
 from app.reviews.models import Review
+from app.core.tasks import BackgroundTask
+from app.core.idempotency import IdempotencyKey
+from app.events.models import OutboxEvent, ConsumerOffset
+from app.orders.models import Order, OrderItem
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,33 @@
+"""add order search indexes
+
+Revision ID: 0a6e3f9b2d17
+Revises: f5d1a7c3e924
+Create Date: 2026-03-03 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6e3f9b2d17'
+down_revision: Union[str, Sequence[str], None] = 'f5d1a7c3e924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_orders_shipping_address_trgm', 'orders', ['shipping_address'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'shipping_address': 'gin_trgm_ops'})
+    op.create_index('ix_orders_phone_number_trgm', 'orders', ['phone_number'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'phone_number': 'gin_trgm_ops'})
+    op.create_index('ix_order_items_product_id', 'order_items', ['product_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_items_product_id', table_name='order_items')
+    op.drop_index('ix_orders_phone_number_trgm', table_name='orders')
+    op.drop_index('ix_orders_shipping_address_trgm', table_name='orders')
@@ -0,0 +1,184 @@
+"""partition orders and order_items by month
+
+Revision ID: 1b7f4c2e8a05
+Revises: 0a6e3f9b2d17
+Create Date: 2026-03-10 12:00:00.000000
+
+Таблицы пересоздаются секционированными (RANGE по месяцу created_at заказа),
+строки копируются INSERT ... SELECT. На больших таблицах - в окно обслуживания:
+миграция держит блокировку orders/order_items до конца копирования.
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '1b7f4c2e8a05'
+down_revision: Union[str, Sequence[str], None] = '0a6e3f9b2d17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# партиции создаются на столько месяцев вперёд, дальше их ведёт PartitionMaintainer
+PREMAKE_MONTHS = 3
+
+ORDER_COLUMNS = (
+    'id, user_id, status, total_amount, shipping_address, phone_number, notes, '
+    'ordered_at, created_at, updated_at'
+)
+ITEM_COLUMNS = 'id, order_id, product_id, quantity, price_at_time, product_name, created_at, updated_at'
+
+# копии из app.orders.partitions на момент ревизии: миграция не зависит от кода приложения
+PARTITIONED_TABLES = ('orders', 'order_items')
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_partition_ddl(table: str, month: date) -> str:
+    return (
+        f'CREATE TABLE IF NOT EXISTS {table}_{month:%Y_%m} PARTITION OF {table} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    )
+
+
+def _default_partition_ddl(table: str) -> str:
+    return f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT'
+
+
+def _status_enum():
+    return postgresql.ENUM('PENDING', 'PROCESSING', 'SHIPPED', 'DELIVERED', 'CANCELLED',
+                           name='order_status_enum', create_type=False)
+
+
+def _create_indexes() -> None:
+    op.create_index('ix_orders_user_id_created_at_id', 'orders', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_orders_status_created_at_id', 'orders', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_orders_shipping_address_trgm', 'orders', ['shipping_address'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'shipping_address': 'gin_trgm_ops'})
+    op.create_index('ix_orders_phone_number_trgm', 'orders', ['phone_number'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'phone_number': 'gin_trgm_ops'})
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'], unique=False)
+    op.create_index('ix_order_items_product_id', 'order_items', ['product_id'], unique=False)
+
+
+def _move_aside(suffix: str) -> None:
+    """Переименовать текущие таблицы; имена индексов и первичных ключей освобождаются"""
+    for index, table in (
+            ('ix_order_items_product_id', 'order_items'),
+            ('ix_order_items_order_id', 'order_items'),
+            ('ix_orders_phone_number_trgm', 'orders'),
+            ('ix_orders_shipping_address_trgm', 'orders'),
+            ('ix_orders_status_created_at_id', 'orders'),
+            ('ix_orders_user_id_created_at_id', 'orders'),
+    ):
+        op.drop_index(index, table_name=table)
+    for table in ('order_items', 'orders'):
+        op.rename_table(table, f'{table}_{suffix}')
+        op.execute(f'ALTER TABLE {table}_{suffix} RENAME CONSTRAINT {table}_pkey TO {table}_{suffix}_pkey')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _move_aside('unpartitioned')
+
+    op.create_table('orders',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('status', _status_enum(), nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('shipping_address', sa.String(), nullable=False),
+    sa.Column('phone_number', sa.String(), nullable=False),
+    sa.Column('notes', sa.String(), nullable=True),
+    sa.Column('ordered_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id', 'created_at', name='orders_pkey'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    # без внешнего ключа на orders: DETACH PARTITION не должен проверять позиции
+    op.create_table('order_items',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('order_id', sa.UUID(), nullable=False),
+    sa.Column('order_created_at', sa.DateTime(), nullable=False),
+    sa.Column('product_id', sa.UUID(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price_at_time', sa.Float(), nullable=False),
+    sa.Column('product_name', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id', 'order_created_at', name='order_items_pkey'),
+    postgresql_partition_by='RANGE (order_created_at)'
+    )
+
+    first, last = op.get_bind().execute(
+        sa.text('SELECT min(created_at), max(created_at) FROM orders_unpartitioned')
+    ).one()
+    current = _month_start(datetime.utcnow().date())
+    month = _month_start(first.date()) if first else current
+    last_month = _add_months(max(_month_start(last.date()) if last else current, current), PREMAKE_MONTHS)
+    for table in PARTITIONED_TABLES:
+        op.execute(_default_partition_ddl(table))
+    while month <= last_month:
+        for table in PARTITIONED_TABLES:
+            op.execute(_create_partition_ddl(table, month))
+        month = _add_months(month, 1)
+
+    op.execute(f'INSERT INTO orders ({ORDER_COLUMNS}) SELECT {ORDER_COLUMNS} FROM orders_unpartitioned')
+    op.execute(
+        f'INSERT INTO order_items ({ITEM_COLUMNS}, order_created_at) '
+        f'SELECT {", ".join("i." + c for c in ITEM_COLUMNS.split(", "))}, o.created_at '
+        'FROM order_items_unpartitioned i JOIN orders_unpartitioned o ON o.id = i.order_id'
+    )
+    op.drop_table('order_items_unpartitioned')
+    op.drop_table('orders_unpartitioned')
+    _create_indexes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _move_aside('partitioned')
+
+    op.create_table('orders',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('status', _status_enum(), nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('shipping_address', sa.String(), nullable=False),
+    sa.Column('phone_number', sa.String(), nullable=False),
+    sa.Column('notes', sa.String(), nullable=True),
+    sa.Column('ordered_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('order_items',
+    sa.Column('order_id', sa.UUID(), nullable=False),
+    sa.Column('product_id', sa.UUID(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price_at_time', sa.Float(), nullable=False),
+    sa.Column('product_name', sa.String(), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f'INSERT INTO orders ({ORDER_COLUMNS}) SELECT {ORDER_COLUMNS} FROM orders_partitioned')
+    op.execute(f'INSERT INTO order_items ({ITEM_COLUMNS}) SELECT {ITEM_COLUMNS} FROM order_items_partitioned')
+    # партиции удаляются вместе с родительскими таблицами
+    op.drop_table('order_items_partitioned')
+    op.drop_table('orders_partitioned')
+    _create_indexes()
@@ -0,0 +1,29 @@
+"""add cart sweep indexes
+
+Revision ID: 2d9a5e1c7b34
+Revises: 1b7f4c2e8a05
+Create Date: 2026-03-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '2d9a5e1c7b34'
+down_revision: Union[str, Sequence[str], None] = '1b7f4c2e8a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_carts_status_updated_at', 'carts', ['status', 'updated_at'], unique=False)
+    # заодно - индекс для ON DELETE CASCADE с carts: без него каждая удалённая корзина читает cart_items целиком
+    op.create_index('ix_cart_items_cart_id_updated_at', 'cart_items', ['cart_id', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_cart_items_cart_id_updated_at', table_name='cart_items')
+    op.drop_index('ix_carts_status_updated_at', table_name='carts')
@@ -0,0 +1,41 @@
+"""unique cart item per product
+
+Revision ID: 3e8b6f2a9c41
+Revises: 2d9a5e1c7b34
+Create Date: 2026-03-24 12:00:00.000000
+
+Повторы одного товара в корзине (гонка двух добавлений) сливаются
+в старейшую строку с суммой количеств, затем создаётся уникальный индекс.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3e8b6f2a9c41'
+down_revision: Union[str, Sequence[str], None] = '2d9a5e1c7b34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        'WITH ranked AS ('
+        ' SELECT id, sum(quantity) OVER w AS total, row_number() OVER (w ORDER BY created_at, id) AS rn'
+        ' FROM cart_items WINDOW w AS (PARTITION BY cart_id, product_id))'
+        ' UPDATE cart_items c SET quantity = r.total FROM ranked r'
+        ' WHERE c.id = r.id AND r.rn = 1 AND r.total <> c.quantity'
+    )
+    op.execute(
+        'DELETE FROM cart_items c USING ('
+        ' SELECT id, row_number() OVER (PARTITION BY cart_id, product_id ORDER BY created_at, id) AS rn'
+        ' FROM cart_items) r'
+        ' WHERE c.id = r.id AND r.rn > 1'
+    )
+    op.create_index('uq_cart_items_cart_id_product_id', 'cart_items', ['cart_id', 'product_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_cart_items_cart_id_product_id', table_name='cart_items')
@@ -0,0 +1,34 @@
+"""add product sku
+
+Revision ID: 3f2a9c1d7b40
+Revises: 0cb8d9ab4e6e
+Create Date: 2026-01-20 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c1d7b40'
+down_revision: Union[str, Sequence[str], None] = '0cb8d9ab4e6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'products',
+        sa.Column('sku', sa.String(length=64), nullable=True,
+                  comment='Артикул поставщика, ключ массового импорта')
+    )
+    op.create_unique_constraint('products_sku_key', 'products', ['sku'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('products_sku_key', 'products', type_='unique')
+    op.drop_column('products', 'sku')
@@ -0,0 +1,31 @@
+"""add promotion validity indexes
+
+Revision ID: 4f1c8d3b6e52
+Revises: 3e8b6f2a9c41
+Create Date: 2026-03-31 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '4f1c8d3b6e52'
+down_revision: Union[str, Sequence[str], None] = '3e8b6f2a9c41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # уже закончившиеся акции выключаются сразу, дальше это делает PromotionScheduler
+    op.execute('UPDATE promotions SET is_active = false WHERE is_active AND ends_at < now() AT TIME ZONE \'utc\'')
+    op.create_index('ix_promotions_is_active_starts_at_ends_at', 'promotions',
+                    ['is_active', 'starts_at', 'ends_at'], unique=False)
+    op.create_index('ix_promotions_ends_at', 'promotions', ['ends_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_promotions_ends_at', table_name='promotions')
+    op.drop_index('ix_promotions_is_active_starts_at_ends_at', table_name='promotions')
@@ -0,0 +1,33 @@
+"""outbox published_seq sequence
+
+Revision ID: 6a2d9e4f1b73
+Revises: 4f1c8d3b6e52
+Create Date: 2026-04-07 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '6a2d9e4f1b73'
+down_revision: Union[str, Sequence[str], None] = '4f1c8d3b6e52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(sa.schema.CreateSequence(sa.Sequence('outbox_published_seq')))
+    # нумерация продолжается с уже выданных номеров
+    op.execute(
+        "SELECT setval('outbox_published_seq', "
+        "greatest(coalesce(max(published_seq), 0), 1), max(published_seq) IS NOT NULL) "
+        "FROM outbox_events"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(sa.schema.DropSequence(sa.Sequence('outbox_published_seq')))
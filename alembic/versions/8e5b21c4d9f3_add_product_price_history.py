@@ -0,0 +1,90 @@
+"""add product price history
+
+Revision ID: 8e5b21c4d9f3
+Revises: 3f2a9c1d7b40
+Create Date: 2026-01-27 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e5b21c4d9f3'
+down_revision: Union[str, Sequence[str], None] = '3f2a9c1d7b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# секции по годам; всё, что за пределами, попадает в DEFAULT
+PARTITION_YEARS = range(2024, 2031)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('product_price_history',
+    sa.Column('product_id', sa.UUID(), nullable=False),
+    sa.Column('valid_from', sa.DateTime(), nullable=False),
+    sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('product_id', 'valid_from', name='product_price_history_pkey'),
+    postgresql_partition_by='RANGE (valid_from)'
+    )
+    for year in PARTITION_YEARS:
+        op.execute(
+            f"CREATE TABLE product_price_history_y{year} PARTITION OF product_price_history "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        )
+    op.execute("CREATE TABLE product_price_history_default PARTITION OF product_price_history DEFAULT")
+
+    # текущая цена существующих товаров - начальная точка истории
+    op.execute(
+        "INSERT INTO product_price_history (product_id, valid_from, price) "
+        "SELECT id, created_at, price FROM products"
+    )
+
+    op.execute("""
+    CREATE OR REPLACE FUNCTION record_product_price_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO product_price_history (product_id, valid_from, price)
+        SELECT n.id, clock_timestamp() AT TIME ZONE 'utc', n.price FROM new_rows n
+        ON CONFLICT (product_id, valid_from) DO UPDATE SET price = EXCLUDED.price;
+        RETURN NULL;
+    END
+    $$
+    """)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION record_product_price_update() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO product_price_history (product_id, valid_from, price)
+        SELECT n.id, clock_timestamp() AT TIME ZONE 'utc', n.price
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE o.price IS DISTINCT FROM n.price
+        ON CONFLICT (product_id, valid_from) DO UPDATE SET price = EXCLUDED.price;
+        RETURN NULL;
+    END
+    $$
+    """)
+    op.execute("""
+    CREATE TRIGGER products_price_history_insert
+        AFTER INSERT ON products
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION record_product_price_insert()
+    """)
+    op.execute("""
+    CREATE TRIGGER products_price_history_update
+        AFTER UPDATE ON products
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION record_product_price_update()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS products_price_history_update ON products")
+    op.execute("DROP TRIGGER IF EXISTS products_price_history_insert ON products")
+    op.execute("DROP FUNCTION IF EXISTS record_product_price_update()")
+    op.execute("DROP FUNCTION IF EXISTS record_product_price_insert()")
+    op.drop_table('product_price_history')
@@ -0,0 +1,36 @@
+"""add consumed guest carts
+
+Revision ID: 9b4e2f7a1c58
+Revises: 6a2d9e4f1b73
+Create Date: 2026-04-09 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e2f7a1c58'
+down_revision: Union[str, Sequence[str], None] = '6a2d9e4f1b73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('consumed_guest_carts',
+    sa.Column('token_id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('consumed_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('token_id')
+    )
+    op.create_index('ix_consumed_guest_carts_expires_at', 'consumed_guest_carts', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_consumed_guest_carts_expires_at', table_name='consumed_guest_carts')
+    op.drop_table('consumed_guest_carts')
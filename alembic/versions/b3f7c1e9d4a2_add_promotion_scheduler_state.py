@@ -0,0 +1,32 @@
+"""add promotion scheduler state
+
+Revision ID: b3f7c1e9d4a2
+Revises: 9b4e2f7a1c58
+Create Date: 2026-04-10 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f7c1e9d4a2'
+down_revision: Union[str, Sequence[str], None] = '9b4e2f7a1c58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # одна строка; появляется при первом проходе планировщика
+    op.create_table('promotion_scheduler_state',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('checked_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('promotion_scheduler_state')
@@ -0,0 +1,52 @@
+"""add outbox events
+
+Revision ID: d7a3f0b6c912
+Revises: c41d7e9a2b85
+Create Date: 2026-02-10 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3f0b6c912'
+down_revision: Union[str, Sequence[str], None] = 'c41d7e9a2b85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('outbox_events',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('aggregate_type', sa.String(length=32), nullable=False),
+    sa.Column('aggregate_id', sa.UUID(), nullable=False),
+    sa.Column('event_type', sa.String(length=64), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('published_seq', sa.BigInteger(), nullable=True),
+    sa.Column('published_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ux_outbox_events_published_seq', 'outbox_events', ['published_seq'], unique=True)
+    op.create_index('ix_outbox_events_unpublished', 'outbox_events', ['id'], unique=False,
+                    postgresql_where=sa.text('published_seq IS NULL'))
+    op.create_index('ix_outbox_events_published_at', 'outbox_events', ['published_at'], unique=False)
+    op.create_table('consumer_offsets',
+    sa.Column('consumer', sa.String(length=100), nullable=False),
+    sa.Column('last_seq', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('consumer')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('consumer_offsets')
+    op.drop_index('ix_outbox_events_published_at', table_name='outbox_events')
+    op.drop_index('ix_outbox_events_unpublished', table_name='outbox_events')
+    op.drop_index('ux_outbox_events_published_seq', table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -0,0 +1,62 @@
+"""add orders tables and history indexes
+
+Revision ID: f5d1a7c3e924
+Revises: e2c8b4a1f630
+Create Date: 2026-02-24 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5d1a7c3e924'
+down_revision: Union[str, Sequence[str], None] = 'e2c8b4a1f630'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # таблицы заказов раньше создавались вне миграций - на таких базах только индексы
+    if not sa.inspect(op.get_bind()).has_table('orders'):
+        op.create_table('orders',
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'PROCESSING', 'SHIPPED', 'DELIVERED', 'CANCELLED', name='order_status_enum'), nullable=False),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('shipping_address', sa.String(), nullable=False),
+        sa.Column('phone_number', sa.String(), nullable=False),
+        sa.Column('notes', sa.String(), nullable=True),
+        sa.Column('ordered_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_table('order_items',
+        sa.Column('order_id', sa.UUID(), nullable=False),
+        sa.Column('product_id', sa.UUID(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price_at_time', sa.Float(), nullable=False),
+        sa.Column('product_name', sa.String(), nullable=False),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    op.create_index('ix_orders_user_id_created_at_id', 'orders', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_orders_status_created_at_id', 'orders', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # с этой ревизии таблицы заказов принадлежат миграциям: откат возвращает
+    # схему предыдущей ревизии, в которой их нет (индексы удаляются вместе с таблицами)
+    op.drop_table('order_items')
+    op.drop_table('orders')
+    sa.Enum(name='order_status_enum').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,111 @@
+from datetime import datetime
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.admin.schemas import SlowQueryRead
+from app.admin.exports import (
+    Export, MEDIA_TYPES,
+    products_export, orders_export, reviews_export,
+    stream_export, export_filename
+)
+from app.auth.service import require_admin
+from app.core.db import get_session, slow_query_log
+from app.users.models import User
+
+ExportFormat = Literal["csv", "jsonl", "ndjson"]
+
+router = APIRouter()
+
+
+@router.get(
+    "/slow-queries",
+    response_model=List[SlowQueryRead],
+    summary="[Админ] Самые медленные формы SQL-запросов",
+)
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=200),
+    order_by: Literal["total_ms", "max_ms", "count"] = Query("total_ms"),
+    admin: User = Depends(require_admin),
+) -> List[SlowQueryRead]:
+    """
+    Агрегат журнала медленных запросов текущего воркера.
+    Параметры запросов не сохраняются, только форма запроса.
+    """
+    return slow_query_log.top(limit=limit, order_by=order_by)
+
+
+@router.delete(
+    "/slow-queries",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="[Админ] Очистить журнал медленных запросов",
+)
+async def reset_slow_queries(
+    admin: User = Depends(require_admin),
+) -> None:
+    slow_query_log.reset()
+
+
+def _export_response(
+        session: AsyncSession,
+        export: Export,
+        fmt: str,
+        gzip: bool
+) -> StreamingResponse:
+    """
+    Ответ отдаётся кусками по мере чтения курсора. Без gzip=true ответ
+    всё равно сжимается CompressionMiddleware, если клиент прислал Accept-Encoding.
+    """
+    return StreamingResponse(
+        stream_export(session, export, fmt, gzip=gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{export_filename(export, fmt, gzip)}"'
+        },
+    )
+
+
+@router.get(
+    "/exports/products",
+    summary="[Админ] Выгрузка товаров (CSV/JSONL)",
+)
+async def export_products(
+    format: ExportFormat = Query("csv"),
+    gzip: bool = Query(False, description="отдать файл .gz"),
+    admin: User = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    return _export_response(session, products_export(), format, gzip)
+
+
+@router.get(
+    "/exports/orders",
+    summary="[Админ] Выгрузка заказов с позициями (CSV/JSONL)",
+)
+async def export_orders(
+    format: ExportFormat = Query("csv"),
+    gzip: bool = Query(False, description="отдать файл .gz"),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    admin: User = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    """
+    CSV - строка на позицию заказа с колонками заказа.
+    JSONL - объект на заказ с массивом items.
+    """
+    return _export_response(session, orders_export(created_from, created_to), format, gzip)
+
+
+@router.get(
+    "/exports/reviews",
+    summary="[Админ] Выгрузка отзывов (CSV/JSONL)",
+)
+async def export_reviews(
+    format: ExportFormat = Query("csv"),
+    gzip: bool = Query(False, description="отдать файл .gz"),
+    admin: User = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    return _export_response(session, reviews_export(), format, gzip)
@@ -0,0 +1,188 @@
+import io
+import csv
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+from sqlalchemy import Select, select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.compression import StreamCompressor
+from app.catalog.models import Product, Category
+from app.orders.models import Order, OrderItem
+from app.reviews.models import Review
+
+EXPORT_FORMATS = ("csv", "jsonl", "ndjson")
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/jsonl",
+    "ndjson": "application/x-ndjson",
+}
+
+# сколько строк забирать из серверного курсора за раз
+YIELD_PER = 2000
+# размер куска ответа; меньше - больше накладных расходов на отправку
+CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "value"):  # Enum
+        return value.value
+    return str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "value"):
+        return value.value
+    return value
+
+
+class Export:
+    """Описание выгрузки: запрос и имена колонок в порядке select"""
+
+    def __init__(self, name: str, query: Select, columns: Sequence[str]):
+        self.name = name
+        self.query = query.execution_options(yield_per=YIELD_PER)
+        self.columns = list(columns)
+
+
+def products_export() -> Export:
+    columns = ["id", "sku", "name", "description", "price", "rating",
+               "category_id", "category_name", "created_at", "updated_at"]
+    query = (
+        select(
+            Product.id, Product.sku, Product.name, Product.description, Product.price,
+            Product.rating, Product.category_id, Category.name,
+            Product.created_at, Product.updated_at,
+        )
+        .outerjoin(Category, Category.id == Product.category_id)
+        .order_by(Product.id)
+    )
+    return Export("products", query, columns)
+
+
+ORDER_COLUMNS = ["order_id", "user_id", "status", "total_amount", "shipping_address",
+                 "phone_number", "notes", "ordered_at", "created_at"]
+ITEM_COLUMNS = ["item_id", "product_id", "product_name", "quantity", "price_at_time"]
+
+
+def orders_export(
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+) -> Export:
+    """Заказы с позициями: одна строка на позицию, заказы идут подряд"""
+    query = (
+        select(
+            Order.id, Order.user_id, Order.status, Order.total_amount, Order.shipping_address,
+            Order.phone_number, Order.notes, Order.ordered_at, Order.created_at,
+            OrderItem.id, OrderItem.product_id, OrderItem.product_name,
+            OrderItem.quantity, OrderItem.price_at_time,
+        )
+        .outerjoin(OrderItem, and_(OrderItem.order_id == Order.id,
+                                   OrderItem.order_created_at == Order.created_at))
+        .order_by(Order.created_at, Order.id)
+    )
+    if created_from is not None:
+        query = query.where(Order.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Order.created_at < created_to)
+    return Export("orders", query, ORDER_COLUMNS + ITEM_COLUMNS)
+
+
+def reviews_export() -> Export:
+    columns = ["id", "user_id", "product_id", "rating", "comment", "created_at", "updated_at"]
+    query = select(
+        Review.id, Review.user_id, Review.product_id, Review.rating, Review.comment,
+        Review.created_at, Review.updated_at,
+    ).order_by(Review.id)
+    return Export("reviews", query, columns)
+
+
+async def _rows(session: AsyncSession, export: Export) -> AsyncIterator[Sequence[Any]]:
+    """Строки из серверного курсора, порциями по YIELD_PER"""
+    result = await session.stream(export.query)
+    async for partition in result.partitions():
+        for row in partition:
+            yield row
+
+
+async def _encode(export: Export, rows: AsyncIterator[Sequence[Any]], fmt: str) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+
+    if fmt == "csv":
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(export.columns)
+        async for row in rows:
+            writer.writerow([_csv_value(value) for value in row])
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    else:
+        async for record in _json_objects(export, rows):
+            buffer.write(json.dumps(record, default=_json_default, ensure_ascii=False))
+            buffer.write("\n")
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def _json_objects(export: Export, rows: AsyncIterator[Sequence[Any]]) -> AsyncIterator[dict]:
+    """
+    JSON-записи выгрузки. Для заказов позиции собираются в массив items:
+    строки одного заказа идут подряд, поэтому в памяти держится один заказ.
+    """
+    if export.name != "orders":
+        async for row in rows:
+            yield dict(zip(export.columns, row))
+        return
+
+    split = len(ORDER_COLUMNS)
+    current: Optional[dict] = None
+    items: List[dict] = []
+    async for row in rows:
+        if current is None or current["order_id"] != row[0]:
+            if current is not None:
+                current["items"] = items
+                yield current
+            current = dict(zip(ORDER_COLUMNS, row[:split]))
+            items = []
+        if row[split] is not None:
+            items.append(dict(zip(ITEM_COLUMNS, row[split:])))
+    if current is not None:
+        current["items"] = items
+        yield current
+
+
+async def stream_export(
+        session: AsyncSession,
+        export: Export,
+        fmt: str,
+        gzip: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    Выгрузка кусками по ~CHUNK_SIZE байт. Память не зависит от объёма
+    данных: строки читаются серверным курсором, в буфере один кусок.
+    """
+    compressor = StreamCompressor("gzip") if gzip else None
+    async for text in _encode(export, _rows(session, export), fmt):
+        data = text.encode("utf-8")
+        yield compressor.compress(data) if compressor else data
+    if compressor:
+        yield compressor.finish()
+
+
+def export_filename(export: Export, fmt: str, gzip: bool) -> str:
+    suffix = "csv" if fmt == "csv" else "jsonl"
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    name = f"{export.name}_{stamp}.{suffix}"
+    return f"{name}.gz" if gzip else name
@@ -0,0 +1,14 @@
+from datetime import datetime
+from typing import Optional, List
+from pydantic import BaseModel
+
+
+class SlowQueryRead(BaseModel):
+    shape: str
+    count: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+    last_seen: datetime
+    repository_calls: List[str] = []
+    plan: Optional[str] = None
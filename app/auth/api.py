@@ -1,12 +1,20 @@
+import logging
 from datetime import timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 
 from app.core.config import settings
+from app.core.metrics import login_failures_total
 from app.auth.schemas import Token, Login, RefreshRequest
 from app.auth.service import AuthService, get_auth_service, get_req_service
 from app.users.service import UserService, get_user_service
 from app.users.schemas import UserCreate, UserRead  
+from app.cart.guest import GUEST_CART_HEADER
+from app.cart.service import CartService, get_cart_service
+
+logger = logging.getLogger("app.auth.api")
 
 router = APIRouter()
 
@@ -24,10 +32,13 @@ async def registrate(
 async def login_for_access_token(
     form_data: Login,
     service: AuthService = Depends(get_req_service),
+    guest_cart: Optional[str] = Header(None, alias=GUEST_CART_HEADER),
+    cart_service: CartService = Depends(get_cart_service),
 ):
     user = await service.authenticate_user(form_data.login, form_data.password)
 
     if not user:
+        login_failures_total.inc()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect login or password",
@@ -46,6 +57,14 @@ async def login_for_access_token(
         data={"sub": user.login}
     )
 
+    if guest_cart:
+        # корзина, собранная до входа, переносится в корзину пользователя;
+        # просроченный или испорченный токен входу не мешает
+        try:
+            await cart_service.merge_guest_cart(user.id, guest_cart)
+        except HTTPException as exc:
+            logger.warning("guest cart not merged for user %s: %s", user.id, exc.detail)
+
     return Token(
         access_token=access_token,
         refresh_token=refresh_token,
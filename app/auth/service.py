@@ -11,7 +11,7 @@ from app.users.repository import UserRepository, get_user_repository
 from app.users.models import User 
 from app.users.enum import UserRole
 from app.core.config import settings
-from app.core.security import verify_password
+from app.core.security import verify_password, verify_password_async
 from app.auth.schemas import TokenData, RefreshRequest
 
 
@@ -34,7 +34,7 @@ class AuthService:
 
         if not user:
             return None
-        if not self.verify_password(password, user.password_hash):
+        if not await verify_password_async(password, user.password_hash):
             return None
         return user
     
@@ -1,10 +1,14 @@
 from uuid import UUID
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 
 from app.cart.service import CartService, get_cart_service
-from app.cart.schemas import CartItemCreate, CartItemUpdate, CartItemRead, CartRead
+from app.cart.schemas import CartItemCreate, CartItemUpdate, CartItemRead, CartRead, CartViewRead, GuestCartRead
+from app.cart.guest import GUEST_CART_HEADER
+from app.orders.schemas import OrderCreate, OrderRead
+from app.orders.service import OrderService, get_order_service
 from app.auth.service import get_current_user_dep
+from app.core.idempotency import IdempotentRequest, idempotent_request
 from app.users.models import User
 from app.users.enum import UserRole
 
@@ -36,6 +40,81 @@ async def get_cart_items(
     return cart.items
 
 
+@router.get(
+    "/view",
+    response_model=CartViewRead,
+    summary="Корзина с товарами, ценами по акциям и итогами"
+)
+async def get_cart_view(
+        current_user: User = Depends(get_current_user_dep),
+        service: CartService = Depends(get_cart_service)
+) -> CartViewRead:
+    """
+    Позиции с названием товара, текущей ценой, ценой по лучшей действующей
+    акции и суммой строки; итоги: subtotal без акций, discount, total к оплате.
+    Считается одним запросом, отдельные запросы товаров не нужны.
+    """
+    return await service.get_cart_view(current_user.id)
+
+
+@router.get(
+    "/guest",
+    response_model=GuestCartRead,
+    summary="Корзина гостя"
+)
+async def get_guest_cart(
+        guest_cart: Optional[str] = Header(None, alias=GUEST_CART_HEADER),
+        service: CartService = Depends(get_cart_service)
+) -> GuestCartRead:
+    """
+    Корзина без входа: состояние хранится в подписанном токене (поле token),
+    который клиент передаёт в заголовке X-Guest-Cart. При входе
+    (POST /auth/token с тем же заголовком) позиции переносятся в корзину пользователя.
+    """
+    return await service.get_guest_cart(guest_cart)
+
+
+@router.post(
+    "/guest/items",
+    response_model=GuestCartRead,
+    status_code=status.HTTP_201_CREATED,
+    summary="Добавить товар в корзину гостя"
+)
+async def add_guest_item(
+        payload: CartItemCreate,
+        guest_cart: Optional[str] = Header(None, alias=GUEST_CART_HEADER),
+        service: CartService = Depends(get_cart_service)
+) -> GuestCartRead:
+    return await service.add_guest_item(guest_cart, payload)
+
+
+@router.put(
+    "/guest/items/{product_id}",
+    response_model=GuestCartRead,
+    summary="Изменить количество товара в корзине гостя"
+)
+async def update_guest_item(
+        product_id: UUID,
+        payload: CartItemUpdate,
+        guest_cart: Optional[str] = Header(None, alias=GUEST_CART_HEADER),
+        service: CartService = Depends(get_cart_service)
+) -> GuestCartRead:
+    return await service.update_guest_item(guest_cart, product_id, payload)
+
+
+@router.delete(
+    "/guest/items/{product_id}",
+    response_model=GuestCartRead,
+    summary="Удалить товар из корзины гостя"
+)
+async def remove_guest_item(
+        product_id: UUID,
+        guest_cart: Optional[str] = Header(None, alias=GUEST_CART_HEADER),
+        service: CartService = Depends(get_cart_service)
+) -> GuestCartRead:
+    return await service.remove_guest_item(guest_cart, product_id)
+
+
 @router.post(
     "/items",
     response_model=CartItemRead,
@@ -64,14 +143,27 @@ async def clear_cart(
 
 @router.post(
     "/checkout",
-    response_model=CartRead,
-    summary="Оформить заказ из своей корзины"
+    response_model=OrderRead,
+    status_code=status.HTTP_201_CREATED,
+    summary="Оформить заказ из своей корзины",
+    deprecated=True
 )
 async def checkout_cart(
+        order_data: OrderCreate,
         current_user: User = Depends(get_current_user_dep),
-        service: CartService = Depends(get_cart_service)
-) -> CartRead:
-    return await service.checkout_cart(current_user.id)
+        service: OrderService = Depends(get_order_service),
+        idempotency: IdempotentRequest = Depends(idempotent_request)
+) -> OrderRead:
+    """
+    То же, что POST /orders/orders/: корзина превращается в заказ,
+    в ответе - созданный заказ. Оставлен для старых клиентов.
+    С заголовком Idempotency-Key повтор запроса не оформляет корзину
+    заново, а получает ответ первого запроса.
+    """
+    if idempotency.replay is not None:
+        return idempotency.replay
+    order = await service.create_order_from_cart(current_user.id, order_data)
+    return await idempotency.respond(order, status_code=status.HTTP_201_CREATED)
 
 
 @router.put(
@@ -0,0 +1,79 @@
+import hmac
+import time
+import base64
+import struct
+import hashlib
+import binascii
+from typing import Dict, Optional
+from uuid import UUID
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+
+# корзина гостя целиком у клиента: токен возвращается в ответе и передаётся
+# обратно в этом заголовке (в том числе при входе - для слияния)
+GUEST_CART_HEADER = "X-Guest-Cart"
+
+_VERSION = 1
+_HEADER = struct.Struct(">BI")   # версия, время выдачи (unix, секунды)
+_LINE = struct.Struct(">16sH")   # товар, количество
+_SIGNATURE_SIZE = 16
+MAX_QUANTITY = 0xFFFF
+
+
+def _sign(body: bytes) -> bytes:
+    key = f"guest-cart:{settings.auth.secret_key}".encode()
+    return hmac.new(key, body, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+
+
+def encode_guest_cart(lines: Dict[UUID, int], issued_at: Optional[int] = None) -> str:
+    """
+    Компактный подписанный токен: 5 байт заголовка, 18 байт на позицию,
+    16 байт HMAC-SHA256. Сервер ничего не хранит, подделанный или
+    изменённый токен не проходит проверку подписи.
+    """
+    body = _HEADER.pack(_VERSION, int(time.time()) if issued_at is None else issued_at)
+    body += b"".join(_LINE.pack(product_id.bytes, quantity) for product_id, quantity in lines.items())
+    return base64.urlsafe_b64encode(body + _sign(body)).decode().rstrip("=")
+
+
+def guest_cart_token_id(token: str) -> str:
+    """
+    Идентификатор токена для учёта слияний - его подпись. Токен должен быть
+    уже проверен decode_guest_cart; новая правка корзины даёт новый идентификатор.
+    """
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    return raw[-_SIGNATURE_SIZE:].hex()
+
+
+def decode_guest_cart(token: Optional[str]) -> Dict[UUID, int]:
+    """Позиции из токена; нет токена - пустая корзина, неверный или просроченный - 400"""
+    if not token:
+        return {}
+    invalid = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid guest cart"
+    )
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        raise invalid
+
+    body, signature = raw[:-_SIGNATURE_SIZE], raw[-_SIGNATURE_SIZE:]
+    if (len(body) < _HEADER.size or (len(body) - _HEADER.size) % _LINE.size
+            or not hmac.compare_digest(signature, _sign(body))):
+        raise invalid
+    version, issued_at = _HEADER.unpack_from(body)
+    if version != _VERSION:
+        raise invalid
+    if time.time() - issued_at > settings.cart.guest_cart_ttl_days * 86400:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Guest cart expired"
+        )
+
+    return {
+        UUID(bytes=product_id): quantity
+        for product_id, quantity in _LINE.iter_unpack(body[_HEADER.size:])
+    }
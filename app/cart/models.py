@@ -1,12 +1,12 @@
 from typing import Any
 from decimal import Decimal
-from sqlalchemy import Column, String, Enum as SAEnum
+from sqlalchemy import Column, String, DateTime, Enum as SAEnum
 from sqlalchemy.orm import relationship
 from app.core.db import Base, BaseModelMixin
 from app.cart.enum import CartEnum
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from sqlalchemy import ForeignKey, Integer, Numeric
+from sqlalchemy import ForeignKey, Integer, Numeric, Index
 
 
 class Cart(Base, BaseModelMixin):
@@ -20,7 +20,7 @@ class Cart(Base, BaseModelMixin):
                     nullable=False,
                     default=CartEnum.ACTIVE)
 
-    user = relationship("User", back_populates="carts", lazy="selectin")
+    user = relationship("User", back_populates="carts", lazy="select")
     items = relationship(
         "CartItem",
         back_populates="cart",
@@ -28,6 +28,11 @@ class Cart(Base, BaseModelMixin):
         lazy="selectin"
     )
 
+    __table_args__ = (
+        # очистка: ORDERED после срока хранения, ACTIVE без изменений (CartSweeper)
+        Index("ix_carts_status_updated_at", "status", "updated_at"),
+    )
+
     def __repr__(self) -> str:
         return f"Cart(id={self.id}, user_id={self.user_id}, status={self.status}, items_count={len(self.items) if self.items else 0})"
 
@@ -68,6 +73,13 @@ class CartItem(Base, BaseModelMixin):
     cart = relationship("Cart", back_populates="items", lazy="selectin")
     product = relationship("Product", lazy="selectin", primaryjoin="CartItem.product_id == Product.id")
 
+    __table_args__ = (
+        # позиции корзины, каскадное удаление и "менялась ли корзина после T"
+        Index("ix_cart_items_cart_id_updated_at", "cart_id", "updated_at"),
+        # товар в корзине - одной строкой; цель ON CONFLICT при слиянии корзины гостя
+        Index("uq_cart_items_cart_id_product_id", "cart_id", "product_id", unique=True),
+    )
+
     def __repr__(self) -> str:
         return f"CartItem(id={self.id}, cart_id={self.cart_id}, product_id={self.product_id}, quantity={self.quantity}, price={self.price_at_add})"
 
@@ -87,3 +99,22 @@ class CartItem(Base, BaseModelMixin):
         if self.price_at_add and self.quantity:
             return Decimal(str(self.price_at_add)) * Decimal(str(self.quantity))
         return Decimal('0.00')
+
+
+class ConsumedGuestCart(Base):
+    """
+    Токены корзины гостя, уже слитые в корзину пользователя. Сам токен
+    остаётся у клиента и действителен до истечения срока, поэтому повторный
+    вход с тем же токеном без этой отметки добавил бы количества ещё раз.
+    """
+    __tablename__ = "consumed_guest_carts"
+
+    token_id = Column(String(32), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    consumed_at = Column(DateTime, nullable=False)
+    # после этого токен не пройдёт проверку срока и отметку можно удалить
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_consumed_guest_carts_expires_at", "expires_at"),
+    )
@@ -1,26 +1,35 @@
-from uuid import UUID
+from uuid import UUID, uuid4
 from decimal import Decimal
-from typing import Optional, Any
+from datetime import datetime, timedelta
+from typing import Optional, Any, List, Dict, Sequence, Tuple
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_, func
+from sqlalchemy import select, update, delete, and_, func, exists, literal, values, column, tuple_, Integer, Numeric, DateTime, Row
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert as pg_insert
 from sqlalchemy.orm import selectinload
 
+from app.core.config import settings
 from app.core.db import get_session
-from app.cart.models import Cart, CartItem
+from app.core.metrics import instrument_repository
+from app.events.outbox import record_event
+from app.cart.models import Cart, CartItem, ConsumedGuestCart
 from app.cart.enum import CartEnum
 from app.catalog.models import Product
+from app.promotions.repository import best_discount_percent, discounted_price
 
 
+@instrument_repository
 class CartRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def create_cart(self, user_id: UUID) -> Cart:
         cart = Cart(
+            id=uuid4(),
             user_id=user_id,
             status=CartEnum.ACTIVE)
         self.db.add(cart)
+        record_event(self.db, "cart", cart.id, "cart.created", {"user_id": str(user_id)})
         await self.db.commit()
         await self.db.refresh(cart)
         return cart
@@ -42,6 +51,57 @@ class CartRepository:
         )
         return result.scalar_one_or_none()
 
+    async def get_active_cart_id(self, user_id: UUID) -> Optional[UUID]:
+        result = await self.db.execute(
+            select(Cart.id).where(Cart.user_id == user_id, Cart.status == CartEnum.ACTIVE)
+        )
+        return result.scalars().first()
+
+    async def get_cart_view(self, user_id: UUID, at: datetime) -> List[Row]:
+        """
+        Активная корзина одним запросом: строка на позицию с товаром, текущей
+        ценой и лучшей акцией на момент at, итоги корзины - оконными суммами
+        в каждой строке. Пустая корзина - одна строка без товара, нет корзины - [].
+        """
+        lines = (
+            select(
+                Cart.id.label("cart_id"),
+                CartItem.product_id,
+                Product.name.label("product_name"),
+                CartItem.quantity,
+                CartItem.price_at_add,
+                Product.price.label("current_price"),
+                func.coalesce(best_discount_percent(CartItem.product_id, at), 0).label("discount_percent"),
+                CartItem.created_at.label("added_at"),
+            )
+            .select_from(Cart)
+            .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+            .outerjoin(Product, Product.id == CartItem.product_id)
+            .where(Cart.user_id == user_id, Cart.status == CartEnum.ACTIVE)
+            .subquery("lines")
+        )
+        effective_price = discounted_price(lines.c.current_price, lines.c.discount_percent)
+        line_total = effective_price * lines.c.quantity
+        result = await self.db.execute(
+            select(
+                lines,
+                effective_price.label("effective_price"),
+                line_total.label("line_total"),
+                func.sum(lines.c.current_price * lines.c.quantity).over().label("subtotal"),
+                func.sum(line_total).over().label("total"),
+            )
+            .order_by(lines.c.added_at, lines.c.product_id)
+        )
+        return result.all()
+
+    async def get_current_price(self, product_id: UUID, at: datetime) -> Optional[Decimal]:
+        """Цена товара со скидкой лучшей акции на момент at; None - товара нет"""
+        result = await self.db.execute(
+            select(discounted_price(Product.price, best_discount_percent(Product.id, at)))
+            .where(Product.id == product_id)
+        )
+        return result.scalar_one_or_none()
+
     async def get_cart_by_id(self, cart_id: UUID) -> Optional[Cart]:
         result = await self.db.execute(
             select(Cart)
@@ -53,21 +113,11 @@ class CartRepository:
         )
         return result.scalar_one_or_none()
 
-    async def update_cart_status(self, cart_id: UUID, status: CartEnum) -> Cart:
-        query = (
-            update(Cart)
-            .where(Cart.id == cart_id)
-            .values(status=status)
-            .returning(Cart)
-        )
-        result = await self.db.execute(query)
-        await self.db.commit()
-        return result.scalar_one()
-
     async def clear_cart(self, cart_id: UUID) -> None:
         await self.db.execute(
             delete(CartItem).where(CartItem.cart_id == cart_id)
         )
+        record_event(self.db, "cart", cart_id, "cart.cleared")
         await self.db.commit()
 
     # card item methods
@@ -104,10 +154,203 @@ class CartRepository:
             )
             self.db.add(item)
 
+        record_event(self.db, "cart", cart_id, "cart.item_added", {
+            "product_id": str(product_id),
+            "quantity": quantity,
+            "price_at_add": str(price_at_add),
+        })
         await self.db.commit()
         await self.db.refresh(item)
         return item
 
+    async def merge_items(self, user_id: UUID, lines: Dict[UUID, int], token_id: str) -> int:
+        """
+        Слить позиции (товар -> количество) в активную корзину пользователя одним
+        INSERT ... SELECT ... ON CONFLICT: новые товары добавляются по текущей цене со скидкой,
+        у уже лежащих в корзине растёт количество. Несуществующие товары пропускаются.
+        Токен token_id отмечается использованным, а недостающая корзина создаётся
+        в той же транзакции: уже слитый токен (повторный вход, параллельный запрос)
+        ничего не меняет, а сбой вставки позиций не теряет гостевую корзину.
+        Возвращает число добавленных или изменённых позиций.
+        """
+        now = datetime.utcnow()
+        consumed = await self.db.execute(
+            pg_insert(ConsumedGuestCart)
+            .values(
+                token_id=token_id,
+                user_id=user_id,
+                consumed_at=now,
+                expires_at=now + timedelta(days=settings.cart.guest_cart_ttl_days),
+            )
+            .on_conflict_do_nothing(index_elements=[ConsumedGuestCart.token_id])
+        )
+        if not consumed.rowcount:
+            await self.db.commit()
+            return 0
+
+        result = await self.db.execute(
+            select(Cart.id)
+            .where(Cart.user_id == user_id, Cart.status == CartEnum.ACTIVE)
+            .with_for_update()
+        )
+        cart_id = result.scalars().first()
+        if cart_id is None:
+            # не create_cart: его commit зафиксировал бы отметку токена до вставки позиций
+            cart = Cart(id=uuid4(), user_id=user_id, status=CartEnum.ACTIVE)
+            self.db.add(cart)
+            record_event(self.db, "cart", cart.id, "cart.created", {"user_id": str(user_id)})
+            await self.db.flush()
+            cart_id = cart.id
+
+        guest = (
+            values(column("product_id", PG_UUID(as_uuid=True)), column("quantity", Integer), name="guest")
+            .data(list(lines.items()))
+        )
+        stmt = pg_insert(CartItem).from_select(
+            ["id", "cart_id", "product_id", "quantity", "price_at_add", "created_at", "updated_at"],
+            select(
+                func.gen_random_uuid(),
+                literal(cart_id, Cart.id.type),
+                Product.id,
+                guest.c.quantity,
+                discounted_price(Product.price, best_discount_percent(Product.id, now)),
+                literal(now),
+                literal(now),
+            )
+            .select_from(guest.join(Product, Product.id == guest.c.product_id))
+            .where(guest.c.quantity > 0)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id],
+            set_={
+                "quantity": CartItem.quantity + stmt.excluded.quantity,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        result = await self.db.execute(stmt)
+        if result.rowcount:
+            record_event(self.db, "cart", cart_id, "cart.merged", {
+                "user_id": str(user_id),
+                "lines": result.rowcount,
+            })
+        await self.db.commit()
+        return result.rowcount
+
+    async def apply_cart_changes(
+            self,
+            cleared: Sequence[UUID],
+            removed: Sequence[Tuple[UUID, UUID]],
+            upserted: Sequence[Tuple[UUID, UUID, UUID, int, Decimal, datetime, datetime]]
+    ) -> None:
+        """
+        Записать накопленные изменения многих корзин в одной транзакции:
+        cleared - очищенные корзины, removed - (cart_id, product_id) удалённых
+        позиций, upserted - итоговые позиции (id, cart_id, product_id, quantity,
+        price_at_add, created_at, updated_at). Позиции пишутся только в корзины,
+        которые всё ещё активны (не оформлены и не удалены очисткой).
+        """
+        if cleared:
+            await self.db.execute(
+                delete(CartItem)
+                .where(CartItem.cart_id.in_(cleared))
+                .execution_options(synchronize_session=False)
+            )
+        if removed:
+            await self.db.execute(
+                delete(CartItem)
+                .where(tuple_(CartItem.cart_id, CartItem.product_id).in_(removed))
+                .execution_options(synchronize_session=False)
+            )
+        if upserted:
+            lines = (
+                values(
+                    column("id", PG_UUID(as_uuid=True)),
+                    column("cart_id", PG_UUID(as_uuid=True)),
+                    column("product_id", PG_UUID(as_uuid=True)),
+                    column("quantity", Integer),
+                    column("price_at_add", Numeric(10, 2)),
+                    column("created_at", DateTime),
+                    column("updated_at", DateTime),
+                    name="lines",
+                )
+                .data(list(upserted))
+            )
+            stmt = pg_insert(CartItem).from_select(
+                ["id", "cart_id", "product_id", "quantity", "price_at_add", "created_at", "updated_at"],
+                select(*lines.c)
+                .select_from(lines.join(Cart, Cart.id == lines.c.cart_id))
+                .where(Cart.status == CartEnum.ACTIVE)
+            )
+            await self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[CartItem.cart_id, CartItem.product_id],
+                    set_={
+                        "quantity": stmt.excluded.quantity,
+                        "updated_at": stmt.excluded.updated_at,
+                    },
+                )
+            )
+
+        for cart_id in cleared:
+            record_event(self.db, "cart", cart_id, "cart.cleared")
+        for cart_id, product_id in removed:
+            record_event(self.db, "cart", cart_id, "cart.item_removed", {"product_id": str(product_id)})
+        for _, cart_id, product_id, quantity, *_ in upserted:
+            record_event(self.db, "cart", cart_id, "cart.item_updated", {
+                "product_id": str(product_id),
+                "quantity": quantity,
+            })
+        await self.db.commit()
+
+    async def reprice_items(
+            self,
+            at: datetime,
+            limit: int,
+            product_ids: Optional[Sequence[UUID]] = None,
+            category_id: Optional[UUID] = None
+    ) -> int:
+        """
+        Пачка до limit позиций активных корзин, у которых price_at_add
+        отличается от текущей цены товара со скидкой на момент at, - одним
+        UPDATE ... FROM. Без фильтров - все товары. Изменённые корзины
+        попадают в outbox (cart.repriced). Возвращает число позиций; меньше
+        limit - подходящих строк больше нет (занятые правкой пропускаются).
+        """
+        new_price = discounted_price(Product.price, best_discount_percent(Product.id, at))
+        batch = (
+            select(CartItem.id, new_price.label("price"))
+            .join(Cart, Cart.id == CartItem.cart_id)
+            .join(Product, Product.id == CartItem.product_id)
+            .where(
+                Cart.status == CartEnum.ACTIVE,
+                CartItem.price_at_add.is_distinct_from(new_price),
+            )
+            .limit(limit)
+            .with_for_update(of=CartItem, skip_locked=True)
+        )
+        if product_ids is not None:
+            batch = batch.where(CartItem.product_id.in_(product_ids))
+        if category_id is not None:
+            batch = batch.where(Product.category_id == category_id)
+        batch = batch.subquery("batch")
+
+        result = await self.db.execute(
+            update(CartItem)
+            .where(CartItem.id == batch.c.id)
+            # updated_at не трогаем: пересчёт цены - не активность покупателя
+            .values(price_at_add=batch.c.price, updated_at=CartItem.updated_at)
+            .returning(CartItem.cart_id, CartItem.product_id, CartItem.price_at_add)
+            .execution_options(synchronize_session=False)
+        )
+        changed: Dict[UUID, Dict[str, str]] = {}
+        rows = result.all()
+        for cart_id, product_id, price in rows:
+            changed.setdefault(cart_id, {})[str(product_id)] = str(price)
+        for cart_id, prices in changed.items():
+            record_event(self.db, "cart", cart_id, "cart.repriced", {"prices": prices})
+        await self.db.commit()
+        return len(rows)
+
     async def get_cart_item(self, cart_id: UUID, product_id: UUID) -> Optional[CartItem]:
         result = await self.db.execute(
             select(CartItem)
@@ -143,9 +386,13 @@ class CartRepository:
             .returning(CartItem)
         )
         result = await self.db.execute(query)
-        await self.db.commit()
-
         item = result.scalar_one_or_none()  # ← Используем scalar_one_or_none
+        if item:
+            record_event(self.db, "cart", cart_id, "cart.item_updated", {
+                "product_id": str(product_id),
+                "quantity": quantity,
+            })
+        await self.db.commit()
 
         if item:
             await self.db.refresh(item)
@@ -160,6 +407,10 @@ class CartRepository:
             )
         )
         result = await self.db.execute(query)
+        if result.rowcount:
+            record_event(self.db, "cart", cart_id, "cart.item_removed", {
+                "product_id": str(product_id),
+            })
         await self.db.commit()
         return result.rowcount > 0
 
@@ -170,6 +421,57 @@ class CartRepository:
         )
         return result.scalar_one()
 
+    async def delete_ordered_carts(self, before: datetime, limit: int) -> int:
+        """
+        Удалить пачку оформленных корзин, не менявшихся с before.
+        Позиции удаляет ON DELETE CASCADE; строки, занятые другой транзакцией, пропускаются.
+        """
+        batch = (
+            select(Cart.id)
+            .where(Cart.status == CartEnum.ORDERED, Cart.updated_at < before)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.db.execute(
+            delete(Cart)
+            .where(Cart.id.in_(batch))
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.commit()
+        return result.rowcount
+
+    async def delete_consumed_guest_carts(self, now: datetime) -> int:
+        """Удалить отметки о слиянии токенов, которые уже не пройдут проверку срока"""
+        result = await self.db.execute(
+            delete(ConsumedGuestCart).where(ConsumedGuestCart.expires_at < now)
+        )
+        await self.db.commit()
+        return result.rowcount
+
+    async def expire_idle_carts(self, before: datetime, limit: int) -> int:
+        """
+        Удалить пачку активных корзин, в которых с before не менялись
+        ни сама корзина, ни позиции. Следующее обращение пользователя создаст новую.
+        """
+        changed = exists().where(CartItem.cart_id == Cart.id, CartItem.updated_at >= before)
+        batch = (
+            select(Cart.id)
+            .where(Cart.status == CartEnum.ACTIVE, Cart.updated_at < before, ~changed)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.db.execute(
+            delete(Cart)
+            .where(Cart.id.in_(batch))
+            .returning(Cart.id, Cart.user_id)
+            .execution_options(synchronize_session=False)
+        )
+        expired = result.all()
+        for cart_id, user_id in expired:
+            record_event(self.db, "cart", cart_id, "cart.expired", {"user_id": str(user_id)})
+        await self.db.commit()
+        return len(expired)
+
 
 async def get_cart_repository(db: AsyncSession = Depends(get_session)) -> CartRepository:
     return CartRepository(db)
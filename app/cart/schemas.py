@@ -37,4 +37,42 @@ class CartRead(BaseModel):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+# cart view
+class CartLineRead(BaseModel):
+    product_id: UUID
+    product_name: str
+    quantity: int
+    price_at_add: Decimal
+    current_price: Decimal
+    # лучшая действующая акция на товар, 0 - без скидки
+    discount_percent: float
+    effective_price: Decimal
+    line_total: Decimal
+
+    class Config:
+        from_attributes = True
+
+
+class CartViewRead(BaseModel):
+    cart_id: Optional[UUID] = None
+    lines: List[CartLineRead] = []
+    # по текущим ценам без акций
+    subtotal: Decimal = Decimal("0")
+    discount: Decimal = Decimal("0")
+    # к оплате при оформлении сейчас
+    total: Decimal = Decimal("0")
+
+
+# guest cart
+class GuestCartItem(BaseModel):
+    product_id: UUID
+    quantity: int
+
+
+class GuestCartRead(BaseModel):
+    # передаётся обратно в заголовке X-Guest-Cart, в том числе при входе
+    token: str
+    items: List[GuestCartItem] = []
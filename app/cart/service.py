@@ -1,23 +1,39 @@
 from sqlalchemy.dialects.postgresql import UUID
-from typing import Optional
+from typing import Optional, Dict
 from fastapi import Depends, HTTPException, status
-from decimal import Decimal
+from datetime import datetime
 
 from app.cart.repository import CartRepository, get_cart_repository
 from app.cart.schemas import (
-    CartRead, CartItemCreate, CartItemUpdate, CartItemRead
+    CartRead, CartItemCreate, CartItemUpdate, CartItemRead, CartLineRead, CartViewRead,
+    GuestCartItem, GuestCartRead
 )
-from app.cart.enum import CartEnum
+from app.cart.guest import encode_guest_cart, decode_guest_cart, guest_cart_token_id, MAX_QUANTITY
+from app.cart.store import WriteThroughCartStore, get_cart_store
+from app.core.config import settings
 from app.catalog.repository import ProductRepository, get_product_repository
 
 
 class CartService:
-    def __init__(self, repo: CartRepository, product_repo: ProductRepository
+    def __init__(self, repo: CartRepository, product_repo: ProductRepository,
+                 store: Optional[WriteThroughCartStore] = None
     ):
         self.repo = repo
         self.product_repo = product_repo
+        # изменения позиций идут через store; чтения сначала записывают отложенное
+        self.store = store or get_cart_store()
+
+    async def _active_cart_id(self, user_id: UUID) -> UUID:
+        cart_id = await self.repo.get_active_cart_id(user_id)
+        if not cart_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cart not found"
+            )
+        return cart_id
 
     async def get_or_create_cart(self, user_id: UUID) -> CartRead:
+        await self.store.flush_user(self.repo, user_id)
         cart = await self.repo.get_active_cart_by_user(user_id)
 
         if not cart:
@@ -25,7 +41,26 @@ class CartService:
 
         return CartRead.model_validate(cart)
 
+    async def get_cart_view(self, user_id: UUID) -> CartViewRead:
+        """Корзина с товарами и итогами по текущим ценам и акциям; корзина не создаётся"""
+        await self.store.flush_user(self.repo, user_id)
+        rows = await self.repo.get_cart_view(user_id, datetime.utcnow())
+        if not rows:
+            return CartViewRead()
+
+        head = rows[0]
+        if head.product_id is None:
+            return CartViewRead(cart_id=head.cart_id)
+        return CartViewRead(
+            cart_id=head.cart_id,
+            lines=[CartLineRead.model_validate(row) for row in rows],
+            subtotal=head.subtotal,
+            discount=head.subtotal - head.total,
+            total=head.total,
+        )
+
     async def get_cart(self, cart_id: UUID, user_id: UUID) -> CartRead:
+        await self.store.flush_user(self.repo, user_id)
         cart = await self.repo.get_cart_by_id(cart_id)
 
         if not cart:
@@ -47,20 +82,25 @@ class CartService:
             user_id: UUID,
             item_data: CartItemCreate
     ) -> CartItemRead:
-        cart = await self.repo.get_active_cart_by_user(user_id)
-        if not cart:
-            cart = await self.repo.create_cart(user_id)
+        # цена со скидкой действующих акций - та же, к которой приводит пересчёт корзин
+        price = await self.repo.get_current_price(item_data.product_id, datetime.utcnow())
+        if price is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
 
-        product = await self.product_repo.get_product_by_id(item_data.product_id)
-        cart_item = await self.repo.add_item_to_cart(
-            cart_id=cart.id,
+        cart_id = await self.repo.get_active_cart_id(user_id)
+        if not cart_id:
+            cart_id = (await self.repo.create_cart(user_id)).id
+        return await self.store.add_item(
+            self.repo, user_id,
+            cart_id=cart_id,
             product_id=item_data.product_id,
             quantity=item_data.quantity,
-            price_at_add=Decimal(str(product.price))
+            price_at_add=price
         )
 
-        return CartItemRead.model_validate(cart_item)
-
     # изменить количество товара
     async def update_cart_item(
             self,
@@ -68,69 +108,90 @@ class CartService:
             product_id: UUID,
             item_data: CartItemUpdate
     ) -> Optional[CartItemRead]:
-        cart = await self.repo.get_active_cart_by_user(user_id)
-        if not cart:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cart not found"
-            )
-
-        updated_item = await self.repo.update_item_quantity(
-            cart_id=cart.id,
+        cart_id = await self._active_cart_id(user_id)
+        return await self.store.set_quantity(
+            self.repo, user_id,
+            cart_id=cart_id,
             product_id=product_id,
             quantity=item_data.quantity
         )
 
-        if updated_item:
-            return CartItemRead.model_validate(updated_item)
-        return None
-
     async def remove_item_from_cart(
             self,
             user_id: UUID,
             product_id: UUID
     ) -> bool:
-        cart = await self.repo.get_active_cart_by_user(user_id)
-        if not cart:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cart not found"
-            )
-
-        return await self.repo.remove_item_from_cart(cart.id, product_id)
+        cart_id = await self._active_cart_id(user_id)
+        return await self.store.remove_item(self.repo, user_id, cart_id, product_id)
 
     async def clear_cart(self, user_id: UUID) -> bool:
-        cart = await self.repo.get_active_cart_by_user(user_id)
-        if not cart:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cart not found"
-            )
-
-        await self.repo.clear_cart(cart.id)
+        cart_id = await self._active_cart_id(user_id)
+        await self.store.clear(self.repo, user_id, cart_id)
         return True
 
-    async def checkout_cart(self, user_id: UUID) -> CartRead:
-        cart = await self.repo.get_active_cart_by_user(user_id)
-        if not cart:
+
+    # корзина гостя: состояние в подписанном токене, база не меняется
+    @staticmethod
+    def _guest_cart(lines: Dict[UUID, int]) -> GuestCartRead:
+        return GuestCartRead(
+            token=encode_guest_cart(lines),
+            items=[GuestCartItem(product_id=product_id, quantity=quantity)
+                   for product_id, quantity in lines.items()]
+        )
+
+    def _set_guest_quantity(self, lines: Dict[UUID, int], product_id: UUID, quantity: int) -> GuestCartRead:
+        if quantity <= 0:
+            lines.pop(product_id, None)
+            return self._guest_cart(lines)
+
+        if quantity > MAX_QUANTITY:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cart not found"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Quantity is too large"
             )
-
-        if not cart.items:
+        if product_id not in lines and len(lines) >= settings.cart.guest_cart_max_lines:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Cart is empty"
+                detail="Guest cart is full"
             )
+        lines[product_id] = quantity
+        return self._guest_cart(lines)
 
-        updated_cart = await self.repo.update_cart_status(
-            cart_id=cart.id,
-            status=CartEnum.ORDERED
-        )
+    async def get_guest_cart(self, token: Optional[str]) -> GuestCartRead:
+        return self._guest_cart(decode_guest_cart(token))
 
-        return CartRead.model_validate(updated_cart)
+    async def add_guest_item(self, token: Optional[str], item_data: CartItemCreate) -> GuestCartRead:
+        lines = decode_guest_cart(token)
+        product = await self.product_repo.get_product_by_id(item_data.product_id)
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        return self._set_guest_quantity(
+            lines, item_data.product_id, lines.get(item_data.product_id, 0) + item_data.quantity
+        )
 
+    async def update_guest_item(self, token: Optional[str], product_id: UUID,
+                                item_data: CartItemUpdate) -> GuestCartRead:
+        lines = decode_guest_cart(token)
+        if product_id not in lines:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Item not found in cart"
+            )
+        return self._set_guest_quantity(lines, product_id, item_data.quantity)
+
+    async def remove_guest_item(self, token: Optional[str], product_id: UUID) -> GuestCartRead:
+        return await self.update_guest_item(token, product_id, CartItemUpdate(quantity=0))
+
+    async def merge_guest_cart(self, user_id: UUID, token: str) -> int:
+        """Перенести корзину гостя в активную корзину пользователя одним запросом"""
+        lines = decode_guest_cart(token)
+        if not lines:
+            return 0
+        await self.store.flush_user(self.repo, user_id)
+        return await self.repo.merge_items(user_id, lines, guest_cart_token_id(token))
 
 async def get_cart_service(
     repo: CartRepository = Depends(get_cart_repository),
@@ -0,0 +1,431 @@
+import os
+import re
+import json
+import time
+import fcntl
+import asyncio
+import logging
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+from uuid import UUID, uuid4
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.core.metrics import registry
+from app.cart.repository import CartRepository
+from app.cart.schemas import CartItemRead
+
+logger = logging.getLogger("app.cart.store")
+
+# файлы процесса: journal-<pid>-<boot>.jsonl (текущий), journal-<pid>-<boot>-<ns>.flushing
+# (отложенные до commit) и journal-<pid>-<boot>.lock - держится, пока процесс жив
+_JOURNAL_NAME_RE = re.compile(r"^journal-(?P<owner>\d+-[0-9a-f]{12})(?:\.jsonl|\.lock|-\d+\.flushing)$")
+RECOVER_LOCK_FILE = "recover.lock"
+
+cart_store_pending_carts = registry.gauge(
+    "cart_store_pending_carts", "Корзины с изменениями, ещё не записанными в базу"
+)
+cart_store_flushed_lines_total = registry.counter(
+    "cart_store_flushed_lines_total", "Позиции корзин, записанные в базу отложенно"
+)
+
+
+class PendingLine(NamedTuple):
+    id: UUID
+    product_id: UUID
+    # 0 - позиция удалена
+    quantity: int
+    price_at_add: Decimal
+    created_at: datetime
+    updated_at: datetime
+
+
+class CartChanges:
+    """Итоговое состояние изменённых позиций одной корзины (не последовательность правок)"""
+
+    def __init__(self, user_id: UUID):
+        self.user_id = user_id
+        # позиции корзины в базе удаляются перед записью lines
+        self.cleared = False
+        self.lines: Dict[UUID, PendingLine] = {}
+
+
+def _item_read(cart_id: UUID, line: PendingLine) -> CartItemRead:
+    return CartItemRead(cart_id=cart_id, **line._asdict())
+
+
+def _line_entry(user_id: UUID, cart_id: UUID, line: PendingLine) -> dict:
+    return {
+        "op": "set", "user": str(user_id), "cart": str(cart_id),
+        "line": [str(line.id), str(line.product_id), line.quantity, str(line.price_at_add),
+                 line.created_at.isoformat(), line.updated_at.isoformat()],
+    }
+
+
+def _clear_entry(user_id: UUID, cart_id: UUID) -> dict:
+    return {"op": "clear", "user": str(user_id), "cart": str(cart_id)}
+
+
+class WriteThroughCartStore:
+    """Каждое изменение корзины - сразу транзакция в Postgres через CartRepository"""
+
+    async def add_item(self, repo: CartRepository, user_id: UUID, cart_id: UUID, product_id: UUID,
+                       quantity: int, price_at_add: Decimal) -> CartItemRead:
+        item = await repo.add_item_to_cart(cart_id, product_id, quantity, price_at_add)
+        return CartItemRead.model_validate(item)
+
+    async def set_quantity(self, repo: CartRepository, user_id: UUID, cart_id: UUID, product_id: UUID,
+                           quantity: int) -> Optional[CartItemRead]:
+        item = await repo.update_item_quantity(cart_id, product_id, quantity)
+        return CartItemRead.model_validate(item) if item else None
+
+    async def remove_item(self, repo: CartRepository, user_id: UUID, cart_id: UUID, product_id: UUID) -> bool:
+        return await repo.remove_item_from_cart(cart_id, product_id)
+
+    async def clear(self, repo: CartRepository, user_id: UUID, cart_id: UUID) -> None:
+        await repo.clear_cart(cart_id)
+
+    async def flush_user(self, repo: CartRepository, user_id: UUID) -> bool:
+        """Записать отложенные изменения корзин пользователя; True - что-то было записано"""
+        return False
+
+
+class WriteBehindCartStore(WriteThroughCartStore):
+    """
+    Изменения корзин копятся в памяти процесса и раз в flush_interval_seconds
+    пишутся в базу пачками: одна транзакция на flush_batch_size корзин,
+    по одному запросу на очистки, удаления и upsert позиций.
+
+    * Чтение корзины, слияние корзины гостя и оформление заказа сначала
+      записывают изменения пользователя (flush_user) - база видит всё.
+    * Каждая правка до ответа дописывается в журнал процесса
+      (journal_dir/journal-<pid>-<boot>.jsonl). При записи пачки журнал
+      откладывается и удаляется после commit; после flush_user он переписывается
+      только с ещё не записанными правками. При старте журналы завершившихся
+      процессов (их .lock никем не занят) забираются под recover.lock,
+      проигрываются и записываются в базу.
+    * Состояние в памяти своё у каждого процесса: правки одной корзины
+      должны приходить в один процесс (один воркер или привязка по пользователю).
+    """
+
+    def __init__(self, journal_dir: Optional[str] = None):
+        self.config = settings.cart
+        self._journal_dir = journal_dir
+        self._pending: Dict[UUID, CartChanges] = {}
+        # пачка, которая пишется сейчас: чтения правок видят её до commit
+        self._flushing: Dict[UUID, CartChanges] = {}
+        self._lock = asyncio.Lock()
+        self._journal = None
+        # владелец журналов: pid и случайный boot id, задаются при первом обращении (после fork)
+        self._owner: Optional[str] = None
+        self._owner_lock = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def journal_dir(self) -> Path:
+        return Path(self._journal_dir or self.config.journal_dir)
+
+    # журнал
+
+    def _hold_owner_lock(self) -> None:
+        if self._owner_lock is not None:
+            return
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._owner = f"{os.getpid()}-{uuid4().hex[:12]}"
+        self._owner_lock = open(self.journal_dir / f"journal-{self._owner}.lock", "a")
+        fcntl.flock(self._owner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    @property
+    def _journal_path(self) -> Path:
+        return self.journal_dir / f"journal-{self._owner}.jsonl"
+
+    def _own_flushing(self) -> List[Path]:
+        return sorted(self.journal_dir.glob(f"journal-{self._owner}-*.flushing"))
+
+    def _log(self, entry: dict) -> None:
+        if self._journal is None:
+            self._hold_owner_lock()
+            self._journal = open(self._journal_path, "a", encoding="utf-8")
+        # flush в ОС: правка переживает падение процесса
+        self._journal.write(json.dumps(entry) + "\n")
+        self._journal.flush()
+
+    def _close_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._owner_lock is not None:
+            self._owner_lock.close()
+            self._owner_lock = None
+
+    def _rotate_journal(self) -> List[Path]:
+        """Отложить текущий журнал процесса; вернуть все его отложенные, включая не записанные прежде"""
+        self._hold_owner_lock()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        current = self._journal_path
+        if current.exists():
+            current.rename(self.journal_dir / f"journal-{self._owner}-{time.time_ns()}.flushing")
+        return self._own_flushing()
+
+    def _compact_journal(self) -> None:
+        """
+        Переписать журнал процесса состоянием ещё не записанных корзин. Иначе
+        записанные правки остаются в журнале и при проигрывании перезаписали
+        бы более поздние изменения этих позиций в базе.
+        """
+        if self._owner_lock is None:
+            return
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        current = self._journal_path
+        if self._pending:
+            compacted = current.with_suffix(".tmp")
+            with open(compacted, "w", encoding="utf-8") as file:
+                for cart_id, changes in self._pending.items():
+                    if changes.cleared:
+                        file.write(json.dumps(_clear_entry(changes.user_id, cart_id)) + "\n")
+                    for line in changes.lines.values():
+                        file.write(json.dumps(_line_entry(changes.user_id, cart_id, line)) + "\n")
+            os.replace(compacted, current)
+        else:
+            current.unlink(missing_ok=True)
+        # отложенные после неудачной записи уже вернулись в _pending (_restore)
+        for path in self._own_flushing():
+            path.unlink(missing_ok=True)
+
+    def _adopt_orphans(self) -> None:
+        """Забрать журналы процессов, которые уже не держат свой .lock"""
+        owners = {
+            match["owner"] for path in self.journal_dir.iterdir()
+            if (match := _JOURNAL_NAME_RE.match(path.name))
+        } - {self._owner}
+        for owner in sorted(owners):
+            lock_path = self.journal_dir / f"journal-{owner}.lock"
+            with open(lock_path, "a") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # владелец жив и запишет свои правки сам
+                    continue
+                # отложенные (-<ns>.flushing) сортируются раньше текущего (.jsonl)
+                for path in sorted(self.journal_dir.glob(f"journal-{owner}[-.]*")):
+                    if path != lock_path:
+                        path.rename(self.journal_dir / f"journal-{self._owner}-{time.time_ns()}.flushing")
+                lock_path.unlink(missing_ok=True)
+
+    def _replay(self, path: Path) -> None:
+        with open(path, encoding="utf-8") as file:
+            for number, raw in enumerate(file, 1):
+                try:
+                    entry = json.loads(raw)
+                except json.JSONDecodeError:
+                    # недописанная последняя строка при падении
+                    logger.warning("skipping broken cart journal line %s:%d", path, number)
+                    continue
+                changes = self._changes(UUID(entry["user"]), UUID(entry["cart"]))
+                if entry["op"] == "clear":
+                    changes.cleared = True
+                    changes.lines.clear()
+                else:
+                    line_id, product_id, quantity, price, created_at, updated_at = entry["line"]
+                    changes.lines[UUID(product_id)] = PendingLine(
+                        UUID(line_id), UUID(product_id), quantity, Decimal(price),
+                        datetime.fromisoformat(created_at), datetime.fromisoformat(updated_at)
+                    )
+
+    # состояние в памяти
+
+    def _changes(self, user_id: UUID, cart_id: UUID) -> CartChanges:
+        changes = self._pending.get(cart_id)
+        if changes is None:
+            changes = self._pending[cart_id] = CartChanges(user_id)
+            cart_store_pending_carts.set(len(self._pending))
+        return changes
+
+    async def _current(self, repo: CartRepository, cart_id: UUID, product_id: UUID) -> Optional[PendingLine]:
+        for layer in (self._pending, self._flushing):
+            changes = layer.get(cart_id)
+            if changes is None:
+                continue
+            line = changes.lines.get(product_id)
+            if line is not None:
+                return line if line.quantity > 0 else None
+            if changes.cleared:
+                return None
+        item = await repo.get_cart_item(cart_id, product_id)
+        if item is None:
+            return None
+        return PendingLine(item.id, item.product_id, item.quantity, item.price_at_add,
+                           item.created_at, item.updated_at)
+
+    def _set(self, user_id: UUID, cart_id: UUID, line: PendingLine) -> PendingLine:
+        self._log(_line_entry(user_id, cart_id, line))
+        self._changes(user_id, cart_id).lines[line.product_id] = line
+        return line
+
+    def _restore(self, batch: Dict[UUID, CartChanges]) -> None:
+        # запись не удалась: вернуть пачку под более новые правки тех же корзин
+        for cart_id, older in batch.items():
+            newer = self._pending.get(cart_id)
+            if newer is not None:
+                if newer.cleared:
+                    continue
+                older.lines.update(newer.lines)
+            self._pending[cart_id] = older
+        cart_store_pending_carts.set(len(self._pending))
+
+    # изменения корзины
+
+    async def add_item(self, repo: CartRepository, user_id: UUID, cart_id: UUID, product_id: UUID,
+                       quantity: int, price_at_add: Decimal) -> CartItemRead:
+        current = await self._current(repo, cart_id, product_id)
+        now = datetime.utcnow()
+        if current is None:
+            line = PendingLine(uuid4(), product_id, quantity, price_at_add, now, now)
+        else:
+            line = current._replace(quantity=current.quantity + quantity, updated_at=now)
+        return _item_read(cart_id, self._set(user_id, cart_id, line))
+
+    async def set_quantity(self, repo: CartRepository, user_id: UUID, cart_id: UUID, product_id: UUID,
+                           quantity: int) -> Optional[CartItemRead]:
+        if quantity <= 0:
+            await self.remove_item(repo, user_id, cart_id, product_id)
+            return None
+        current = await self._current(repo, cart_id, product_id)
+        if current is None:
+            return None
+        line = current._replace(quantity=quantity, updated_at=datetime.utcnow())
+        return _item_read(cart_id, self._set(user_id, cart_id, line))
+
+    async def remove_item(self, repo: CartRepository, user_id: UUID, cart_id: UUID, product_id: UUID) -> bool:
+        current = await self._current(repo, cart_id, product_id)
+        if current is None:
+            return False
+        self._set(user_id, cart_id, current._replace(quantity=0, updated_at=datetime.utcnow()))
+        return True
+
+    async def clear(self, repo: CartRepository, user_id: UUID, cart_id: UUID) -> None:
+        self._log(_clear_entry(user_id, cart_id))
+        changes = self._changes(user_id, cart_id)
+        changes.cleared = True
+        changes.lines.clear()
+
+    # запись в базу
+
+    async def _write(self, repo: CartRepository, batch: Dict[UUID, CartChanges]) -> None:
+        cart_ids = list(batch)
+        for start in range(0, len(cart_ids), self.config.flush_batch_size):
+            chunk = [(cart_id, batch[cart_id]) for cart_id in cart_ids[start:start + self.config.flush_batch_size]]
+            upserted = [
+                (line.id, cart_id, line.product_id, line.quantity, line.price_at_add,
+                 line.created_at, line.updated_at)
+                for cart_id, changes in chunk for line in changes.lines.values() if line.quantity > 0
+            ]
+            await repo.apply_cart_changes(
+                cleared=[cart_id for cart_id, changes in chunk if changes.cleared],
+                removed=[(cart_id, line.product_id)
+                         for cart_id, changes in chunk for line in changes.lines.values() if line.quantity == 0],
+                upserted=upserted,
+            )
+            cart_store_flushed_lines_total.inc(len(upserted))
+
+    async def flush_user(self, repo: CartRepository, user_id: UUID) -> bool:
+        def owned(layer: Dict[UUID, CartChanges]) -> List[UUID]:
+            return [cart_id for cart_id, changes in layer.items() if changes.user_id == user_id]
+
+        if not owned(self._pending) and not owned(self._flushing):
+            return False
+        # пачка с корзиной пользователя, которая пишется сейчас, должна завершиться
+        async with self._lock:
+            batch = {cart_id: self._pending.pop(cart_id) for cart_id in owned(self._pending)}
+            cart_store_pending_carts.set(len(self._pending))
+            if batch:
+                try:
+                    await self._write(repo, batch)
+                except BaseException:
+                    await repo.db.rollback()
+                    self._restore(batch)
+                    raise
+                self._compact_journal()
+        return True
+
+    async def flush(self, repo: Optional[CartRepository] = None) -> int:
+        """Записать все накопленные изменения; возвращает число корзин"""
+        async with self._lock:
+            if not self._pending:
+                self._compact_journal()
+                return 0
+            self._flushing, self._pending = self._pending, {}
+            cart_store_pending_carts.set(0)
+            journals = self._rotate_journal()
+            try:
+                if repo is not None:
+                    await self._write(repo, self._flushing)
+                else:
+                    async with async_session_maker() as session:
+                        await self._write(CartRepository(session), self._flushing)
+            except BaseException:
+                self._restore(self._flushing)
+                raise
+            finally:
+                flushed, self._flushing = self._flushing, {}
+            for path in journals:
+                path.unlink(missing_ok=True)
+            return len(flushed)
+
+    def recover(self) -> int:
+        """Проиграть журналы, оставшиеся после остановки или падения; возвращает число корзин"""
+        if not self.journal_dir.exists():
+            return 0
+        self._hold_owner_lock()
+        # два стартующих процесса не должны забрать журнал одного и того же упавшего
+        with open(self.journal_dir / RECOVER_LOCK_FILE, "a") as guard:
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            self._adopt_orphans()
+        for path in self._rotate_journal():
+            self._replay(path)
+        return len(self._pending)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("cart store flush failed")
+
+    async def start(self) -> None:
+        # журнал проигрывается и при write_through: правки, принятые до переключения, не теряются
+        recovered = self.recover()
+        if recovered:
+            logger.info("replaying cart journal: %d carts", recovered)
+            await self.flush()
+        if self._task is None and self.config.store == "write_behind":
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("final cart store flush failed, changes stay in the journal")
+        if self._owner_lock is not None:
+            # оставшиеся журналы заберёт следующий стартующий процесс
+            (self.journal_dir / f"journal-{self._owner}.lock").unlink(missing_ok=True)
+        self._close_journal()
+
+
+write_through_store = WriteThroughCartStore()
+write_behind_store = WriteBehindCartStore()
+
+
+def get_cart_store() -> WriteThroughCartStore:
+    return write_behind_store if settings.cart.store == "write_behind" else write_through_store
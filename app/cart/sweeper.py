@@ -0,0 +1,90 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.core.metrics import registry
+from app.cart.repository import CartRepository
+
+logger = logging.getLogger("app.cart.sweeper")
+
+carts_swept_total = registry.counter(
+    "carts_swept_total", "Корзины, удалённые очисткой", ("reason",)
+)
+cart_sweep_last_success_seconds = registry.gauge(
+    "cart_sweep_last_success_seconds", "Время (unix) последнего полного прохода очистки корзин"
+)
+
+
+class CartSweeper:
+    """
+    Очистка корзин раз в sweep_interval_seconds (в каждом процессе, без
+    конкуренции за строки: пачки выбираются FOR UPDATE SKIP LOCKED):
+
+    * ORDERED - через ordered_retention_hours после оформления; состав
+      заказа к этому времени сохранён в order_items;
+    * ACTIVE - без изменений idle_expire_days дней (при idle_expire_days > 0).
+
+    Каждая пачка - отдельная транзакция, счётчик carts_swept_total
+    растёт по мере удаления, а не в конце прохода.
+    """
+
+    def __init__(self):
+        self.config = settings.cart
+        self._task: Optional[asyncio.Task] = None
+
+    async def _drain(self, reason: str, delete_batch: Callable[[datetime, int], Awaitable[int]],
+                     before: datetime) -> int:
+        deleted = 0
+        while True:
+            count = await delete_batch(before, self.config.sweep_batch_size)
+            deleted += count
+            carts_swept_total.inc(count, reason=reason)
+            if count < self.config.sweep_batch_size:
+                return deleted
+            await asyncio.sleep(self.config.sweep_batch_pause_seconds)
+
+    async def sweep(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        now = now or datetime.utcnow()
+        swept = {}
+        async with async_session_maker() as session:
+            repo = CartRepository(session)
+            swept["ordered"] = await self._drain(
+                "ordered", repo.delete_ordered_carts,
+                now - timedelta(hours=self.config.ordered_retention_hours)
+            )
+            if self.config.idle_expire_days > 0:
+                swept["expired"] = await self._drain(
+                    "expired", repo.expire_idle_carts,
+                    now - timedelta(days=self.config.idle_expire_days)
+                )
+            await repo.delete_consumed_guest_carts(now)
+        cart_sweep_last_success_seconds.set(time.time())
+        return swept
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                swept = await self.sweep()
+                if any(swept.values()):
+                    logger.info("swept carts: %s", swept)
+            except Exception:
+                logger.exception("cart sweep failed")
+            await asyncio.sleep(self.config.sweep_interval_seconds)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+cart_sweeper = CartSweeper()
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.core.metrics import registry
+from app.core.tasks import task_queue
+from app.cart.repository import CartRepository
+
+logger = logging.getLogger("app.cart")
+
+CART_REPRICE = "cart.reprice"
+
+cart_items_repriced_total = registry.counter(
+    "cart_items_repriced_total", "Позиции активных корзин с пересчитанной ценой"
+)
+
+
+def enqueue_reprice(session: AsyncSession, product_ids: Optional[Sequence[UUID]] = None,
+                    category_id: Optional[UUID] = None) -> None:
+    """
+    Поставить пересчёт цен в корзинах в транзакцию изменения цены или акции:
+    вызывается до метода репозитория, который её фиксирует.
+    """
+    task_queue.enqueue(session, CART_REPRICE, {
+        "product_ids": [str(product_id) for product_id in product_ids] if product_ids is not None else None,
+        "category_id": str(category_id) if category_id else None,
+    })
+
+
+async def reprice_carts(repo: CartRepository, at: datetime, product_ids: Optional[Sequence[UUID]] = None,
+                        category_id: Optional[UUID] = None) -> int:
+    """
+    Привести price_at_add позиций активных корзин к текущей цене со скидкой:
+    пачки по reprice_batch_size, каждая - своя транзакция, между ними пауза
+    reprice_batch_pause_seconds, чтобы пересчёт не занимал базу подряд.
+    """
+    config = settings.cart
+    repriced = 0
+    while True:
+        count = await repo.reprice_items(at, config.reprice_batch_size, product_ids, category_id)
+        repriced += count
+        cart_items_repriced_total.inc(count)
+        if count < config.reprice_batch_size:
+            return repriced
+        await asyncio.sleep(config.reprice_batch_pause_seconds)
+
+
+@task_queue.task(CART_REPRICE)
+async def reprice_cart_items(payload: dict) -> None:
+    """Пересчёт цен в корзинах после изменения цен товаров или акций"""
+    product_ids = payload.get("product_ids")
+    category_id = payload.get("category_id")
+    async with async_session_maker() as session:
+        repriced = await reprice_carts(
+            CartRepository(session), datetime.utcnow(),
+            [UUID(product_id) for product_id in product_ids] if product_ids is not None else None,
+            UUID(category_id) if category_id else None,
+        )
+    logger.info("repriced %d cart items", repriced, extra={"event": payload})
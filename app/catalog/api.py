@@ -1,17 +1,22 @@
 from uuid import UUID
 from decimal import Decimal
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 
 from app.catalog.service import (
-    ProductService, CategoryService,
-    get_product_service, get_category_service
+    ProductService, CategoryService, PriceHistoryService,
+    get_product_service, get_category_service, get_price_history_service
 )
 from app.catalog.schemas import (
     ProductCreate, ProductUpdate, ProductRead,
-    CategoryCreate, CategoryUpdate, CategoryRead
+    CategoryCreate, CategoryUpdate, CategoryRead,
+    ProductImportResult, ProductBulkUpdate, ProductBulkUpdateResult,
+    PriceHistoryRead, ProductPriceAt
 )
+from app.catalog.importer import IMPORT_FORMATS, ProductImporter, get_product_importer
 from app.auth.service import get_current_user_dep
+from app.core.cache import response_cache
 from app.users.models import User
 from app.users.enum import UserRole
 
@@ -43,17 +48,83 @@ async def get_product(
     return await service.get_product(product_id)
 
 
+@router.get(
+    "/products/{product_id}/price-history",
+    response_model=List[PriceHistoryRead],
+    summary="История цены товара"
+)
+async def get_price_history(
+        product_id: UUID,
+        limit: int = Query(100, ge=1, le=1000),
+        current_user: User = Depends(get_current_user_dep),
+        service: PriceHistoryService = Depends(get_price_history_service)
+) -> List[PriceHistoryRead]:
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+
+    return await service.get_history(product_id, limit)
+
+
+@router.get(
+    "/products/{product_id}/price-at",
+    response_model=ProductPriceAt,
+    summary="Цена товара на момент времени"
+)
+async def get_price_at(
+        product_id: UUID,
+        at: Optional[datetime] = Query(None, description="по умолчанию - сейчас"),
+        current_user: User = Depends(get_current_user_dep),
+        service: PriceHistoryService = Depends(get_price_history_service)
+) -> ProductPriceAt:
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+
+    return await service.get_price_at(product_id, at)
+
+
+@router.get(
+    "/prices",
+    response_model=List[ProductPriceAt],
+    summary="Цены нескольких товаров на момент времени"
+)
+async def get_prices_at(
+        product_ids: List[UUID] = Query(..., max_length=1000),
+        at: Optional[datetime] = Query(None, description="по умолчанию - сейчас"),
+        current_user: User = Depends(get_current_user_dep),
+        service: PriceHistoryService = Depends(get_price_history_service)
+) -> List[ProductPriceAt]:
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+
+    return await service.get_prices_at(product_ids, at)
+
+
 @router.get(
     "/categories",
     response_model=List[CategoryRead],
     summary="Получить список категорий"
 )
 async def get_categories(
+        request: Request,
         limit: int = Query(100, ge=1, le=500),
         skip: int = Query(0, ge=0),
         service: CategoryService = Depends(get_category_service)
-) -> List[CategoryRead]:
-    return await service.get_all_categories(limit, skip)
+) -> Response:
+    payload = await response_cache.get_or_set(
+        f"catalog:categories:{limit}:{skip}",
+        lambda: service.get_all_categories(limit, skip),
+        List[CategoryRead]
+    )
+    return response_cache.render(request, payload)
 
 
 @router.get(
@@ -88,6 +159,65 @@ async def create_product(
     return await service.create_product(payload)
 
 
+@router.post(
+    "/products/import",
+    response_model=ProductImportResult,
+    summary="Массовый импорт товаров (CSV/JSONL)"
+)
+async def import_products(
+        request: Request,
+        format: Optional[str] = Query(None, description="csv | jsonl; по умолчанию по Content-Type"),
+        create_categories: bool = Query(False, description="создавать отсутствующие категории"),
+        current_user: User = Depends(get_current_user_dep),
+        importer: ProductImporter = Depends(get_product_importer)
+) -> ProductImportResult:
+    """
+    Тело запроса - файл целиком (не multipart), читается потоком.
+    Товары сопоставляются по sku: новые создаются, существующие обновляются.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+
+    fmt = format
+    if fmt is None:
+        content_type = request.headers.get("content-type", "")
+        fmt = "jsonl" if "json" in content_type else "csv"
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format, expected one of: {', '.join(IMPORT_FORMATS)}"
+        )
+
+    return await importer.run(request.stream(), fmt, create_categories=create_categories)
+
+
+@router.patch(
+    "/products/bulk",
+    response_model=ProductBulkUpdateResult,
+    summary="Массовое изменение товаров"
+)
+async def bulk_update_products(
+        payload: ProductBulkUpdate,
+        current_user: User = Depends(get_current_user_dep),
+        service: ProductService = Depends(get_product_service)
+) -> ProductBulkUpdateResult:
+    """
+    patches: [{"id": ..., "price": 10}, ...] - один UPDATE ... FROM (VALUES ...).
+    filter + price_multiplier/price_delta/set - один UPDATE по условию,
+    например {"filter": {"category_id": ...}, "price_multiplier": 1.05}.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+
+    return await service.bulk_update_products(payload)
+
+
 @router.put(
     "/products/{product_id}",
     response_model=ProductRead,
@@ -0,0 +1,336 @@
+import csv
+import json
+import time
+import codecs
+import uuid
+from decimal import Decimal, InvalidOperation
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+from app.core.cache import response_cache
+from app.cart.tasks import enqueue_reprice
+from app.catalog.repository import (
+    ProductRepository, CategoryRepository,
+    get_product_repository, get_category_repository
+)
+from app.catalog.schemas import ProductImportError, ProductImportResult
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+# (номер строки, поля строки) или (номер строки, текст ошибки разбора)
+ParsedRow = Tuple[int, Any]
+
+
+async def iter_line_batches(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+    """
+    Разбить поток байтов на строки. Строки отдаются пачками по границам
+    входных чанков, чтобы не платить за await на каждую строку.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        lines = text.split("\n")
+        tail = lines.pop()
+        if lines:
+            yield lines
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield [tail]
+
+
+def _csv_records(lines: List[str], pending: List[str]) -> Iterator[str]:
+    """
+    Склеить физические строки в CSV-записи: запись закончена, когда число
+    кавычек в ней чётное (перевод строки внутри кавычек - часть значения).
+    """
+    for line in lines:
+        pending.append(line)
+        record = "\n".join(pending)
+        if record.count('"') % 2 == 0:
+            pending.clear()
+            yield record.rstrip("\r")
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[ParsedRow]]:
+    header: Optional[List[str]] = None
+    pending: List[str] = []
+    line_no = 0
+
+    async for lines in iter_line_batches(chunks):
+        rows: List[ParsedRow] = []
+        for record in _csv_records(lines, pending):
+            start = line_no + 1
+            line_no += record.count("\n") + 1
+            if not record.strip():
+                continue
+            values = next(csv.reader([record]))
+            if header is None:
+                header = [name.strip().lower() for name in values]
+                continue
+            if len(values) != len(header):
+                rows.append((start, f"expected {len(header)} columns, got {len(values)}"))
+                continue
+            rows.append((start, dict(zip(header, values))))
+        if rows:
+            yield rows
+
+    if pending:
+        yield [(line_no + 1, "unterminated quoted field")]
+
+
+async def parse_jsonl(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[ParsedRow]]:
+    line_no = 0
+    async for lines in iter_line_batches(chunks):
+        rows: List[ParsedRow] = []
+        for line in lines:
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+            except ValueError as exc:
+                rows.append((line_no, f"invalid JSON: {exc}"))
+                continue
+            if not isinstance(value, dict):
+                rows.append((line_no, "expected JSON object"))
+                continue
+            rows.append((line_no, value))
+        if rows:
+            yield rows
+
+
+def _text(row: dict, field: str) -> Optional[str]:
+    value = row.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def validate_row(row: dict) -> Tuple[str, str, Optional[str], Decimal, Optional[float], Optional[UUID], Optional[str]]:
+    """
+    Проверить строку импорта. Возвращает
+    (sku, name, description, price, rating, category_id, category_name),
+    при ошибке - ValueError с описанием.
+    """
+    sku = _text(row, "sku")
+    if not sku:
+        raise ValueError("sku is required")
+    if len(sku) > 64:
+        raise ValueError("sku is longer than 64 characters")
+
+    name = _text(row, "name")
+    if not name:
+        raise ValueError("name is required")
+
+    raw_price = _text(row, "price")
+    if raw_price is None:
+        raise ValueError("price is required")
+    try:
+        price = Decimal(raw_price).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"invalid price: {raw_price!r}")
+    if not price.is_finite() or price < 0 or price >= Decimal("1e8"):
+        raise ValueError(f"price out of range: {raw_price!r}")
+
+    rating = None
+    raw_rating = _text(row, "rating")
+    if raw_rating is not None:
+        try:
+            rating = float(raw_rating)
+        except ValueError:
+            raise ValueError(f"invalid rating: {raw_rating!r}")
+        if rating < 0 or rating > 5:
+            raise ValueError("Rating must be between 0 and 5")
+
+    category_id = None
+    raw_category_id = _text(row, "category_id")
+    if raw_category_id is not None:
+        try:
+            category_id = UUID(raw_category_id)
+        except ValueError:
+            raise ValueError(f"invalid category_id: {raw_category_id!r}")
+
+    return sku, name, _text(row, "description"), price, rating, category_id, _text(row, "category")
+
+
+class ProductImporter:
+    """
+    Массовый импорт товаров из CSV/JSONL.
+
+    Поток читается порциями по batch_size строк. Для каждой порции имена
+    категорий разрешаются одним запросом, строки загружаются через COPY во
+    временную таблицу и сливаются в products по sku. Ошибочные строки
+    попадают в отчёт и не прерывают импорт.
+
+    CSV: заголовок с колонками sku, name, price и необязательными
+    description, rating, category (имя) или category_id.
+    JSONL: по объекту с теми же ключами на строку.
+    """
+
+    def __init__(
+            self,
+            product_repo: ProductRepository,
+            category_repo: CategoryRepository,
+            batch_size: Optional[int] = None,
+            max_reported_errors: Optional[int] = None
+    ):
+        self.product_repo = product_repo
+        self.category_repo = category_repo
+        self.batch_size = batch_size or settings.product_import.batch_size
+        self.max_reported_errors = (
+            max_reported_errors
+            if max_reported_errors is not None
+            else settings.product_import.max_reported_errors
+        )
+        self._category_ids: dict[str, UUID] = {}
+        self._known_category_ids: set[UUID] = set()
+
+    async def run(
+            self,
+            chunks: AsyncIterator[bytes],
+            fmt: str,
+            create_categories: bool = False
+    ) -> ProductImportResult:
+        started = time.perf_counter()
+        self._errors: List[ProductImportError] = []
+        self._failed = 0
+        processed = inserted = updated = categories_created = 0
+
+        parser = parse_csv if fmt == "csv" else parse_jsonl
+        batch: List[ParsedRow] = []
+
+        async def flush() -> None:
+            nonlocal inserted, updated, categories_created
+            batch_inserted, batch_updated, batch_categories = await self._load_batch(
+                batch, create_categories
+            )
+            inserted += batch_inserted
+            updated += batch_updated
+            categories_created += batch_categories
+            batch.clear()
+
+        async for rows in parser(chunks):
+            processed += len(rows)
+            batch.extend(rows)
+            if len(batch) >= self.batch_size:
+                await flush()
+        if batch:
+            await flush()
+
+        if categories_created:
+            response_cache.invalidate("catalog:categories")
+
+        duration = time.perf_counter() - started
+        return ProductImportResult(
+            processed=processed,
+            inserted=inserted,
+            updated=updated,
+            unchanged=processed - inserted - updated - self._failed,
+            failed=self._failed,
+            categories_created=categories_created,
+            errors=self._errors,
+            duration_seconds=round(duration, 3),
+            rows_per_second=round(processed / duration, 1) if duration else 0.0,
+        )
+
+    def _error(self, line: int, error: str, sku: Optional[str] = None) -> None:
+        self._failed += 1
+        if len(self._errors) < self.max_reported_errors:
+            self._errors.append(ProductImportError(line=line, sku=sku, error=error))
+
+    async def _load_batch(
+            self,
+            batch: List[ParsedRow],
+            create_categories: bool
+    ) -> Tuple[int, int, int]:
+        valid: dict[str, tuple] = {}
+        for line, row in batch:
+            if isinstance(row, str):
+                self._error(line, row)
+                continue
+            try:
+                valid_row = validate_row(row)
+            except ValueError as exc:
+                self._error(line, str(exc), _text(row, "sku"))
+                continue
+            sku = valid_row[0]
+            if sku in valid:
+                # ON CONFLICT не может обновить строку дважды за команду:
+                # оставляем последнее вхождение, как при построчной загрузке
+                self._error(valid[sku][0], f"duplicate sku, overridden by line {line}", sku)
+            valid[sku] = (line, valid_row)
+
+        categories_created = await self._resolve_categories(
+            {row[6] for _, row in valid.values() if row[6] and row[5] is None},
+            create_categories
+        )
+        await self._check_category_ids(
+            {row[5] for _, row in valid.values() if row[5] is not None}
+        )
+
+        records = []
+        lines = []
+        for line, (sku, name, description, price, rating, category_id, category_name) in valid.values():
+            if category_id is None and category_name is not None:
+                category_id = self._category_ids.get(category_name)
+                if category_id is None:
+                    self._error(line, f"Category not found: {category_name!r}", sku)
+                    continue
+            elif category_id is not None and category_id not in self._known_category_ids:
+                self._error(line, f"Category not found: {category_id}", sku)
+                continue
+            records.append((uuid.uuid4(), sku, name, description, price, rating, category_id))
+            lines.append(line)
+
+        if not records:
+            return 0, 0, categories_created
+
+        try:
+            inserted, updated = await self.product_repo.bulk_upsert_products(
+                records, on_repriced=lambda product_ids: enqueue_reprice(self.product_repo.db, product_ids)
+            )
+        except DBAPIError as exc:
+            # category_id проверены заранее; сюда попадают только непредвиденные
+            # ошибки базы - порция откатывается целиком, остальные продолжают загружаться
+            await self.product_repo.db.rollback()
+            for line, record in zip(lines, records):
+                self._error(line, f"batch rejected: {exc.orig}", record[1])
+            return 0, 0, categories_created
+
+        return inserted, updated, categories_created
+
+    async def _check_category_ids(self, category_ids: set[UUID]) -> None:
+        """
+        Явные category_id проверяются одним запросом до загрузки: иначе одна строка
+        с несуществующей категорией откатила бы всю порцию по внешнему ключу.
+        """
+        unknown = category_ids - self._known_category_ids
+        if unknown:
+            self._known_category_ids |= await self.category_repo.get_existing_ids(list(unknown))
+
+    async def _resolve_categories(self, names: set[str], create_missing: bool) -> int:
+        missing = [name for name in names if name not in self._category_ids]
+        if not missing:
+            return 0
+
+        self._category_ids.update(await self.category_repo.get_category_ids_by_names(missing))
+
+        to_create = [name for name in missing if name not in self._category_ids]
+        if not to_create or not create_missing:
+            return 0
+
+        self._category_ids.update(await self.category_repo.create_categories(to_create))
+        return len(to_create)
+
+
+async def get_product_importer(
+        product_repo: ProductRepository = Depends(get_product_repository),
+        category_repo: CategoryRepository = Depends(get_category_repository)
+) -> ProductImporter:
+    return ProductImporter(product_repo, category_repo)
@@ -1,6 +1,6 @@
 from typing import Any
 from decimal import Decimal
-from sqlalchemy import Column, String, Enum as SAEnum
+from sqlalchemy import Column, String, DateTime, DDL, PrimaryKeyConstraint, event, Enum as SAEnum
 from sqlalchemy.orm import relationship
 from app.core.db import Base, BaseModelMixin
 from app.users.enum import UserRole
@@ -42,6 +42,12 @@ class Product(Base, BaseModelMixin):
     )
 
     name = Column(String, nullable=False)
+    sku = Column(
+        String(64),
+        nullable=True,
+        unique=True,
+        comment="Артикул поставщика, ключ массового импорта"
+    )
     description = Column(String, nullable=True)
     price = Column(
         Numeric(10, 2),
@@ -72,9 +78,88 @@ class Product(Base, BaseModelMixin):
         return {
             "id": self.id,
             "name": self.name,
+            "sku": self.sku,
             "description": self.description,
             "price": float(self.price) if self.price else None,
             "rating": self.rating,
             "category_id": self.category_id,
             "category_name": self.category.name if self.category else None,
         }
+
+
+
+class ProductPriceHistory(Base):
+    """
+    История цен: строка на каждое изменение цены, цена действует с valid_from
+    до следующей строки того же товара. Пишется триггерами на products, поэтому
+    попадают все пути изменения цены (ORM, массовые UPDATE, импорт, COPY).
+
+    Таблица секционирована по valid_from (RANGE, по годам), без FK на products:
+    история нужна и после удаления товара.
+    """
+    __tablename__ = "product_price_history"
+
+    product_id = Column(UUID(as_uuid=True), nullable=False)
+    valid_from = Column(DateTime, nullable=False)
+    price = Column(Numeric(10, 2), nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("product_id", "valid_from", name="product_price_history_pkey"),
+        {"postgresql_partition_by": "RANGE (valid_from)"},
+    )
+
+    def __repr__(self) -> str:
+        return f"ProductPriceHistory(product_id={self.product_id}, price={self.price}, valid_from={self.valid_from})"
+
+
+# Statement-level триггеры с transition tables: одна вставка в историю
+# на весь UPDATE/INSERT, а не на каждую строку. clock_timestamp(), а не now():
+# два изменения цены в одной транзакции получают разные valid_from.
+PRICE_HISTORY_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION record_product_price_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO product_price_history (product_id, valid_from, price)
+        SELECT n.id, clock_timestamp() AT TIME ZONE 'utc', n.price FROM new_rows n
+        ON CONFLICT (product_id, valid_from) DO UPDATE SET price = EXCLUDED.price;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION record_product_price_update() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO product_price_history (product_id, valid_from, price)
+        SELECT n.id, clock_timestamp() AT TIME ZONE 'utc', n.price
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE o.price IS DISTINCT FROM n.price
+        ON CONFLICT (product_id, valid_from) DO UPDATE SET price = EXCLUDED.price;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER products_price_history_insert
+        AFTER INSERT ON products
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION record_product_price_insert()
+    """,
+    """
+    CREATE TRIGGER products_price_history_update
+        AFTER UPDATE ON products
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION record_product_price_update()
+    """,
+]
+
+# Для Base.metadata.create_all (тесты, scripts/seed.py); миграция создаёт
+# то же самое плюс секции по годам
+for statement in PRICE_HISTORY_DDL:
+    event.listen(Product.__table__, "after_create", DDL(statement))
+event.listen(
+    ProductPriceHistory.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS product_price_history_default PARTITION OF product_price_history DEFAULT")
+)
@@ -1,16 +1,74 @@
 from uuid import UUID
 from decimal import Decimal
-from typing import Optional, List, Dict, Any
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple, Callable
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_, or_, func, desc, asc
+from sqlalchemy import select, insert, update, delete, and_, or_, func, desc, asc, text, values, column, literal, Numeric, DateTime, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
 from sqlalchemy.orm import selectinload
 from fastapi import Depends
 
 from app.core.db import get_session
-from app.catalog.models import Product, Category
+from app.core.metrics import instrument_repository
+from app.catalog.models import Product, Category, ProductPriceHistory
 
 
+IMPORT_STAGING_TABLE = "product_import_staging"
+IMPORT_STAGING_COLUMNS = ["id", "sku", "name", "description", "price", "rating", "category_id"]
+
+# Временная таблица живёт в соединении пула и переиспользуется между импортами
+_CREATE_IMPORT_STAGING = f"""
+CREATE TEMP TABLE IF NOT EXISTS {IMPORT_STAGING_TABLE} (
+    id uuid NOT NULL,
+    sku varchar(64) NOT NULL,
+    name varchar NOT NULL,
+    description varchar,
+    price numeric(10, 2) NOT NULL,
+    rating double precision,
+    category_id uuid
+)
+"""
+
+# Неизменившиеся строки не переписываются (WHERE ... IS DISTINCT FROM),
+# чтобы повторный импорт того же файла не плодил мёртвые версии строк
+# repriced видит products до слияния: все части запроса работают с одним снимком
+_MERGE_IMPORT_STAGING = text(f"""
+WITH repriced AS (
+    SELECT p.id
+    FROM products p
+    JOIN {IMPORT_STAGING_TABLE} s ON s.sku = p.sku
+    WHERE p.price <> s.price
+),
+merged AS (
+    INSERT INTO products AS p (id, sku, name, description, price, rating, category_id, created_at, updated_at)
+    SELECT id, sku, name, description, price, rating, category_id, :now, :now
+    FROM {IMPORT_STAGING_TABLE}
+    ON CONFLICT (sku) DO UPDATE SET
+        name = EXCLUDED.name,
+        description = EXCLUDED.description,
+        price = EXCLUDED.price,
+        rating = EXCLUDED.rating,
+        category_id = EXCLUDED.category_id,
+        updated_at = EXCLUDED.updated_at
+    WHERE (p.name, p.description, p.price, p.rating, p.category_id)
+        IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.description, EXCLUDED.price, EXCLUDED.rating, EXCLUDED.category_id)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT
+    count(*) FILTER (WHERE inserted) AS inserted,
+    count(*) FILTER (WHERE NOT inserted) AS updated,
+    (SELECT coalesce(array_agg(id), '{{}}') FROM repriced) AS repriced
+FROM merged
+""")
+
+
+# лимит параметров одного запроса в протоколе PostgreSQL - 32767
+_MAX_BIND_PARAMS = 32_000
+_BULK_PATCH_FIELDS = ("name", "sku", "description", "price", "rating", "category_id")
+
+
+@instrument_repository
 class ProductRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -21,10 +79,12 @@ class ProductRepository:
             description: str,
             price: Decimal,
             category_id: Optional[UUID] = None,
-            rating: Optional[float] = None
+            rating: Optional[float] = None,
+            sku: Optional[str] = None
     ) -> Product:
         product = Product(
             name=name,
+            sku=sku,
             description=description,
             price=price,
             category_id=category_id,
@@ -81,7 +141,114 @@ class ProductRepository:
         await self.db.commit()
         return result.rowcount > 0
 
+    async def exists_by_sku(self, sku: str, exclude_id: Optional[UUID] = None) -> bool:
+        query = select(Product.id).where(Product.sku == sku)
+
+        if exclude_id:
+            query = query.where(Product.id != exclude_id)
+
+        result = await self.db.execute(query)
+        return result.scalar_one_or_none() is not None
+
+    async def bulk_patch_products(self, patches: List[Dict[str, Any]]) -> List[UUID]:
+        """
+        Применить патчи вида {"id": ..., <поле>: <значение>} через
+        UPDATE ... FROM (VALUES ...): один запрос на группу патчей с одинаковым
+        набором полей (и на каждые ~32k параметров). Всё в одной транзакции.
+        Возвращает id обновлённых товаров.
+        """
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for patch in patches:
+            fields = tuple(f for f in _BULK_PATCH_FIELDS if f in patch)
+            if fields:
+                groups.setdefault(fields, []).append(patch)
+
+        table = Product.__table__
+        now = datetime.utcnow()
+        updated: List[UUID] = []
+        for fields, group in groups.items():
+            chunk_size = _MAX_BIND_PARAMS // (len(fields) + 1)
+            for start in range(0, len(group), chunk_size):
+                chunk = group[start:start + chunk_size]
+                patch_values = values(
+                    column("id", table.c.id.type),
+                    *(column(f, table.c[f].type) for f in fields),
+                    name="patch"
+                ).data([(p["id"], *(p[f] for f in fields)) for p in chunk])
+
+                result = await self.db.execute(
+                    update(Product)
+                    .where(Product.id == patch_values.c.id)
+                    .values({**{f: patch_values.c[f] for f in fields}, "updated_at": now})
+                    .returning(Product.id)
+                    .execution_options(synchronize_session=False)
+                )
+                updated.extend(result.scalars().all())
+
+        await self.db.commit()
+        return updated
+
+    async def bulk_update_products_where(
+            self,
+            data: Dict[str, Any],
+            category_id: Optional[UUID] = None,
+            ids: Optional[List[UUID]] = None,
+            price_multiplier: Optional[Decimal] = None,
+            price_delta: Optional[Decimal] = None
+    ) -> int:
+        """Одним UPDATE изменить все товары под фильтром. Возвращает число строк"""
+        new_values = dict(data)
+        if price_multiplier is not None or price_delta is not None:
+            # без явного Numeric() множитель привёлся бы к типу колонки numeric(10, 2)
+            price = Product.price
+            if price_multiplier is not None:
+                price = price * literal(price_multiplier, Numeric())
+            if price_delta is not None:
+                price = price + literal(price_delta, Numeric())
+            new_values["price"] = func.round(price, 2)
 
+        query = update(Product).values(**new_values, updated_at=datetime.utcnow())
+        if category_id is not None:
+            query = query.where(Product.category_id == category_id)
+        if ids is not None:
+            query = query.where(Product.id.in_(ids))
+
+        result = await self.db.execute(query.execution_options(synchronize_session=False))
+        await self.db.commit()
+        return result.rowcount
+
+    async def bulk_upsert_products(
+            self,
+            records: List[tuple],
+            on_repriced: Optional[Callable[[List[UUID]], None]] = None
+    ) -> Tuple[int, int]:
+        """
+        Загрузить порцию товаров во временную таблицу через COPY и слить её
+        в products одним INSERT ... ON CONFLICT (sku). Записи - кортежи
+        в порядке IMPORT_STAGING_COLUMNS, sku внутри порции уникальны.
+        on_repriced получает id существовавших товаров с новой ценой
+        до commit - его работа попадает в транзакцию слияния.
+        Возвращает (вставлено, обновлено).
+        """
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver = raw_connection.driver_connection
+
+        await driver.execute(_CREATE_IMPORT_STAGING)
+        await driver.execute(f"TRUNCATE {IMPORT_STAGING_TABLE}")
+        await driver.copy_records_to_table(
+            IMPORT_STAGING_TABLE, records=records, columns=IMPORT_STAGING_COLUMNS
+        )
+
+        result = await self.db.execute(_MERGE_IMPORT_STAGING, {"now": datetime.utcnow()})
+        inserted, updated, repriced = result.one()
+        if repriced and on_repriced is not None:
+            on_repriced(list(repriced))
+        await self.db.commit()
+        return inserted, updated
+
+
+@instrument_repository
 class CategoryRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -149,10 +316,97 @@ class CategoryRepository:
         result = await self.db.execute(query)
         return result.scalar_one_or_none() is not None
 
+    async def get_existing_ids(self, category_ids: List[UUID]) -> set[UUID]:
+        result = await self.db.execute(
+            select(Category.id).where(Category.id.in_(category_ids))
+        )
+        return set(result.scalars().all())
+
+    async def get_category_ids_by_names(self, names: List[str]) -> Dict[str, UUID]:
+        result = await self.db.execute(
+            select(Category.name, Category.id)
+            .where(Category.name.in_(names))
+            .order_by(Category.created_at)
+        )
+        ids: Dict[str, UUID] = {}
+        for name, category_id in result.all():
+            ids.setdefault(name, category_id)
+        return ids
+
+    async def create_categories(self, names: List[str]) -> Dict[str, UUID]:
+        result = await self.db.execute(
+            insert(Category).returning(Category.name, Category.id),
+            [{"name": name} for name in names]
+        )
+        ids = {name: category_id for name, category_id in result.all()}
+        await self.db.commit()
+        return ids
+
+
+# Для каждого товара - последняя строка истории не позже момента :at.
+# LATERAL + LIMIT 1 идёт по индексу (product_id, valid_from) в каждой секции.
+_PRICES_AT = text("""
+SELECT ids.id, h.price
+FROM unnest(:ids) AS ids(id)
+CROSS JOIN LATERAL (
+    SELECT price
+    FROM product_price_history
+    WHERE product_id = ids.id AND valid_from <= :at
+    ORDER BY valid_from DESC
+    LIMIT 1
+) h
+""").bindparams(
+    bindparam("ids", type_=ARRAY(PG_UUID(as_uuid=True))),
+    bindparam("at", type_=DateTime()),
+)
+
+
+# те же часы, что у триггеров истории цен (clock_timestamp() в UTC)
+_DB_NOW = text("SELECT clock_timestamp() AT TIME ZONE 'utc'")
+
+
+@instrument_repository
+class PriceHistoryRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_db_now(self) -> datetime:
+        result = await self.db.execute(_DB_NOW)
+        return result.scalar_one()
+
+    async def get_history(self, product_id: UUID, limit: int = 100) -> List[ProductPriceHistory]:
+        result = await self.db.execute(
+            select(ProductPriceHistory)
+            .where(ProductPriceHistory.product_id == product_id)
+            .order_by(ProductPriceHistory.valid_from.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    async def get_price_at(self, product_id: UUID, at: datetime) -> Optional[Decimal]:
+        result = await self.db.execute(
+            select(ProductPriceHistory.price)
+            .where(
+                ProductPriceHistory.product_id == product_id,
+                ProductPriceHistory.valid_from <= at
+            )
+            .order_by(ProductPriceHistory.valid_from.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_prices_at(self, product_ids: List[UUID], at: datetime) -> Dict[UUID, Decimal]:
+        result = await self.db.execute(_PRICES_AT, {"ids": product_ids, "at": at})
+        return {product_id: price for product_id, price in result.all()}
+
 
 async def get_product_repository(db: AsyncSession = Depends(get_session)) -> ProductRepository:
     return ProductRepository(db)
 
 
 async def get_category_repository(db: AsyncSession = Depends(get_session)) -> CategoryRepository:
-    return CategoryRepository(db)
\ No newline at end of file
+    return CategoryRepository(db)
+
+
+async def get_price_history_repository(db: AsyncSession = Depends(get_session)) -> PriceHistoryRepository:
+    return PriceHistoryRepository(db)
@@ -1,9 +1,12 @@
 from uuid import UUID
 from decimal import Decimal
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel
+from typing import Annotated, Optional, List
+from pydantic import BaseModel, Field
 
+# products.price - numeric(10, 2): значения шире колонки отклоняются здесь (422),
+# а не ошибкой базы при записи
+Price = Annotated[Decimal, Field(max_digits=10, decimal_places=2)]
 
 # catalog
 class CategoryCreate(BaseModel):
@@ -26,21 +29,24 @@ class CategoryRead(BaseModel):
 
 class ProductCreate(BaseModel):
     name: str
+    sku: Optional[str] = None
     description: Optional[str] = None
-    price: Decimal
+    price: Price
     rating: Optional[float] = None
     category_id: Optional[UUID] = None
 
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
+    sku: Optional[str] = None
     description: Optional[str] = None
-    price: Optional[Decimal] = None
+    price: Optional[Price] = None
     rating: Optional[float] = None
     category_id: Optional[UUID] = None
 
 class ProductRead(BaseModel):
     id: UUID
     name: str
+    sku: Optional[str] = None
     description: Optional[str]
     price: Decimal
     rating: Optional[float]
@@ -49,4 +55,66 @@ class ProductRead(BaseModel):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+# price history
+
+class PriceHistoryRead(BaseModel):
+    product_id: UUID
+    price: Decimal
+    valid_from: datetime
+
+    class Config:
+        from_attributes = True
+
+class ProductPriceAt(BaseModel):
+    product_id: UUID
+    at: datetime
+    price: Optional[Decimal]
+
+
+# bulk update
+
+class ProductPatch(ProductUpdate):
+    id: UUID
+
+class ProductBulkFilter(BaseModel):
+    category_id: Optional[UUID] = None
+    ids: Optional[List[UUID]] = None
+
+class ProductBulkUpdate(BaseModel):
+    """
+    Либо patches - свои поля для каждого товара,
+    либо filter + изменения для всех подходящих товаров:
+    new_price = price * price_multiplier + price_delta, поля из set.
+    """
+    patches: Optional[List[ProductPatch]] = Field(None, max_length=10_000)
+    filter: Optional[ProductBulkFilter] = None
+    price_multiplier: Optional[Decimal] = Field(None, gt=0, max_digits=12, decimal_places=6)
+    price_delta: Optional[Price] = None
+    set: Optional[ProductUpdate] = None
+
+class ProductBulkUpdateResult(BaseModel):
+    matched: int
+    updated: int
+    not_found: List[UUID] = []
+
+
+# import
+
+class ProductImportError(BaseModel):
+    line: int
+    sku: Optional[str] = None
+    error: str
+
+class ProductImportResult(BaseModel):
+    processed: int
+    inserted: int
+    updated: int
+    unchanged: int
+    failed: int
+    categories_created: int
+    errors: List[ProductImportError]
+    duration_seconds: float
+    rows_per_second: float
@@ -1,15 +1,21 @@
 from uuid import UUID
 from decimal import Decimal
+from datetime import datetime, timezone
 from typing import List, Optional
 from fastapi import Depends, HTTPException, status
+from sqlalchemy.exc import DataError, IntegrityError
 
 from app.catalog.repository import (
-    ProductRepository, CategoryRepository,
-    get_product_repository, get_category_repository
+    ProductRepository, CategoryRepository, PriceHistoryRepository,
+    get_product_repository, get_category_repository, get_price_history_repository
 )
+from app.core.cache import response_cache
+from app.cart.tasks import enqueue_reprice
 from app.catalog.schemas import (
     ProductCreate, ProductUpdate, ProductRead,
-    CategoryCreate, CategoryUpdate, CategoryRead
+    CategoryCreate, CategoryUpdate, CategoryRead,
+    ProductBulkUpdate, ProductBulkUpdateResult,
+    PriceHistoryRead, ProductPriceAt
 )
 
 
@@ -33,8 +39,15 @@ class ProductService:
                 detail="Rating must be between 0 and 5"
             )
 
+        if data.sku and await self.product_repo.exists_by_sku(data.sku):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Product with this SKU already exists"
+            )
+
         product = await self.product_repo.create_product(
             name=data.name,
+            sku=data.sku,
             description=data.description,
             price=data.price,
             category_id=data.category_id,
@@ -76,6 +89,8 @@ class ProductService:
 
         update_data = data.model_dump(exclude_unset=True)
 
+        old_price = product.price
+
         if 'category_id' in update_data and update_data['category_id']:
             category = await self.category_repo.get_category_by_id(update_data['category_id'])
             if not category:
@@ -91,6 +106,15 @@ class ProductService:
                     detail="Rating must be between 0 and 5"
                 )
 
+        if update_data.get('sku'):
+            if await self.product_repo.exists_by_sku(update_data['sku'], exclude_id=product_id):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Product with this SKU already exists"
+                )
+
+        if update_data.get('price') is not None and update_data['price'] != old_price:
+            enqueue_reprice(self.product_repo.db, [product_id])
         updated_product = await self.product_repo.update_product(
             product_id=product_id,
             data=update_data
@@ -108,6 +132,144 @@ class ProductService:
 
         return await self.product_repo.delete_product(product_id)
 
+    async def bulk_update_products(self, data: ProductBulkUpdate) -> ProductBulkUpdateResult:
+        if (data.patches is None) == (data.filter is None):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Either patches or filter must be provided"
+            )
+
+        if data.patches is not None:
+            result = await self._bulk_patch(data)
+        else:
+            result = await self._bulk_update_where(data)
+
+        # один сброс кэша каталога на всю операцию
+        response_cache.invalidate("catalog:")
+        return result
+
+    async def _bulk_patch(self, data: ProductBulkUpdate) -> ProductBulkUpdateResult:
+        patches = [patch.model_dump(exclude_unset=True) for patch in data.patches]
+
+        ids = [patch["id"] for patch in patches]
+        if len(set(ids)) != len(ids):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Duplicate product id in patches"
+            )
+
+        for patch in patches:
+            self._validate_bulk_fields(patch)
+        await self._check_categories_exist(
+            {patch["category_id"] for patch in patches if patch.get("category_id")}
+        )
+
+        repriced = [patch["id"] for patch in patches if "price" in patch]
+        if repriced:
+            # несуществующие id пересчёт пропустит
+            enqueue_reprice(self.product_repo.db, repriced)
+        try:
+            updated = await self.product_repo.bulk_patch_products(patches)
+        except IntegrityError:
+            await self.product_repo.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Bulk update violates product constraints (duplicate sku or invalid values)"
+            )
+
+        updated_ids = set(updated)
+        return ProductBulkUpdateResult(
+            matched=len(updated_ids),
+            updated=len(updated_ids),
+            not_found=[product_id for product_id in ids if product_id not in updated_ids],
+        )
+
+    async def _bulk_update_where(self, data: ProductBulkUpdate) -> ProductBulkUpdateResult:
+        if data.filter.category_id is None and not data.filter.ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Filter must contain category_id or ids"
+            )
+
+        fields = data.set.model_dump(exclude_unset=True) if data.set else {}
+        if "sku" in fields:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="SKU cannot be set for multiple products"
+            )
+        if "price" in fields and (data.price_multiplier is not None or data.price_delta is not None):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Use either set.price or price_multiplier/price_delta"
+            )
+        if not fields and data.price_multiplier is None and data.price_delta is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Nothing to update"
+            )
+
+        self._validate_bulk_fields(fields)
+        if fields.get("category_id"):
+            await self._check_categories_exist({fields["category_id"]})
+
+        if "price" in fields or data.price_multiplier is not None or data.price_delta is not None:
+            enqueue_reprice(self.product_repo.db, data.filter.ids, data.filter.category_id)
+        try:
+            updated = await self.product_repo.bulk_update_products_where(
+                fields,
+                category_id=data.filter.category_id,
+                ids=data.filter.ids,
+                price_multiplier=data.price_multiplier,
+                price_delta=data.price_delta,
+            )
+        except IntegrityError:
+            await self.product_repo.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Bulk update violates product constraints (price must stay >= 0)"
+            )
+        except DataError:
+            # множитель/сдвиг корректны по отдельности, но новая цена не влезает в numeric(10, 2)
+            await self.product_repo.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Resulting price is out of range"
+            )
+
+        return ProductBulkUpdateResult(matched=updated, updated=updated)
+
+    @staticmethod
+    def _validate_bulk_fields(fields: dict) -> None:
+        rating = fields.get("rating")
+        if rating is not None and (rating < 0 or rating > 5):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Rating must be between 0 and 5"
+            )
+
+        price = fields.get("price")
+        if "price" in fields and (price is None or price < 0):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Price must be non-negative"
+            )
+
+        if "name" in fields and not fields["name"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Name cannot be empty"
+            )
+
+    async def _check_categories_exist(self, category_ids: set) -> None:
+        if not category_ids:
+            return
+        existing = await self.category_repo.get_existing_ids(list(category_ids))
+        if existing != category_ids:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Category not found"
+            )
+
 
 class CategoryService:
     def __init__(self, category_repo: CategoryRepository):
@@ -121,6 +283,7 @@ class CategoryService:
             )
 
         category = await self.category_repo.create_category(name=data.name)
+        response_cache.invalidate("catalog:categories")
         return CategoryRead.model_validate(category)
 
     async def get_category(self, category_id: UUID) -> CategoryRead:
@@ -169,6 +332,7 @@ class CategoryService:
             category_id=category_id,
             name=data.name
         )
+        response_cache.invalidate("catalog:categories")
 
         return CategoryRead.model_validate(updated_category)
 
@@ -186,7 +350,51 @@ class CategoryService:
                 detail="Cannot delete category with products. Move or delete products first."
             )
 
-        return await self.category_repo.delete_category(category_id)
+        deleted = await self.category_repo.delete_category(category_id)
+        response_cache.invalidate("catalog:categories")
+        return deleted
+
+
+class PriceHistoryService:
+    def __init__(self, history_repo: PriceHistoryRepository, product_repo: ProductRepository):
+        self.history_repo = history_repo
+        self.product_repo = product_repo
+
+    async def _resolve_at(self, at: Optional[datetime]) -> datetime:
+        # valid_from ставят триггеры по часам базы - "сейчас" берётся оттуда же,
+        # иначе расхождение часов приложения и базы сдвигает ответ на границе смены цены
+        if at is None:
+            return await self.history_repo.get_db_now()
+        # даты в БД хранятся как naive UTC
+        if at.tzinfo is not None:
+            return at.astimezone(timezone.utc).replace(tzinfo=None)
+        return at
+
+    async def get_history(self, product_id: UUID, limit: int = 100) -> List[PriceHistoryRead]:
+        history = await self.history_repo.get_history(product_id, limit)
+        if not history and not await self.product_repo.get_product_by_id(product_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        return [PriceHistoryRead.model_validate(h) for h in history]
+
+    async def get_price_at(self, product_id: UUID, at: Optional[datetime] = None) -> ProductPriceAt:
+        at = await self._resolve_at(at)
+        price = await self.history_repo.get_price_at(product_id, at)
+        return ProductPriceAt(product_id=product_id, at=at, price=price)
+
+    async def get_prices_at(
+            self,
+            product_ids: List[UUID],
+            at: Optional[datetime] = None
+    ) -> List[ProductPriceAt]:
+        at = await self._resolve_at(at)
+        prices = await self.history_repo.get_prices_at(product_ids, at)
+        return [
+            ProductPriceAt(product_id=product_id, at=at, price=prices.get(product_id))
+            for product_id in product_ids
+        ]
 
 
 async def get_product_service(
@@ -200,3 +408,10 @@ async def get_category_service(
         category_repo: CategoryRepository = Depends(get_category_repository)
 ) -> CategoryService:
     return CategoryService(category_repo)
+
+
+async def get_price_history_service(
+        history_repo: PriceHistoryRepository = Depends(get_price_history_repository),
+        product_repo: ProductRepository = Depends(get_product_repository)
+) -> PriceHistoryService:
+    return PriceHistoryService(history_repo, product_repo)
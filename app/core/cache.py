@@ -0,0 +1,98 @@
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+from app.core.compression import choose_encoding, compress
+
+
+class CachedPayload:
+    """
+    Ответ, сериализованный в JSON один раз.
+    Сжатые варианты (gzip/br) считаются при первом запросе и хранятся рядом с исходным телом.
+    """
+
+    def __init__(self, body: bytes, expires_at: float):
+        self.body = body
+        self.expires_at = expires_at
+        self._encoded: dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+
+class ResponseCache:
+    """Простой in-process кэш готовых JSON-ответов с TTL"""
+
+    def __init__(self, ttl_seconds: int, minimum_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.minimum_size = minimum_size
+        self._entries: dict[str, CachedPayload] = {}
+        self._adapters: dict[Any, TypeAdapter] = {}
+
+    async def get_or_set(
+            self,
+            key: str,
+            factory: Callable[[], Awaitable[Any]],
+            response_model: Any
+    ) -> CachedPayload:
+        """
+        Данные сериализуются через response_model эндпоинта - как это сделал бы FastAPI:
+        лишние поля отбрасываются, ответ совпадает со схемой в OpenAPI.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            return entry
+
+        adapter = self._adapter(response_model)
+        data = await factory()
+        body = adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+        entry = CachedPayload(body, time.monotonic() + self.ttl_seconds)
+        self._entries[key] = entry
+        return entry
+
+    def _adapter(self, response_model: Any) -> TypeAdapter:
+        adapter = self._adapters.get(response_model)
+        if adapter is None:
+            adapter = self._adapters[response_model] = TypeAdapter(response_model)
+        return adapter
+
+    def invalidate(self, *prefixes: str) -> None:
+        """Сбросить все записи, ключ которых начинается с одного из префиксов"""
+        for key in [k for k in self._entries if k.startswith(prefixes)]:
+            del self._entries[key]
+
+    def render(
+            self,
+            request: Request,
+            payload: CachedPayload,
+            status_code: int = 200
+    ) -> Response:
+        encoding: Optional[str] = None
+        if len(payload.body) >= self.minimum_size:
+            encoding = choose_encoding(request.headers.get("accept-encoding"))
+
+        if encoding is None:
+            return Response(
+                content=payload.body,
+                status_code=status_code,
+                media_type="application/json",
+                headers={"Vary": "Accept-Encoding"},
+            )
+
+        return Response(
+            content=payload.encoded(encoding),
+            status_code=status_code,
+            media_type="application/json",
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+        )
+
+
+response_cache = ResponseCache(
+    ttl_seconds=settings.cache.ttl_seconds,
+    minimum_size=settings.compression.minimum_size,
+)
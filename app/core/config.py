@@ -16,6 +16,7 @@ class DBConfig(BaseModel):
     db_password: str
     db_host: str
     db_port: int
+    echo: bool = False
 
     @property
     def dsl(self):
@@ -30,12 +31,156 @@ class AuthConfig(BaseModel):
     refresh_token_expire_days: int
 
 
+class CompressionConfig(BaseModel):
+    minimum_size: int = 500
+    gzip_level: int = 6
+    brotli_quality: int = 4
+
+
+class CacheConfig(BaseModel):
+    ttl_seconds: int = 30
+
+
+class ProfilingConfig(BaseModel):
+    enabled: bool = True
+    n_plus_one_threshold: int = 5
+
+
+class MetricsConfig(BaseModel):
+    enabled: bool = True
+    # каталог для снимков метрик воркеров; пусто - только метрики текущего процесса
+    multiprocess_dir: str = ""
+    flush_interval_seconds: float = 5.0
+
+
+class SlowQueryConfig(BaseModel):
+    threshold_ms: float = 200.0
+    # доля медленных SELECT, для которых асинхронно снимается EXPLAIN (ANALYZE, BUFFERS)
+    explain_sample_rate: float = 0.0
+    # сколько разных форм запросов хранить в агрегате
+    max_shapes: int = 500
+    # снятие плана не ждёт чужих блокировок дольше этого
+    explain_lock_timeout_ms: int = 100
+
+
+class ImportConfig(BaseModel):
+    # строк в одной порции COPY + merge; каждая порция - отдельная транзакция
+    batch_size: int = 10_000
+    # сколько ошибок по строкам возвращать в ответе (считаются все)
+    max_reported_errors: int = 1000
+
+
+class TasksConfig(BaseModel):
+    enabled: bool = True
+    # сколько задач выполняется одновременно в одном процессе
+    concurrency: int = 4
+    poll_interval_seconds: float = 1.0
+    max_attempts: int = 5
+    backoff_base_seconds: float = 1.0
+    backoff_max_seconds: float = 300.0
+    # сколько задача считается занятой воркером, прежде чем её заберёт другой
+    lease_seconds: float = 60.0
+    # сколько ждать текущие задачи при остановке
+    drain_timeout_seconds: float = 10.0
+
+
+class EventsConfig(BaseModel):
+    relay_enabled: bool = True
+    # сколько событий relay публикует за одну транзакцию
+    relay_batch_size: int = 5000
+    relay_poll_interval_seconds: float = 0.5
+    # опубликованные события старше этого удаляются
+    retention_hours: float = 168.0
+    # как часто long-poll и SSE перечитывают поток, если событие
+    # опубликовал relay другого процесса
+    tail_poll_interval_seconds: float = 1.0
+    max_wait_seconds: float = 30.0
+    heartbeat_seconds: float = 15.0
+    # LISTEN outbox_events: одно соединение на процесс будит все SSE/long-poll
+    listener_enabled: bool = True
+    # событий в очереди одного SSE-клиента; переполнение закрывает поток,
+    # клиент переподключается с Last-Event-ID
+    subscriber_queue_size: int = 100
+    # на сколько событий назад можно продолжить по Last-Event-ID
+    max_resume_gap: int = 100_000
+
+
+class IdempotencyConfig(BaseModel):
+    # сколько хранится ответ по Idempotency-Key
+    ttl_hours: float = 24.0
+    # сколько запрос считается выполняющимся; потом ключ может забрать повтор
+    lock_timeout_seconds: float = 30.0
+    # сколько повтор ждёт исходный запрос, прежде чем вернуть 409
+    wait_timeout_seconds: float = 10.0
+    poll_interval_seconds: float = 0.1
+    cleanup_interval_seconds: float = 300.0
+
+
+class OrdersConfig(BaseModel):
+    # на сколько месяцев вперёд держать готовые партиции orders/order_items
+    partition_premake_months: int = 3
+    # партиции старше стольких месяцев отсоединяются (DETACH), 0 - хранить всё
+    partition_retention_months: int = 0
+    partition_check_interval_seconds: float = 3600.0
+    # выполненные и отменённые заказы старше стольких дней переносятся в архив, 0 - не переносить
+    archive_after_days: int = 0
+    # каталог архива: сегменты gzip JSONL и индекс SQLite
+    archive_dir: str = "var/orders_archive"
+    archive_batch_size: int = 1000
+    archive_interval_seconds: float = 3600.0
+    # куда фоновые задачи отправляют уведомления о заказах (POST JSON); пусто - только в лог
+    notify_webhook_url: str = ""
+    notify_timeout_seconds: float = 10.0
+
+
+class CartConfig(BaseModel):
+    sweep_interval_seconds: float = 600.0
+    # корзин за одну транзакцию удаления
+    sweep_batch_size: int = 1000
+    # пауза между пачками: очистка не занимает соединения и блокировки подряд
+    sweep_batch_pause_seconds: float = 0.1
+    # оформленные корзины (ORDERED) удаляются через столько часов: состав уже есть в order_items
+    ordered_retention_hours: float = 24.0
+    # активная корзина без изменений столько дней удаляется, 0 - не удалять
+    idle_expire_days: int = 30
+    # корзина гостя (подписанный токен) действительна столько дней с последнего изменения
+    guest_cart_ttl_days: int = 30
+    guest_cart_max_lines: int = 100
+    # write_through - каждое изменение корзины сразу в базу;
+    # write_behind - изменения копятся в памяти процесса и пишутся пачками (app/cart/store.py)
+    store: str = "write_through"
+    flush_interval_seconds: float = 1.0
+    # корзин за одну транзакцию записи
+    flush_batch_size: int = 500
+    # журнал изменений, ещё не записанных в базу
+    journal_dir: str = "var/cart_journal"
+    # пересчёт цен в активных корзинах после изменения цен и акций: позиций за транзакцию и пауза между ними
+    reprice_batch_size: int = 1000
+    reprice_batch_pause_seconds: float = 0.2
+
+
+class PromotionsConfig(BaseModel):
+    # планировщик просыпается на ближайшей границе акции, но не реже чем раз в столько секунд
+    scheduler_max_sleep_seconds: float = 60.0
+
 
 class Settings(BaseModel):
     app: APPConfig
     db: DBConfig
     db_test: DBConfig
     auth: AuthConfig
+    compression: CompressionConfig = CompressionConfig()
+    cache: CacheConfig = CacheConfig()
+    profiling: ProfilingConfig = ProfilingConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    slow_query: SlowQueryConfig = SlowQueryConfig()
+    product_import: ImportConfig = ImportConfig()
+    tasks: TasksConfig = TasksConfig()
+    events: EventsConfig = EventsConfig()
+    idempotency: IdempotencyConfig = IdempotencyConfig()
+    orders: OrdersConfig = OrdersConfig()
+    cart: CartConfig = CartConfig()
+    promotions: PromotionsConfig = PromotionsConfig()
 
 
 env_settings = Dynaconf(settings_file=["settings.toml"])
@@ -44,7 +189,19 @@ settings = Settings(
     app=env_settings["app_settings"], 
     db=env_settings["db_settings"], 
     db_test=env_settings["db_test_settings"], 
-    auth=env_settings["auth_settings"])
+    auth=env_settings["auth_settings"],
+    compression=env_settings.get("compression_settings", {}),
+    cache=env_settings.get("cache_settings", {}),
+    profiling=env_settings.get("profiling_settings", {}),
+    metrics=env_settings.get("metrics_settings", {}),
+    slow_query=env_settings.get("slow_query_settings", {}),
+    product_import=env_settings.get("import_settings", {}),
+    tasks=env_settings.get("tasks_settings", {}),
+    events=env_settings.get("events_settings", {}),
+    idempotency=env_settings.get("idempotency_settings", {}),
+    orders=env_settings.get("orders_settings", {}),
+    cart=env_settings.get("cart_settings", {}),
+    promotions=env_settings.get("promotions_settings", {}))
 
 if __name__ == "__main__":
     print(settings.db.dsl)
\ No newline at end of file
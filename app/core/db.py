@@ -1,14 +1,30 @@
+import re
 import uuid
+import time
+import random
+import asyncio
+import logging
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator
 
 
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase, declarative_mixin
-from sqlalchemy import Column, DateTime
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import Column, DateTime, event
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.core.config import settings
+from app.core.profiling import install_query_hooks, statement_shape
+from app.core.metrics import registry, db_pool_wait_seconds, current_repository_call
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+# ANALYZE выполняет запрос: блокировки строк, nextval и advisory-блокировки
+# остались бы у снятия плана, поэтому для таких запросов - EXPLAIN без ANALYZE
+_EXPLAIN_ONLY_RE = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b|nextval|advisory", re.IGNORECASE
+)
 
 class Base(DeclarativeBase):
     pass
@@ -20,14 +36,168 @@ class BaseModelMixin:
     updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
-db_dsn = (
-    settings.db_test.dsl
-    if settings.app.mode == "test"
-    else settings.db.dsl
-)
+db_config = settings.db_test if settings.app.mode == "test" else settings.db
+db_dsn = db_config.dsl
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий время ожидания свободного соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - started)
+
 
 # echo True увидем какие логи - какие sql запросы отправляет приложение к БД 
-engine = create_async_engine(db_dsn, echo=True)
+# (в settings.toml: db_settings.echo); для прода есть журнал медленных запросов ниже
+engine = create_async_engine(db_dsn, echo=db_config.echo, poolclass=InstrumentedQueuePool)
+install_query_hooks(engine)
+
+registry.gauge(
+    "db_pool_checked_out", "Соединения, выданные из пула",
+    collect=lambda: engine.pool.checkedout()
+)
+registry.gauge(
+    "db_pool_overflow", "Соединения сверх pool_size",
+    collect=lambda: max(engine.pool.overflow(), 0)
+)
+
+def redact_parameters(parameters: Any) -> Any:
+    """Вместо значений параметров - только их типы, чтобы в лог не попали персональные данные"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(value) if isinstance(value, (list, tuple, dict))
+                else type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    """
+    Журнал медленных запросов: пишет в лог запросы дольше threshold_ms,
+    агрегирует их по формам и по выборке снимает план выполнения.
+    """
+
+    def __init__(self, threshold_ms: float, explain_sample_rate: float, max_shapes: int,
+                 explain_lock_timeout_ms: int = 100):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_lock_timeout_ms = explain_lock_timeout_ms
+        self.max_shapes = max_shapes
+        self._shapes: dict[str, dict[str, Any]] = {}
+        self._explain_tasks: set[asyncio.Task] = set()
+
+    def install(self, engine) -> None:
+        sync_engine = engine.sync_engine
+
+        # время начала хранится в контексте выполнения: упавший запрос
+        # не доходит до after_cursor_execute и не сбивает замер следующего
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context.slow_query_start_time = time.perf_counter()
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, "slow_query_start_time", None)
+            if started is None:
+                return
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= self.threshold_ms:
+                self.record(statement, parameters, duration_ms)
+
+    def record(self, statement: str, parameters: Any, duration_ms: float) -> None:
+        if statement.lstrip().upper().startswith("EXPLAIN"):
+            return
+
+        # в лог и в агрегат попадает только форма запроса: литералы в тексте SQL
+        # могут содержать те же персональные данные, что и параметры
+        shape = statement_shape(statement)
+        repository_call = current_repository_call.get()
+        slow_query_logger.warning(
+            "slow query %.1f ms in %s: %s params=%s",
+            duration_ms,
+            repository_call or "<unknown>",
+            shape,
+            redact_parameters(parameters),
+        )
+
+        entry = self._shapes.get(shape)
+        if entry is None:
+            if len(self._shapes) >= self.max_shapes:
+                weakest = min(self._shapes, key=lambda key: self._shapes[key]["total_ms"])
+                del self._shapes[weakest]
+            entry = self._shapes[shape] = {
+                "shape": shape,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "repository_calls": [],
+                "plan": None,
+            }
+
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        entry["last_seen"] = datetime.utcnow()
+        if repository_call and repository_call not in entry["repository_calls"]:
+            entry["repository_calls"].append(repository_call)
+
+        if (
+            statement.lstrip().upper().startswith("SELECT")
+            and random.random() < self.explain_sample_rate
+        ):
+            self._schedule_explain(shape, statement, parameters)
+
+    def _schedule_explain(self, shape: str, statement: str, parameters: Any) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._capture_explain(shape, statement, parameters))
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+
+    async def _capture_explain(self, shape: str, statement: str, parameters: Any) -> None:
+        # ANALYZE выполняет запрос: только SELECT без побочных эффектов, в транзакции
+        # только для чтения, которая не ждёт чужих блокировок и откатывается
+        explain = "EXPLAIN" if _EXPLAIN_ONLY_RE.search(statement) else "EXPLAIN (ANALYZE, BUFFERS)"
+        try:
+            async with engine.connect() as conn:
+                await conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+                await conn.exec_driver_sql(f"SET LOCAL lock_timeout = {int(self.explain_lock_timeout_ms)}")
+                result = await conn.exec_driver_sql(f"{explain} {statement}", parameters)
+                plan = "\n".join(row[0] for row in result)
+                await conn.rollback()
+        except Exception:
+            slow_query_logger.exception("failed to capture EXPLAIN for slow query")
+            return
+
+        if shape in self._shapes:
+            self._shapes[shape]["plan"] = plan
+        slow_query_logger.warning("plan for slow query %s:\n%s", shape, plan)
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> list[dict[str, Any]]:
+        entries = sorted(self._shapes.values(), key=lambda e: e[order_by], reverse=True)
+        return [
+            {**entry, "avg_ms": entry["total_ms"] / entry["count"]}
+            for entry in entries[:limit]
+        ]
+
+    def reset(self) -> None:
+        self._shapes.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.slow_query.threshold_ms,
+    explain_sample_rate=settings.slow_query.explain_sample_rate,
+    max_shapes=settings.slow_query.max_shapes,
+    explain_lock_timeout_ms=settings.slow_query.explain_lock_timeout_ms,
+)
+slow_query_log.install(engine)
+
 
 # Из движка нужно получить сессию (наш коннект), 
 # sessionmaker принимает движок и передать параметр, что сессия будет асинхронной
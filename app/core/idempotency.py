@@ -0,0 +1,354 @@
+import time
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Optional
+from uuid import UUID
+
+from fastapi import Depends, Header, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import Column, String, Integer, DateTime, LargeBinary, ForeignKey, Index
+from sqlalchemy import select, update, delete, tuple_
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import Base, get_session, async_session_maker
+from app.core.metrics import registry
+from app.auth.service import get_current_user_dep
+from app.users.models import User
+
+logger = logging.getLogger("app.idempotency")
+
+REPLAY_HEADER = "Idempotent-Replayed"
+
+idempotent_requests_total = registry.counter(
+    "idempotent_requests_total", "Запросы с Idempotency-Key", ("result",)
+)
+
+
+class IdempotencyKey(Base):
+    """
+    Ключ идемпотентности пользователя. Пока status_code пуст, запрос
+    выполняется (до locked_until); после - хранится готовый ответ,
+    который отдаётся повторам до expires_at.
+    """
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(PG_UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    # метод, путь и тело запроса: тот же ключ с другим запросом - ошибка клиента
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    content_type = Column(String(100), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"IdempotencyKey(user_id={self.user_id}, key={self.key}, status_code={self.status_code})"
+
+
+class _Waiter:
+    """Событие завершения запроса по ключу и число повторов, которые его ждут"""
+
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.count = 0
+
+
+# повторы в этом же процессе просыпаются сразу, в других - по poll_interval_seconds
+_waiters: dict[tuple[UUID, str], _Waiter] = {}
+
+
+def _wake_waiters(user_id: UUID, key: str) -> None:
+    waiter = _waiters.pop((user_id, key), None)
+    if waiter is not None:
+        waiter.event.set()
+
+
+def _join_waiter(user_id: UUID, key: str, current: Optional[_Waiter]) -> _Waiter:
+    """Ждать текущее событие ключа; прежнее (уже разбуженное) отпускается"""
+    waiter = _waiters.get((user_id, key))
+    if waiter is not None and waiter is current:
+        return current
+    if current is not None:
+        _leave_waiter(user_id, key, current)
+    if waiter is None:
+        waiter = _waiters[(user_id, key)] = _Waiter()
+    waiter.count += 1
+    return waiter
+
+
+def _leave_waiter(user_id: UUID, key: str, waiter: _Waiter) -> None:
+    # запрос мог выполняться в другом процессе: тогда событие никто не заберёт
+    waiter.count -= 1
+    if waiter.count == 0 and _waiters.get((user_id, key)) is waiter:
+        del _waiters[(user_id, key)]
+
+
+class IdempotentRequest:
+    """
+    Состояние запроса с Idempotency-Key внутри эндпоинта:
+
+        if guard.replay is not None:
+            return guard.replay
+        result = await service.do_work(...)
+        return await guard.respond(result)
+
+    Без заголовка guard ничего не делает, respond() возвращает результат как есть.
+    """
+
+    def __init__(self, session: Optional[AsyncSession] = None, user_id: Optional[UUID] = None,
+                 key: Optional[str] = None, request_hash: Optional[str] = None):
+        self.config = settings.idempotency
+        self.session = session
+        self.user_id = user_id
+        self.key = key
+        self.request_hash = request_hash
+        self.replay: Optional[Response] = None
+        self.owner = False
+        self.completed = False
+        self._waiter: Optional[_Waiter] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.key is not None
+
+    def _where(self):
+        return (IdempotencyKey.user_id == self.user_id, IdempotencyKey.key == self.key)
+
+    async def acquire(self) -> None:
+        """
+        Занять ключ или дождаться исходного запроса. По выходу либо
+        owner=True (выполнять), либо replay - готовый ответ.
+        """
+        try:
+            await self._acquire()
+        finally:
+            if self._waiter is not None:
+                _leave_waiter(self.user_id, self.key, self._waiter)
+                self._waiter = None
+
+    async def _acquire(self) -> None:
+        deadline = time.monotonic() + self.config.wait_timeout_seconds
+        waited = False
+        while True:
+            now = datetime.utcnow()
+            inserted = await self.session.execute(
+                pg_insert(IdempotencyKey)
+                .values(
+                    user_id=self.user_id,
+                    key=self.key,
+                    request_hash=self.request_hash,
+                    locked_until=now + timedelta(seconds=self.config.lock_timeout_seconds),
+                    created_at=now,
+                    expires_at=now + timedelta(hours=self.config.ttl_hours),
+                )
+                .on_conflict_do_nothing()
+                .returning(IdempotencyKey.key)
+            )
+            if inserted.scalar_one_or_none() is not None:
+                await self.session.commit()
+                self.owner = True
+                idempotent_requests_total.inc(result="executed")
+                return
+
+            result = await self.session.execute(select(IdempotencyKey).where(*self._where()))
+            record = result.scalar_one_or_none()
+            # ничего не держим между проверками: новый снимок на каждой итерации
+            await self.session.commit()
+            if record is None:
+                continue
+
+            if record.request_hash != self.request_hash:
+                idempotent_requests_total.inc(result="mismatch")
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used with a different request"
+                )
+
+            if record.expires_at <= now:
+                await self.session.execute(
+                    delete(IdempotencyKey).where(*self._where(), IdempotencyKey.expires_at <= now)
+                )
+                await self.session.commit()
+                continue
+
+            if record.status_code is not None:
+                idempotent_requests_total.inc(result="waited" if waited else "replayed")
+                self.replay = Response(
+                    content=record.response_body,
+                    status_code=record.status_code,
+                    media_type=record.content_type,
+                    headers={REPLAY_HEADER: "true"},
+                )
+                return
+
+            if record.locked_until is not None and record.locked_until <= now:
+                # исходный запрос не завершился (упал процесс) - выполняем заново
+                taken = await self.session.execute(
+                    update(IdempotencyKey)
+                    .where(*self._where(), IdempotencyKey.status_code.is_(None),
+                           IdempotencyKey.locked_until <= now)
+                    .values(locked_until=now + timedelta(seconds=self.config.lock_timeout_seconds))
+                    .execution_options(synchronize_session=False)
+                )
+                await self.session.commit()
+                if taken.rowcount:
+                    self.owner = True
+                    idempotent_requests_total.inc(result="executed")
+                    return
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                idempotent_requests_total.inc(result="in_progress")
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress"
+                )
+            waited = True
+            self._waiter = _join_waiter(self.user_id, self.key, self._waiter)
+            try:
+                await asyncio.wait_for(
+                    self._waiter.event.wait(), timeout=min(remaining, self.config.poll_interval_seconds)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def respond(self, content: Any, status_code: int = status.HTTP_200_OK) -> Any:
+        """Сохранить ответ для повторов и вернуть его; отданные байты и есть сохранённые"""
+        if not self.owner:
+            return content
+        response = JSONResponse(jsonable_encoder(content), status_code=status_code)
+        await self._store(response.status_code, response.body, response.media_type)
+        return response
+
+    async def store_error(self, exc: HTTPException) -> None:
+        """Ошибка бизнес-логики (4xx) - тоже окончательный ответ, повтор получит её же"""
+        await self.session.rollback()
+        response = JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+        await self._store(response.status_code, response.body, response.media_type)
+
+    async def _store(self, status_code: int, body: bytes, content_type: str) -> None:
+        await self.session.execute(
+            update(IdempotencyKey)
+            .where(*self._where())
+            .values(status_code=status_code, response_body=body,
+                    content_type=content_type, locked_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        self.completed = True
+        _wake_waiters(self.user_id, self.key)
+
+    async def release(self) -> None:
+        """Непредвиденная ошибка: освободить ключ, чтобы повтор выполнил запрос заново"""
+        try:
+            await self.session.rollback()
+            await self.session.execute(
+                delete(IdempotencyKey).where(*self._where(), IdempotencyKey.status_code.is_(None))
+            )
+            await self.session.commit()
+        except Exception:
+            logger.exception("failed to release idempotency key")
+        _wake_waiters(self.user_id, self.key)
+
+
+async def idempotent_request(
+        request: Request,
+        idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
+        current_user: User = Depends(get_current_user_dep),
+        session: AsyncSession = Depends(get_session),
+) -> AsyncIterator[IdempotentRequest]:
+    """
+    Зависимость для небезопасных для повтора POST (создание заказа,
+    оформление корзины). Ключи принадлежат пользователю: один и тот же
+    ключ у разных пользователей не пересекается.
+    """
+    if idempotency_key is None:
+        yield IdempotentRequest()
+        return
+
+    body = await request.body()
+    digest = hashlib.sha256(f"{request.method} {request.url.path}\n".encode() + body).hexdigest()
+    guard = IdempotentRequest(session, current_user.id, idempotency_key, digest)
+    await guard.acquire()
+
+    try:
+        yield guard
+    except HTTPException as exc:
+        if guard.owner and not guard.completed and exc.status_code < 500:
+            await guard.store_error(exc)
+        elif guard.owner and not guard.completed:
+            await guard.release()
+        raise
+    except BaseException:
+        if guard.owner and not guard.completed:
+            await guard.release()
+        raise
+    else:
+        if guard.owner and not guard.completed:
+            await guard.release()
+
+
+class IdempotencyKeyCleaner:
+    """Периодическое удаление просроченных ключей (в каждом процессе, без конкуренции за строки)"""
+
+    BATCH_SIZE = 5000
+
+    def __init__(self):
+        self.config = settings.idempotency
+        self._task: Optional[asyncio.Task] = None
+
+    async def cleanup(self) -> int:
+        deleted = 0
+        async with async_session_maker() as session:
+            while True:
+                expired = (
+                    select(IdempotencyKey.user_id, IdempotencyKey.key)
+                    .where(IdempotencyKey.expires_at < datetime.utcnow())
+                    .limit(self.BATCH_SIZE)
+                    .with_for_update(skip_locked=True)
+                )
+                result = await session.execute(
+                    delete(IdempotencyKey)
+                    .where(tuple_(IdempotencyKey.user_id, IdempotencyKey.key).in_(expired))
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+                deleted += result.rowcount
+                if result.rowcount < self.BATCH_SIZE:
+                    return deleted
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                deleted = await self.cleanup()
+                if deleted:
+                    logger.info("expired %d idempotency keys", deleted)
+            except Exception:
+                logger.exception("idempotency key cleanup failed")
+            await asyncio.sleep(self.config.cleanup_interval_seconds)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+idempotency_key_cleaner = IdempotencyKeyCleaner()
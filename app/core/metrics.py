@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import asyncio
+import functools
+import inspect
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], Any] = {}
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "type": self.type_name,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(key), value] for key, value in self._values.items()],
+        }
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 collect: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0.0
+        # collect - функция, вычисляющая значение в момент сбора метрик
+        self.collect = collect
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def snapshot(self) -> dict[str, Any]:
+        if self.collect is not None:
+            self._values[()] = float(self.collect())
+        return super().snapshot()
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = {
+                "buckets": [0] * (len(self.buckets) + 1),
+                "sum": 0.0,
+                "count": 0,
+            }
+        state["buckets"][bisect_left(self.buckets, value)] += 1
+        state["sum"] += value
+        state["count"] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        data = super().snapshot()
+        data["bucket_bounds"] = list(self.buckets)
+        return data
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик одного процесса.
+
+    Значения хранятся в обычных словарях без блокировок: внутри воркера весь код
+    выполняется в одном event loop. При нескольких воркерах uvicorn каждый процесс
+    периодически сбрасывает снимок в multiprocess_dir, а /metrics суммирует снимки.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            return self._metrics[metric.name]
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              collect: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> dict[str, Any]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    # multiprocess
+
+    @property
+    def multiprocess_dir(self) -> Optional[Path]:
+        directory = settings.metrics.multiprocess_dir
+        return Path(directory) if directory else None
+
+    def flush(self) -> None:
+        directory = self.multiprocess_dir
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        target = directory / f"metrics_{os.getpid()}.json"
+        tmp = target.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"pid": os.getpid(), "metrics": self.snapshot()}))
+        tmp.replace(target)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.metrics.flush_interval_seconds)
+            self.flush()
+
+    async def start(self) -> None:
+        if self.multiprocess_dir is not None and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self.flush()
+
+    def collect(self) -> dict[str, Any]:
+        """Снимок метрик всех воркеров (или только текущего, если multiprocess выключен)"""
+        own = self.snapshot()
+        directory = self.multiprocess_dir
+        if directory is None:
+            return own
+
+        merged = json.loads(json.dumps(own))
+        for path in directory.glob("metrics_*.json"):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if data["pid"] == os.getpid():
+                continue
+            _merge(merged, data["metrics"], alive=_pid_alive(data["pid"]))
+        return merged
+
+    def render(self) -> str:
+        return render_text(self.collect())
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(target: dict[str, Any], source: dict[str, Any], alive: bool) -> None:
+    for name, metric in source.items():
+        # gauge умершего воркера не имеет смысла, а счётчики и гистограммы сохраняем
+        if metric["type"] == "gauge" and not alive:
+            continue
+        current = target.setdefault(name, {**metric, "samples": []})
+        samples = {tuple(labels): value for labels, value in current["samples"]}
+        for labels, value in metric["samples"]:
+            key = tuple(labels)
+            if key not in samples:
+                samples[key] = value
+            elif metric["type"] == "histogram":
+                samples[key] = {
+                    "buckets": [a + b for a, b in zip(samples[key]["buckets"], value["buckets"])],
+                    "sum": samples[key]["sum"] + value["sum"],
+                    "count": samples[key]["count"] + value["count"],
+                }
+            else:
+                samples[key] = samples[key] + value
+        current["samples"] = [[list(key), value] for key, value in samples.items()]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render_text(metrics: dict[str, Any]) -> str:
+    """Текстовый формат экспозиции Prometheus"""
+    lines = []
+    for name, metric in metrics.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["labelnames"]
+        for labels, value in metric["samples"]:
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(names, labels)} {float(value)}")
+                continue
+
+            cumulative = 0
+            bounds = [str(b) for b in metric["bucket_bounds"]] + ["+Inf"]
+            for bound, count in zip(bounds, value["buckets"]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_format_labels(names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(names, labels)} {value['sum']}")
+            lines.append(f"{name}_count{_format_labels(names, labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# HTTP
+
+http_requests_total = registry.counter(
+    "http_requests_total", "Количество HTTP-запросов", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "Длительность HTTP-запросов", ("method", "route")
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "Запросы, обрабатываемые в данный момент"
+)
+
+# Репозитории и пул соединений
+
+repository_call_duration_seconds = registry.histogram(
+    "repository_call_duration_seconds",
+    "Длительность вызовов методов репозиториев",
+    ("repository", "method"),
+)
+db_pool_wait_seconds = registry.histogram(
+    "db_pool_wait_seconds", "Время ожидания соединения из пула"
+)
+
+# Доменные события
+
+orders_created_total = registry.counter("orders_created_total", "Созданные заказы")
+carts_checked_out_total = registry.counter("carts_checked_out_total", "Оформленные корзины")
+login_failures_total = registry.counter("login_failures_total", "Неудачные попытки входа")
+bcrypt_queue_depth = registry.gauge(
+    "bcrypt_queue_depth", "Операции bcrypt, ожидающие или выполняющиеся в пуле потоков"
+)
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Шаблон маршрута (/api/v1/orders/my/{order_id}) вместо фактического пути,
+    чтобы метки не разрастались по числу идентификаторов.
+    Берётся из маршрута, который роутер положил в scope при сопоставлении.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """Метрики HTTP-запросов: латентность по шаблону маршрута, статусы, запросы в работе"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+        http_requests_in_flight.inc()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            route = route_template(scope)
+            http_request_duration_seconds.observe(
+                time.perf_counter() - started, method=scope["method"], route=route
+            )
+            http_requests_total.inc(method=scope["method"], route=route, status=status_code)
+
+
+# Инструментирование репозиториев
+
+current_repository_call: ContextVar[Optional[str]] = ContextVar(
+    "current_repository_call", default=None
+)
+
+
+def instrument_repository(cls):
+    """
+    Декоратор класса репозитория: замеряет длительность каждого публичного
+    async-метода и запоминает, какой метод сейчас выполняется (используется в логах SQL).
+    """
+    for attr, func in list(vars(cls).items()):
+        if attr.startswith("_") or not inspect.iscoroutinefunction(func):
+            continue
+        setattr(cls, attr, _timed(cls.__name__, attr, func))
+    return cls
+
+
+def _timed(repository: str, method: str, func):
+    call_name = f"{repository}.{method}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = current_repository_call.set(call_name)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            repository_call_duration_seconds.observe(
+                time.perf_counter() - started, repository=repository, method=method
+            )
+            current_repository_call.reset(token)
+
+    return wrapper
@@ -0,0 +1,135 @@
+import re
+import time
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import route_template
+
+logger = logging.getLogger("app.profiling")
+
+_PLACEHOLDERS_RE = re.compile(r"\$\d+(?:::[\w\[\]]+)?(?:\s*,\s*\$\d+(?:::[\w\[\]]+)?)*")
+_LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Нормализовать SQL до "формы": без параметров, литералов и длины IN-списков.
+    Одинаковые формы в рамках одного запроса - признак N+1.
+    """
+    shape = _PLACEHOLDERS_RE.sub("?", statement)
+    shape = _LITERALS_RE.sub("?", shape)
+    return _SPACES_RE.sub(" ", shape).strip()
+
+
+class QueryStats:
+    """Статистика SQL-запросов в рамках одного HTTP-запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated_shapes(self, threshold: int) -> list[tuple[str, int]]:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+def install_query_hooks(engine: AsyncEngine) -> None:
+    """Подключить подсчёт запросов к движку"""
+    sync_engine = engine.sync_engine
+
+    # время начала - в контексте выполнения, а не в общем стеке соединения:
+    # after_cursor_execute для упавшего запроса не вызывается, и чужая
+    # отметка не достанется следующему запросу
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.query_start_time = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "query_start_time", None)
+        stats = _current_stats.get()
+        if stats is not None and started is not None:
+            stats.record(statement, time.perf_counter() - started)
+
+
+class QueryProfilingMiddleware:
+    """
+    Считает SQL-запросы на каждый HTTP-запрос.
+    Результат уходит в заголовок Server-Timing и в лог; при повторяющихся
+    формах запросов (>= n_plus_one_threshold) пишется предупреждение о N+1.
+    """
+
+    def __init__(self, app: ASGIApp, n_plus_one_threshold: Optional[int] = None):
+        self.app = app
+        self.n_plus_one_threshold = (
+            n_plus_one_threshold
+            if n_plus_one_threshold is not None
+            else settings.profiling.n_plus_one_threshold
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.profiling.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.total_time * 1000:.2f};desc="{stats.count} queries"'
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            self._report(scope, stats, time.perf_counter() - started)
+
+    def _report(self, scope: Scope, stats: QueryStats, duration: float) -> None:
+        path = route_template(scope)
+        summary = {
+            "method": scope["method"],
+            "path": path,
+            "queries": stats.count,
+            "db_ms": round(stats.total_time * 1000, 2),
+            "total_ms": round(duration * 1000, 2),
+        }
+        logger.info("request db stats", extra={"db_stats": summary})
+
+        repeated = stats.repeated_shapes(self.n_plus_one_threshold)
+        if repeated:
+            logger.warning(
+                "possible N+1 in %s %s: %s",
+                scope["method"],
+                path,
+                "; ".join(f"{n}x {shape[:200]}" for shape, n in repeated),
+                extra={"db_stats": summary, "repeated_shapes": repeated},
+            )
@@ -1,4 +1,7 @@
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from app.core.metrics import bcrypt_queue_depth
 
 #Контекст для работы с паролями
 pwd_context = CryptContext(
@@ -13,3 +16,22 @@ def hash_password(password: str) -> str:
 #Проверка - подходит ли введенный пароль к хэшу из БД
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+
+
+#bcrypt намеренно медленный, поэтому в async-коде хэширование выполняется в пуле потоков,
+#чтобы не блокировать event loop
+async def hash_password_async(password: str) -> str:
+    bcrypt_queue_depth.inc()
+    try:
+        return await run_in_threadpool(hash_password, password)
+    finally:
+        bcrypt_queue_depth.dec()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    bcrypt_queue_depth.inc()
+    try:
+        return await run_in_threadpool(verify_password, plain_password, hashed_password)
+    finally:
+        bcrypt_queue_depth.dec()
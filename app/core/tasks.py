@@ -0,0 +1,328 @@
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index, Enum as SAEnum
+from sqlalchemy import select, update, delete, and_, or_, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import Base, BaseModelMixin, async_session_maker
+from app.core.metrics import registry
+
+logger = logging.getLogger("app.tasks")
+
+TaskHandler = Callable[[dict], Awaitable[None]]
+
+_PENDING_KEY = "tasks_pending"
+
+background_tasks_total = registry.counter(
+    "background_tasks_total", "Выполненные фоновые задачи", ("task", "result")
+)
+background_task_duration_seconds = registry.histogram(
+    "background_task_duration_seconds", "Длительность фоновых задач", ("task",)
+)
+
+
+class TaskStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+
+
+class BackgroundTask(Base, BaseModelMixin):
+    """
+    Очередь фоновых задач в Postgres. Задача записывается в той же транзакции,
+    что и бизнес-данные: либо фиксируется вместе с ними, либо не появляется вовсе.
+    Успешно выполненные задачи удаляются, исчерпавшие попытки остаются
+    со статусом failed.
+    """
+    __tablename__ = "background_tasks"
+
+    name = Column(String(100), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+    status = Column(SAEnum(TaskStatus, name="task_status_enum"),
+                    nullable=False, default=TaskStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # до этого момента задача считается взятой воркером; потом её может забрать другой
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_background_tasks_status_run_after", "status", "run_after"),
+    )
+
+    def __repr__(self) -> str:
+        return f"BackgroundTask(id={self.id}, name={self.name}, status={self.status}, attempts={self.attempts})"
+
+
+class TaskQueue:
+    """
+    Очередь фоновых задач внутри процесса.
+
+    - task(name) регистрирует обработчик, enqueue() добавляет задачу в транзакцию сессии;
+    - диспетчер забирает задачи пачками (FOR UPDATE SKIP LOCKED), поэтому
+      несколько воркеров uvicorn не выполнят одну задачу дважды;
+    - одновременно выполняется не больше concurrency задач;
+    - пока обработчик работает, аренда (locked_until) продлевается каждую треть
+      lease_seconds: долгую задачу не заберёт другой воркер;
+    - при ошибке задача откладывается с экспоненциальной задержкой, после
+      max_attempts остаётся в таблице со статусом failed;
+    - stop() перестаёт брать новые задачи и ждёт текущие drain_timeout секунд.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = async_session_maker):
+        self.config = settings.tasks
+        self._session_factory = session_factory
+        self._handlers: dict[str, TaskHandler] = {}
+        self._wakeup = asyncio.Event()
+        self._running: set[asyncio.Task] = set()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def task(self, name: str) -> Callable[[TaskHandler], TaskHandler]:
+        def register(handler: TaskHandler) -> TaskHandler:
+            self._handlers[name] = handler
+            return handler
+        return register
+
+    def enqueue(
+            self,
+            session: AsyncSession,
+            name: str,
+            payload: Optional[dict] = None,
+            delay_seconds: float = 0,
+            max_attempts: Optional[int] = None
+    ) -> None:
+        """
+        Добавить задачу в текущую транзакцию сессии. Сессия не фиксируется:
+        задача уйдёт в БД тем же commit, что и изменение, которое её вызвало,
+        поэтому вызывать нужно до commit (в том числе до commit внутри репозитория).
+        После commit диспетчер процесса будится, не дожидаясь опроса.
+        """
+        if name not in self._handlers:
+            raise ValueError(f"Unknown task: {name}")
+
+        session.add(BackgroundTask(
+            name=name,
+            payload=payload or {},
+            max_attempts=max_attempts or self.config.max_attempts,
+            run_after=datetime.utcnow() + timedelta(seconds=delay_seconds),
+        ))
+        session.info.setdefault(_PENDING_KEY, set()).add(self)
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if not self.config.enabled or self._dispatcher is not None:
+            return
+        self._stopping = False
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self) -> None:
+        if self._dispatcher is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._dispatcher
+        self._dispatcher = None
+
+        if self._running:
+            done, pending = await asyncio.wait(self._running, timeout=self.config.drain_timeout_seconds)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning("cancelled %d background tasks on shutdown", len(pending))
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def run_once(self, limit: Optional[int] = None) -> int:
+        """Забрать готовые задачи и выполнить их до конца (скрипты, тесты). Возвращает число задач"""
+        tasks = await self._claim(limit or self.config.concurrency)
+        await asyncio.gather(*(self._run(*task) for task in tasks))
+        return len(tasks)
+
+    async def _dispatch_loop(self) -> None:
+        while not self._stopping:
+            claimed = 0
+            try:
+                free_slots = self.config.concurrency - len(self._running)
+                if free_slots > 0:
+                    tasks = await self._claim(free_slots)
+                    claimed = len(tasks)
+                    for task in tasks:
+                        self._spawn(task)
+            except Exception:
+                logger.exception("failed to claim background tasks")
+
+            if claimed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.config.poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, limit: int) -> list[tuple]:
+        now = datetime.utcnow()
+        ready = (
+            select(BackgroundTask.id)
+            .where(or_(
+                and_(BackgroundTask.status == TaskStatus.PENDING, BackgroundTask.run_after <= now),
+                # задачи воркера, который упал, не дойдя до конца
+                and_(BackgroundTask.status == TaskStatus.RUNNING, BackgroundTask.locked_until < now),
+            ))
+            .order_by(BackgroundTask.run_after)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        async with self._session_factory() as session:
+            result = await session.execute(
+                update(BackgroundTask)
+                .where(BackgroundTask.id.in_(ready.scalar_subquery()))
+                .values(
+                    status=TaskStatus.RUNNING,
+                    attempts=BackgroundTask.attempts + 1,
+                    locked_until=now + timedelta(seconds=self.config.lease_seconds),
+                    updated_at=now,
+                )
+                .returning(
+                    BackgroundTask.id, BackgroundTask.name, BackgroundTask.payload,
+                    BackgroundTask.attempts, BackgroundTask.max_attempts,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            tasks = result.all()
+            await session.commit()
+        return tasks
+
+    def _spawn(self, task: tuple) -> None:
+        runner = asyncio.create_task(self._run(*task))
+        self._running.add(runner)
+        runner.add_done_callback(self._running.discard)
+
+    async def _run(self, task_id, name: str, payload: dict, attempts: int, max_attempts: int) -> None:
+        handler = self._handlers.get(name)
+        started = time.perf_counter()
+        lease = asyncio.create_task(self._keep_lease(task_id, attempts))
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for task {name}")
+            await handler(payload)
+        except asyncio.CancelledError:
+            # остановка процесса: вернуть задачу в очередь без штрафа за попытку
+            await self._stop_lease(lease)
+            await self._finish(task_id, attempts, TaskStatus.PENDING, attempts_delta=-1)
+            raise
+        except Exception as exc:
+            await self._stop_lease(lease)
+            background_tasks_total.inc(task=name, result="error")
+            if attempts >= max_attempts:
+                logger.exception("background task %s failed permanently", name)
+                await self._finish(task_id, attempts, TaskStatus.FAILED, error=repr(exc))
+            else:
+                delay = self._backoff(attempts)
+                logger.warning("background task %s failed (attempt %d), retry in %.1fs: %r",
+                               name, attempts, delay, exc)
+                await self._finish(task_id, attempts, TaskStatus.PENDING, error=repr(exc),
+                                   delay_seconds=delay)
+        else:
+            await self._stop_lease(lease)
+            background_tasks_total.inc(task=name, result="ok")
+            await self._finish(task_id, attempts, None)
+        finally:
+            background_task_duration_seconds.observe(time.perf_counter() - started, task=name)
+
+    async def _keep_lease(self, task_id, attempts: int) -> None:
+        """Продлевать аренду, пока обработчик работает"""
+        interval = self.config.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.extend_lease(task_id, attempts):
+                    logger.warning("background task %s lease lost", task_id)
+                    return
+            except Exception:
+                logger.exception("failed to extend lease of background task %s", task_id)
+
+    @staticmethod
+    async def _stop_lease(lease: asyncio.Task) -> None:
+        lease.cancel()
+        await asyncio.gather(lease, return_exceptions=True)
+
+    async def extend_lease(self, task_id, attempts: int) -> bool:
+        """
+        Сдвинуть locked_until на lease_seconds вперёд. attempts - номер попытки этого
+        воркера: если задачу уже забрал другой, строка не меняется и возвращается False.
+        """
+        now = datetime.utcnow()
+        async with self._session_factory() as session:
+            result = await session.execute(
+                update(BackgroundTask)
+                .where(
+                    BackgroundTask.id == task_id,
+                    BackgroundTask.status == TaskStatus.RUNNING,
+                    BackgroundTask.attempts == attempts,
+                )
+                .values(locked_until=now + timedelta(seconds=self.config.lease_seconds), updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        return result.rowcount > 0
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.config.backoff_max_seconds, self.config.backoff_base_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _finish(
+            self,
+            task_id,
+            attempts: int,
+            new_status: Optional[TaskStatus],
+            error: Optional[str] = None,
+            delay_seconds: float = 0,
+            attempts_delta: int = 0
+    ) -> None:
+        """
+        new_status=None - задача выполнена и удаляется из очереди.
+        Условие на attempts: если аренда истекла и задачу забрал другой воркер,
+        результат этой попытки его состояние не перезаписывает.
+        """
+        owned = (BackgroundTask.id == task_id, BackgroundTask.attempts == attempts)
+        async with self._session_factory() as session:
+            if new_status is None:
+                await session.execute(delete(BackgroundTask).where(*owned))
+            else:
+                now = datetime.utcnow()
+                await session.execute(
+                    update(BackgroundTask)
+                    .where(*owned)
+                    .values(
+                        status=new_status,
+                        attempts=BackgroundTask.attempts + attempts_delta,
+                        run_after=now + timedelta(seconds=delay_seconds),
+                        locked_until=None,
+                        last_error=error,
+                        updated_at=now,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatchers(session: Session) -> None:
+    # задачи зафиксированы - не ждать следующего опроса очереди
+    for queue in session.info.pop(_PENDING_KEY, ()):
+        queue.wake()
+
+
+task_queue = TaskQueue()
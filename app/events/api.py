@@ -0,0 +1,87 @@
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, Header, Path, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.auth.service import require_admin
+from app.core.config import settings
+from app.events.schemas import OutboxEventRead, ConsumerAck, ConsumerOffsetRead
+from app.events.service import EventService, get_event_service
+from app.users.models import User
+
+AggregateType = Literal["order", "cart"]
+
+router = APIRouter()
+
+
+@router.get(
+    "/",
+    response_model=List[OutboxEventRead],
+    summary="[Админ] События после позиции (long-poll)",
+)
+async def tail_events(
+    after: int = Query(0, ge=0, description="последний полученный published_seq"),
+    limit: int = Query(100, ge=1, le=1000),
+    wait: float = Query(0, ge=0, le=settings.events.max_wait_seconds,
+                        description="сколько секунд ждать, если новых событий нет"),
+    aggregate_type: Optional[AggregateType] = Query(None),
+    admin: User = Depends(require_admin),
+    service: EventService = Depends(get_event_service),
+) -> List[OutboxEventRead]:
+    """
+    Следующий запрос - с after = published_seq последнего события ответа.
+    Пустой список - за время wait новых событий не было.
+    """
+    return await service.tail(after, limit, wait, aggregate_type)
+
+
+@router.get(
+    "/stream",
+    summary="[Админ] Поток событий (SSE)",
+)
+async def stream_events(
+    request: Request,
+    after: Optional[int] = Query(None, ge=0),
+    aggregate_type: Optional[AggregateType] = Query(None),
+    last_event_id: Optional[int] = Header(None, ge=0),
+    admin: User = Depends(require_admin),
+    service: EventService = Depends(get_event_service),
+) -> StreamingResponse:
+    # после переподключения EventSource присылает Last-Event-ID - он важнее after
+    after_seq = last_event_id if last_event_id is not None else (after or 0)
+    return StreamingResponse(
+        service.stream(after_seq, request.is_disconnected, aggregate_type),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get(
+    "/consumers/{consumer}",
+    response_model=ConsumerOffsetRead,
+    summary="[Админ] Позиция потребителя и отставание",
+)
+async def get_consumer(
+    consumer: str = Path(..., max_length=100),
+    admin: User = Depends(require_admin),
+    service: EventService = Depends(get_event_service),
+) -> ConsumerOffsetRead:
+    return await service.get_consumer(consumer)
+
+
+@router.post(
+    "/consumers/{consumer}/ack",
+    response_model=ConsumerOffsetRead,
+    summary="[Админ] Подтвердить обработку событий до seq",
+)
+async def ack_events(
+    payload: ConsumerAck,
+    consumer: str = Path(..., max_length=100),
+    admin: User = Depends(require_admin),
+    service: EventService = Depends(get_event_service),
+) -> ConsumerOffsetRead:
+    """
+    Внешний потребитель читает GET /events?after=<last_seq> и подтверждает
+    обработанное. Позиция только растёт; одновременный ack того же
+    потребителя из другого экземпляра получает 409.
+    """
+    return await service.ack(consumer, payload.seq)
@@ -0,0 +1,48 @@
+from typing import Awaitable, Callable, List, Optional
+
+from app.core.db import async_session_maker
+from app.events.models import OutboxEvent
+from app.events.repository import EventRepository
+
+EventHandler = Callable[[List[OutboxEvent]], Awaitable[None]]
+
+
+class EventConsumer:
+    """
+    Потребитель потока событий внутри процесса (склад, письма, аналитика).
+
+    poll() берёт позицию потребителя FOR UPDATE SKIP LOCKED: если её держит
+    другой экземпляр того же потребителя (другой воркер uvicorn), пачка
+    пропускается, а не обрабатывается дважды. Позиция сдвигается в той же
+    транзакции после успешной обработки; если обработчик упал, пачка придёт
+    снова (доставка at-least-once).
+    """
+
+    def __init__(self, name: str, handler: EventHandler, batch_size: int = 1000,
+                 aggregate_type: Optional[str] = None):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.aggregate_type = aggregate_type
+
+    async def poll(self) -> int:
+        """Обработать одну пачку; возвращает число событий (0 - нечего или занято)"""
+        async with async_session_maker() as session:
+            repo = EventRepository(session)
+            last_seq = await repo.claim_offset(self.name)
+            if last_seq is None:
+                await session.rollback()
+                return 0
+
+            events = await repo.get_events_after(last_seq, self.batch_size, self.aggregate_type)
+            if not events:
+                await session.rollback()
+                return 0
+
+            try:
+                await self.handler(events)
+            except Exception:
+                await session.rollback()
+                raise
+            await repo.advance_offset(self.name, events[-1].published_seq)
+            return len(events)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Optional
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.db import db_config
+from app.events.relay import outbox_relay, NOTIFY_CHANNEL
+
+logger = logging.getLogger("app.events")
+
+RECONNECT_MIN_SECONDS = 1.0
+RECONNECT_MAX_SECONDS = 30.0
+
+
+class OutboxListener:
+    """
+    Одно соединение LISTEN outbox_events на процесс. Relay любого процесса
+    после публикации делает NOTIFY с последним published_seq; listener будит
+    всех ожидающих в этом процессе (long-poll, SSE), так что клиенты не
+    опрашивают базу каждый по отдельности.
+
+    Соединение отдельное, не из пула: LISTEN живёт, пока соединение открыто.
+    При обрыве - переподключение с нарастающей задержкой; пока соединения
+    нет, ожидающие просыпаются по tail_poll_interval_seconds.
+    """
+
+    def __init__(self):
+        self.config = settings.events
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[asyncpg.Connection] = None
+
+    def _on_notify(self, conn, pid: int, channel: str, payload: str) -> None:
+        try:
+            seq = int(payload)
+        except ValueError:
+            seq = 0
+        outbox_relay.notify_published(seq)
+
+    async def _connect(self) -> asyncpg.Connection:
+        return await asyncpg.connect(
+            user=db_config.db_user,
+            password=db_config.db_password,
+            host=db_config.db_host,
+            port=db_config.db_port,
+            database=db_config.db_name,
+        )
+
+    async def _run(self) -> None:
+        delay = RECONNECT_MIN_SECONDS
+        while True:
+            conn = None
+            try:
+                conn = await self._connect()
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _: closed.set())
+                await conn.add_listener(NOTIFY_CHANNEL, self._on_notify)
+            except Exception as exc:
+                # любая ошибка подключения или LISTEN - повтор, а не остановка listener навсегда
+                logger.warning("outbox listener connect failed, retry in %.0fs: %r", delay, exc)
+                if conn is not None:
+                    conn.terminate()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+                continue
+
+            self._conn = conn
+            delay = RECONNECT_MIN_SECONDS
+            # пока соединения не было, публикации могли пройти мимо - разбудить ожидающих
+            outbox_relay.notify_published(0)
+
+            await closed.wait()
+            self._conn = None
+            logger.warning("outbox listener connection lost, reconnecting")
+
+    async def start(self) -> None:
+        if not self.config.listener_enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+outbox_listener = OutboxListener()
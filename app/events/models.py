@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from sqlalchemy import Column, String, BigInteger, DateTime, Index, Sequence, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+
+from app.core.db import Base
+
+# Источник published_seq. Отдельная последовательность, а не max() по таблице:
+# очистка старых событий не должна откатывать нумерацию назад, иначе потребители
+# и SSE-клиенты с сохранённым номером пропускали бы новые события
+published_seq_sequence = Sequence("outbox_published_seq", metadata=Base.metadata)
+
+
+class OutboxEvent(Base):
+    """
+    Доменное событие (transactional outbox). Пишется в той же транзакции,
+    что и изменение заказа или корзины, поэтому событие есть тогда и только
+    тогда, когда изменение зафиксировано.
+
+    id выдаётся при вставке и не отражает порядок фиксации транзакций.
+    Порядок потока задаёт published_seq: его проставляет relay уже после
+    фиксации, поэтому потребитель, читающий по published_seq, не пропустит
+    событие из транзакции, зафиксированной позже соседних.
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    aggregate_type = Column(String(32), nullable=False)
+    aggregate_id = Column(UUID(as_uuid=True), nullable=False)
+    event_type = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    published_seq = Column(BigInteger, nullable=True)
+    published_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ux_outbox_events_published_seq", "published_seq", unique=True),
+        # очередь relay: только неопубликованные события
+        Index("ix_outbox_events_unpublished", "id", postgresql_where=text("published_seq IS NULL")),
+        Index("ix_outbox_events_published_at", "published_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"OutboxEvent(id={self.id}, type={self.event_type}, aggregate={self.aggregate_id}, seq={self.published_seq})"
+
+
+class ConsumerOffset(Base):
+    """Позиция потребителя в потоке событий: последний обработанный published_seq"""
+    __tablename__ = "consumer_offsets"
+
+    consumer = Column(String(100), primary_key=True)
+    last_seq = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f"ConsumerOffset(consumer={self.consumer}, last_seq={self.last_seq})"
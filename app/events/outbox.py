@@ -0,0 +1,39 @@
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.events.models import OutboxEvent
+from app.events.relay import outbox_relay
+
+_PENDING_KEY = "outbox_pending"
+
+
+def record_event(
+        session: AsyncSession,
+        aggregate_type: str,
+        aggregate_id: UUID,
+        event_type: str,
+        payload: Optional[dict] = None
+) -> None:
+    """
+    Добавить доменное событие в текущую транзакцию сессии. Сессия не
+    фиксируется: событие уйдёт в БД тем же commit, что и изменение, которое
+    его вызвало. payload должен сериализоваться в JSON (UUID - строкой).
+    """
+    session.add(OutboxEvent(
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        event_type=event_type,
+        payload=payload or {},
+    ))
+    session.info[_PENDING_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_relay(session: Session) -> None:
+    # событие зафиксировано - не ждать следующего опроса relay
+    if session.info.pop(_PENDING_KEY, False):
+        outbox_relay.wake()
@@ -0,0 +1,181 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.core.metrics import registry
+from app.events.models import OutboxEvent
+
+logger = logging.getLogger("app.events")
+
+# advisory-блокировка: публикует один relay на всю базу, остальные процессы ждут
+RELAY_LOCK_KEY = 0x6F7574626F78  # "outbox"
+NOTIFY_CHANNEL = "outbox_events"
+CLEANUP_INTERVAL_SECONDS = 60.0
+
+outbox_events_published_total = registry.counter(
+    "outbox_events_published_total", "Опубликованные доменные события"
+)
+outbox_publish_duration_seconds = registry.histogram(
+    "outbox_publish_duration_seconds", "Длительность публикации пачки событий"
+)
+
+# Номера берутся из последовательности outbox_published_seq в порядке id внутри
+# пачки (nextval считается по строкам упорядоченного подзапроса). Конкурентных
+# публикаций нет (advisory-блокировка), поэтому номера пачки идут подряд и растут
+# от пачки к пачке, а пачка становится видна читателям целиком при commit.
+# Откаченная публикация оставляет дыру в нумерации - потребители читают по
+# "published_seq > last_seq" и дыр не замечают.
+_PUBLISH_BATCH = text("""
+WITH batch AS (
+    SELECT id, nextval('outbox_published_seq') AS seq
+    FROM (
+        SELECT id
+        FROM outbox_events
+        WHERE published_seq IS NULL
+        ORDER BY id
+        LIMIT :limit
+    ) pending
+),
+published AS (
+    UPDATE outbox_events AS e
+    SET published_seq = batch.seq, published_at = :now
+    FROM batch
+    WHERE e.id = batch.id
+    RETURNING e.published_seq
+)
+SELECT count(*), coalesce(max(published_seq), 0) FROM published
+""")
+
+
+class OutboxRelay:
+    """
+    Публикация событий outbox пачками.
+
+    - после commit, записавшего события, relay будится сразу, иначе
+      проверяет очередь каждые relay_poll_interval_seconds;
+    - публикация - нумерация published_seq и NOTIFY outbox_events в одной
+      транзакции; читатели потока видят только опубликованные события;
+    - tail-клиенты этого процесса ждут публикации через wait_published();
+    - раз в минуту удаляются события старше retention_hours.
+    """
+
+    def __init__(self):
+        self.config = settings.events
+        self.last_seq = 0
+        self._wakeup = asyncio.Event()
+        self._published = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._last_cleanup = 0.0
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def published_event(self) -> asyncio.Event:
+        """Событие следующей публикации; брать до чтения потока, чтобы не пропустить её"""
+        return self._published
+
+    def notify_published(self, seq: int) -> None:
+        self.last_seq = max(self.last_seq, seq)
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    async def wait_published(self, published: asyncio.Event, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(published.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def publish_batch(self, session: AsyncSession, limit: Optional[int] = None) -> int:
+        """Опубликовать до limit событий; 0 - публиковать нечего или публикует другой процесс"""
+        started = time.perf_counter()
+        locked = await session.scalar(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": RELAY_LOCK_KEY}
+        )
+        if not locked:
+            await session.rollback()
+            return 0
+
+        count, last_seq = (await session.execute(_PUBLISH_BATCH, {
+            "limit": limit or self.config.relay_batch_size,
+            "now": datetime.utcnow(),
+        })).one()
+        if count:
+            await session.execute(
+                text("SELECT pg_notify(:channel, :seq)"),
+                {"channel": NOTIFY_CHANNEL, "seq": str(last_seq)}
+            )
+        await session.commit()
+
+        if count:
+            outbox_events_published_total.inc(count)
+            outbox_publish_duration_seconds.observe(time.perf_counter() - started)
+            self.notify_published(last_seq)
+        return count
+
+    async def cleanup(self, session: AsyncSession) -> int:
+        """Удалить опубликованные события старше retention_hours"""
+        cutoff = datetime.utcnow() - timedelta(hours=self.config.retention_hours)
+        deleted = 0
+        while True:
+            expired = (
+                select(OutboxEvent.id)
+                .where(OutboxEvent.published_at < cutoff)
+                .order_by(OutboxEvent.published_at)
+                .limit(self.config.relay_batch_size)
+            )
+            result = await session.execute(
+                delete(OutboxEvent)
+                .where(OutboxEvent.id.in_(expired.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < self.config.relay_batch_size:
+                return deleted
+
+    async def start(self) -> None:
+        if not self.config.relay_enabled or self._task is not None:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            published = 0
+            try:
+                async with async_session_maker() as session:
+                    published = await self.publish_batch(session)
+                    if time.monotonic() - self._last_cleanup >= CLEANUP_INTERVAL_SECONDS:
+                        self._last_cleanup = time.monotonic()
+                        await self.cleanup(session)
+            except Exception:
+                logger.exception("outbox relay failed")
+
+            if published >= self.config.relay_batch_size:
+                # очередь не разобрана до конца
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.config.relay_poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+outbox_relay = OutboxRelay()
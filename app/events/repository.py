@@ -0,0 +1,120 @@
+from datetime import datetime
+from typing import List, Optional, Sequence
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy import select, update, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import get_session
+from app.core.metrics import instrument_repository
+from app.events.models import OutboxEvent, ConsumerOffset, published_seq_sequence
+
+
+@instrument_repository
+class EventRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_events_after(
+            self,
+            after_seq: int,
+            limit: int,
+            aggregate_type: Optional[str] = None,
+            event_types: Optional[Sequence[str]] = None,
+            up_to_seq: Optional[int] = None
+    ) -> List[OutboxEvent]:
+        query = select(OutboxEvent).where(OutboxEvent.published_seq > after_seq)
+        if up_to_seq is not None:
+            query = query.where(OutboxEvent.published_seq <= up_to_seq)
+        if aggregate_type:
+            query = query.where(OutboxEvent.aggregate_type == aggregate_type)
+        if event_types:
+            query = query.where(OutboxEvent.event_type.in_(event_types))
+        query = query.order_by(OutboxEvent.published_seq).limit(limit)
+        result = await self.db.execute(query)
+        return result.scalars().all()
+
+    async def get_user_events_after(
+            self,
+            user_id: UUID,
+            after_seq: int,
+            aggregate_type: str,
+            event_types: Sequence[str],
+            limit: int
+    ) -> List[OutboxEvent]:
+        """События одного пользователя (payload.user_id) после after_seq"""
+        result = await self.db.execute(
+            select(OutboxEvent)
+            .where(
+                OutboxEvent.published_seq > after_seq,
+                OutboxEvent.aggregate_type == aggregate_type,
+                OutboxEvent.event_type.in_(event_types),
+                OutboxEvent.payload["user_id"].astext == str(user_id),
+            )
+            .order_by(OutboxEvent.published_seq)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    async def get_head_seq(self) -> int:
+        """
+        Последний выданный published_seq - из последовательности, а не max() по
+        таблице: после очистки старых событий голова не откатывается к 0.
+        Может включать номера публикации, которая ещё не зафиксирована.
+        """
+        result = await self.db.execute(
+            text(f"SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {published_seq_sequence.name}")
+        )
+        return result.scalar_one()
+
+    async def get_visible_seq(self) -> int:
+        """Наибольший published_seq среди видимых сейчас событий; 0 - таблица пуста"""
+        result = await self.db.execute(
+            select(func.coalesce(func.max(OutboxEvent.published_seq), 0))
+        )
+        return result.scalar_one()
+
+    async def get_offset(self, consumer: str) -> Optional[ConsumerOffset]:
+        result = await self.db.execute(
+            select(ConsumerOffset).where(ConsumerOffset.consumer == consumer)
+        )
+        return result.scalar_one_or_none()
+
+    async def claim_offset(self, consumer: str) -> Optional[int]:
+        """
+        Позиция потребителя с блокировкой строки до конца транзакции.
+        None - позицию сейчас держит другой экземпляр того же потребителя.
+        """
+        await self.db.execute(
+            pg_insert(ConsumerOffset)
+            .values(consumer=consumer, last_seq=0, updated_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=[ConsumerOffset.consumer])
+        )
+        result = await self.db.execute(
+            select(ConsumerOffset.last_seq)
+            .where(ConsumerOffset.consumer == consumer)
+            .with_for_update(skip_locked=True)
+        )
+        return result.scalar_one_or_none()
+
+    async def advance_offset(self, consumer: str, seq: int) -> ConsumerOffset:
+        # позиция только растёт: повторный или запоздалый ack не откатывает её назад
+        result = await self.db.execute(
+            update(ConsumerOffset)
+            .where(ConsumerOffset.consumer == consumer)
+            .values(
+                last_seq=func.greatest(ConsumerOffset.last_seq, seq),
+                updated_at=datetime.utcnow(),
+            )
+            .returning(ConsumerOffset)
+            .execution_options(synchronize_session=False)
+        )
+        offset = result.scalar_one()
+        await self.db.commit()
+        return offset
+
+
+async def get_event_repository(db: AsyncSession = Depends(get_session)) -> EventRepository:
+    return EventRepository(db)
@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Any, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+
+class OutboxEventRead(BaseModel):
+    # позиция в потоке; её же потребитель передаёт в after и в ack
+    published_seq: int
+    event_type: str
+    aggregate_type: str
+    aggregate_id: UUID
+    payload: dict[str, Any]
+    created_at: datetime
+    published_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ConsumerAck(BaseModel):
+    seq: int = Field(..., ge=0, description="последний обработанный published_seq")
+
+
+class ConsumerOffsetRead(BaseModel):
+    consumer: str
+    last_seq: int
+    head_seq: int
+    lag: int
+    updated_at: Optional[datetime] = None
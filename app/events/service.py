@@ -0,0 +1,128 @@
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from fastapi import Depends, HTTPException, status
+
+from app.core.config import settings
+from app.events.models import OutboxEvent
+from app.events.relay import outbox_relay
+from app.events.repository import EventRepository, get_event_repository
+from app.events.schemas import OutboxEventRead, ConsumerOffsetRead
+
+# событий в одной порции SSE
+STREAM_BATCH_SIZE = 500
+# через сколько переподключаться клиенту SSE после обрыва
+STREAM_RETRY_MS = 3000
+
+
+def format_sse(event: OutboxEvent) -> str:
+    data = OutboxEventRead.model_validate(event).model_dump_json()
+    return f"id: {event.published_seq}\nevent: {event.event_type}\ndata: {data}\n\n"
+
+
+class EventService:
+    def __init__(self, repo: EventRepository):
+        self.repo = repo
+        self.config = settings.events
+
+    async def _read(self, after_seq: int, limit: int,
+                    aggregate_type: Optional[str] = None) -> List[OutboxEvent]:
+        events = await self.repo.get_events_after(after_seq, limit, aggregate_type)
+        # не держать транзакцию и соединение из пула, пока ждём новых событий
+        await self.repo.db.commit()
+        return events
+
+    async def tail(
+            self,
+            after_seq: int,
+            limit: int,
+            wait_seconds: float,
+            aggregate_type: Optional[str] = None
+    ) -> List[OutboxEventRead]:
+        """
+        Long-poll: события после after_seq. Если их нет, ответ ждёт до
+        wait_seconds первой публикации и возвращает пустой список по таймауту.
+        """
+        deadline = time.monotonic() + min(wait_seconds, self.config.max_wait_seconds)
+        while True:
+            published = outbox_relay.published_event()
+            events = await self._read(after_seq, limit, aggregate_type)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return [OutboxEventRead.model_validate(event) for event in events]
+            await outbox_relay.wait_published(
+                published, min(remaining, self.config.tail_poll_interval_seconds)
+            )
+
+    async def stream(
+            self,
+            after_seq: int,
+            is_disconnected: Callable[[], Awaitable[bool]],
+            aggregate_type: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        SSE: id события - published_seq, поэтому браузерный EventSource после
+        переподключения сам продолжит с Last-Event-ID. Пока событий нет,
+        раз в heartbeat_seconds уходит комментарий, чтобы прокси не закрыли соединение.
+        """
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        last_sent = time.monotonic()
+        while not await is_disconnected():
+            published = outbox_relay.published_event()
+            events = await self._read(after_seq, STREAM_BATCH_SIZE, aggregate_type)
+            if events:
+                after_seq = events[-1].published_seq
+                last_sent = time.monotonic()
+                yield "".join(format_sse(event) for event in events)
+                continue
+
+            if time.monotonic() - last_sent >= self.config.heartbeat_seconds:
+                last_sent = time.monotonic()
+                yield ": ping\n\n"
+            await outbox_relay.wait_published(published, self.config.tail_poll_interval_seconds)
+
+    async def get_consumer(self, consumer: str) -> ConsumerOffsetRead:
+        offset = await self.repo.get_offset(consumer)
+        if not offset:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Consumer not found"
+            )
+        head_seq = await self.repo.get_head_seq()
+        return self._offset_read(consumer, offset.last_seq, head_seq, offset.updated_at)
+
+    async def ack(self, consumer: str, seq: int) -> ConsumerOffsetRead:
+        """Сдвинуть позицию потребителя; создаёт потребителя при первом ack"""
+        head_seq = await self.repo.get_head_seq()
+        if seq > head_seq:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot acknowledge unpublished events (head is {head_seq})"
+            )
+
+        last_seq = await self.repo.claim_offset(consumer)
+        if last_seq is None:
+            await self.repo.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Consumer offset is being updated by another instance"
+            )
+
+        offset = await self.repo.advance_offset(consumer, seq)
+        return self._offset_read(consumer, offset.last_seq, head_seq, offset.updated_at)
+
+    @staticmethod
+    def _offset_read(consumer: str, last_seq: int, head_seq: int, updated_at) -> ConsumerOffsetRead:
+        return ConsumerOffsetRead(
+            consumer=consumer,
+            last_seq=last_seq,
+            head_seq=head_seq,
+            lag=max(head_seq - last_seq, 0),
+            updated_at=updated_at,
+        )
+
+
+async def get_event_service(
+        repo: EventRepository = Depends(get_event_repository)
+) -> EventService:
+    return EventService(repo)
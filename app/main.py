@@ -1,9 +1,25 @@
 # app/main.py
 
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
 from app.core.config import settings
+from app.core.compression import CompressionMiddleware
+from app.core.profiling import QueryProfilingMiddleware
+from app.core.metrics import MetricsMiddleware, registry as metrics_registry
+from app.core.tasks import task_queue
+from app.core.idempotency import idempotency_key_cleaner
+from app.events.relay import outbox_relay
+from app.events.listener import outbox_listener
+from app.orders.stream import order_broadcaster
+from app.orders.partitions import partition_maintainer
+from app.orders.archive import order_archiver
+from app.cart.sweeper import cart_sweeper
+from app.cart.store import write_behind_store
+from app.promotions.scheduler import promotion_scheduler
 from app.users.api import router as users_router
 from app.auth.api import router as auth_router
 from app.cart.api import router as cart_router
@@ -11,13 +27,51 @@ from app.catalog.api import router as catalog_router
 from app.promotions.api import router as promotions_router
 from app.reviews.router import router as reviews_router
 from app.orders.api import router as orders_router
+from app.admin.api import router as admin_router
+from app.events.api import router as events_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await metrics_registry.start()
+    await partition_maintainer.start()
+    await task_queue.start()
+    await outbox_relay.start()
+    await outbox_listener.start()
+    await order_broadcaster.start()
+    await idempotency_key_cleaner.start()
+    await order_archiver.start()
+    await cart_sweeper.start()
+    await write_behind_store.start()
+    await promotion_scheduler.start()
+    yield
+    await promotion_scheduler.stop()
+    # накопленные правки корзин - в базу, пока пул соединений жив
+    await write_behind_store.stop()
+    await cart_sweeper.stop()
+    await order_archiver.stop()
+    await idempotency_key_cleaner.stop()
+    # сначала дождаться фоновых задач, потом остановить метрики
+    await order_broadcaster.stop()
+    await outbox_listener.stop()
+    await outbox_relay.stop()
+    await task_queue.stop()
+    await partition_maintainer.stop()
+    await metrics_registry.stop()
+
 
 app = FastAPI(
     title=settings.app.app_name,      
     docs_url="/api/docs",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
 )
 
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(QueryProfilingMiddleware)
+if settings.metrics.enabled:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(reviews_router, prefix="/api/v1/reviews", tags=["reviews"])
 app.include_router(users_router, prefix="/api/v1/users", tags=["users"])
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["auth"])
@@ -25,7 +79,16 @@ app.include_router(cart_router, prefix="/api/v1/cart", tags=["cart"])
 app.include_router(catalog_router, prefix="/api/v1/catalog", tags=["catalog"])
 app.include_router(promotions_router, prefix="/api/v1/promotions", tags=["promotions"])
 app.include_router(orders_router, prefix="/api/v1/orders", tags=["orders"])
+app.include_router(admin_router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(events_router, prefix="/api/v1/events", tags=["events"])
+
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4"
+    )
 
 
 if __name__ == "__main__":
@@ -1,10 +1,16 @@
 from uuid import UUID
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request
+from fastapi.responses import Response, StreamingResponse
 
 from app.orders.service import OrderService, get_order_service
-from app.orders.schemas import OrderCreate, OrderRead, OrderUpdate, OrderStatusUpdate, OrderStatusEnum
+from app.orders.schemas import OrderCreate, OrderRead, OrderSummary, OrderUpdate, OrderStatusUpdate, OrderStatusEnum
+from app.orders.stream import order_status_stream
 from app.auth.service import get_current_user_dep, require_admin
+from app.core.idempotency import IdempotentRequest, idempotent_request
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.events.repository import EventRepository, get_event_repository
 from app.users.models import User
 
 router = APIRouter(
@@ -22,27 +28,60 @@ async def create_order(
     order_data: OrderCreate,
     current_user: User = Depends(get_current_user_dep),
     service: OrderService = Depends(get_order_service),
+    idempotency: IdempotentRequest = Depends(idempotent_request),
 ) -> OrderRead:
     """
     Создать новый заказ из текущей корзины пользователя.
+    С заголовком Idempotency-Key повтор (например, после таймаута) не создаёт
+    второй заказ: он дожидается первого запроса и получает его ответ.
     """
-    return await service.create_order_from_cart(current_user.id, order_data)
+    if idempotency.replay is not None:
+        return idempotency.replay
+    order = await service.create_order_from_cart(current_user.id, order_data)
+    return await idempotency.respond(order, status_code=status.HTTP_201_CREATED)
 
 @router.get(
     "/my",
-    response_model=List[OrderRead],
+    response_model=List[OrderSummary],
     summary="Получить список моих заказов",
 )
 async def get_my_orders(
+    response: Response,
     limit: int = Query(100, ge=1, le=200),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="значение X-Next-Cursor предыдущей страницы"),
     current_user: User = Depends(get_current_user_dep),
     service: OrderService = Depends(get_order_service),
-) -> List[OrderRead]:
+) -> List[OrderSummary]:
     """
-    Получить список заказов текущего пользователя.
+    Получить список заказов текущего пользователя, новые первыми.
+    Позиции не загружаются (только items_count) - они есть в /my/{order_id}.
+    Если есть следующая страница, её курсор - в заголовке X-Next-Cursor.
     """
-    return await service.get_user_orders(current_user.id, limit, skip)
+    orders, next_cursor = await service.get_user_orders(current_user.id, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return orders
+
+@router.get(
+    "/my/stream",
+    summary="Поток изменений статусов моих заказов (SSE)",
+)
+async def stream_my_orders(
+    request: Request,
+    last_event_id: Optional[int] = Header(None, ge=0),
+    current_user: User = Depends(get_current_user_dep),
+    events: EventRepository = Depends(get_event_repository),
+) -> StreamingResponse:
+    """
+    События order.created и order.status_changed текущего пользователя.
+    Объявлен до /my/{order_id}, иначе "stream" разбирался бы как order_id.
+    После обрыва EventSource присылает Last-Event-ID и получает пропущенное.
+    """
+    return StreamingResponse(
+        order_status_stream(events, current_user.id, last_event_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get(
     "/my/{order_id}",
@@ -61,20 +100,62 @@ async def get_my_order(
 
 @router.get(
     "/",
-    response_model=List[OrderRead],
+    response_model=List[OrderSummary],
     summary="Получить список всех заказов",
 )
 async def get_all_orders(
+    response: Response,
     limit: int = Query(100, ge=1, le=200),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="значение X-Next-Cursor предыдущей страницы"),
     status: Optional[OrderStatusEnum] = Query(None),
     admin: User = Depends(require_admin),
     service: OrderService = Depends(get_order_service),
-) -> List[OrderRead]:
+) -> List[OrderSummary]:
+    """
+    Получить список всех заказов в системе, новые первыми, без позиций.
+    Следующая страница - по курсору из заголовка X-Next-Cursor.
+    """
+    orders, next_cursor = await service.get_all_orders(limit, cursor, status)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return orders
+
+@router.get(
+    "/search",
+    response_model=List[OrderSummary],
+    summary="[Админ] Поиск заказов",
+)
+async def search_orders(
+    response: Response,
+    created_from: Optional[datetime] = Query(None, description="создан не раньше"),
+    created_to: Optional[datetime] = Query(None, description="создан раньше (не включая)"),
+    user_id: Optional[UUID] = Query(None),
+    status: Optional[OrderStatusEnum] = Query(None),
+    product_id: Optional[UUID] = Query(None, description="заказ содержит товар"),
+    phone: Optional[str] = Query(None, min_length=3, max_length=20, description="часть номера телефона"),
+    address: Optional[str] = Query(None, min_length=3, max_length=500, description="часть адреса доставки"),
+    limit: int = Query(100, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="значение X-Next-Cursor предыдущей страницы"),
+    admin: User = Depends(require_admin),
+    service: OrderService = Depends(get_order_service),
+) -> List[OrderSummary]:
     """
-    Получить список всех заказов в системе.
+    Фильтры комбинируются (AND), новые заказы первыми.
+    Подстроки телефона и адреса - от 3 символов: короче триграммный индекс не помогает.
     """
-    return await service.get_all_orders(limit, skip, status)
+    orders, next_cursor = await service.search_orders(
+        limit, cursor,
+        created_from=created_from,
+        created_to=created_to,
+        user_id=user_id,
+        status=status,
+        product_id=product_id,
+        phone=phone,
+        address=address,
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return orders
 
 @router.patch(
     "/{order_id}/status",
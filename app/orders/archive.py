@@ -0,0 +1,290 @@
+import os
+import gzip
+import uuid
+import asyncio
+import logging
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.core.metrics import registry
+from app.orders.models import OrderStatus
+from app.orders.repository import OrderRepository
+from app.orders.schemas import OrderRead, OrderSummary
+
+logger = logging.getLogger("app.orders.archive")
+
+# в архив уходят только заказы, которые больше не меняются
+ARCHIVED_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED)
+
+INDEX_FILE = "index.sqlite3"
+SEGMENTS_DIR = "segments"
+
+orders_archived_total = registry.counter("orders_archived_total", "Заказы, перенесённые в архив")
+
+_SCHEMA = (
+	"""
+	CREATE TABLE IF NOT EXISTS archived_orders (
+		order_id TEXT PRIMARY KEY,
+		user_id TEXT NOT NULL,
+		status TEXT NOT NULL,
+		created_at TEXT NOT NULL,
+		phone_number TEXT NOT NULL,
+		shipping_address TEXT NOT NULL,
+		summary TEXT NOT NULL,
+		segment TEXT NOT NULL,
+		byte_offset INTEGER NOT NULL,
+		byte_length INTEGER NOT NULL
+	)
+	""",
+	"CREATE INDEX IF NOT EXISTS ix_archived_orders_user_id ON archived_orders (user_id, created_at, order_id)",
+	"CREATE INDEX IF NOT EXISTS ix_archived_orders_created_at ON archived_orders (created_at, order_id)",
+	"""
+	CREATE TABLE IF NOT EXISTS archived_order_products (
+		product_id TEXT NOT NULL,
+		order_id TEXT NOT NULL,
+		PRIMARY KEY (product_id, order_id)
+	) WITHOUT ROWID
+	""",
+)
+
+
+def _timestamp(value: datetime) -> str:
+	# фиксированная ширина: строки сравниваются в том же порядке, что и даты
+	return value.strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+
+def _contains(haystack: str, needle: str) -> bool:
+	# регистронезависимо и для кириллицы, в отличие от LIKE в SQLite
+	return needle.casefold() in haystack.casefold()
+
+
+class OrderArchive:
+	"""
+	Холодный архив заказов на локальном диске (orders_settings.archive_dir):
+
+	* segments/*.jsonl.gz - заказы с позициями в формате OrderRead, по строке JSON;
+	  каждая строка - отдельный gzip-член, файл целиком читается zcat
+	* index.sqlite3 - где лежит заказ (сегмент, смещение, длина) и поля для поиска:
+	  id, покупатель, статус, дата, телефон, адрес, товары
+
+	Заказ по id читается одним seek и распаковкой одной строки, поиск
+	отвечает по индексу, не открывая сегменты.
+	"""
+
+	@property
+	def root(self) -> Path:
+		return Path(settings.orders.archive_dir)
+
+	def _connect(self, create: bool = False) -> Optional[sqlite3.Connection]:
+		path = self.root / INDEX_FILE
+		if not create and not path.exists():
+			return None
+		path.parent.mkdir(parents=True, exist_ok=True)
+		conn = sqlite3.connect(path, timeout=30)
+		conn.create_function("contains", 2, _contains, deterministic=True)
+		if create:
+			for statement in _SCHEMA:
+				conn.execute(statement)
+		return conn
+
+	def _write(self, orders: List[OrderRead]) -> None:
+		segments = self.root / SEGMENTS_DIR
+		segments.mkdir(parents=True, exist_ok=True)
+		segment = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+		entries = []
+		with open(segments / segment, "wb") as file:
+			for order in orders:
+				member = gzip.compress(order.model_dump_json().encode() + b"\n")
+				entries.append((order, file.tell(), len(member)))
+				file.write(member)
+			file.flush()
+			os.fsync(file.fileno())
+
+		# индекс - после того как сегмент на диске; повторный перенос того же
+		# заказа (сбой до удаления из базы) перезаписывает ссылку на новый сегмент
+		with closing(self._connect(create=True)) as conn, conn:
+			conn.executemany(
+				"INSERT OR REPLACE INTO archived_orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+				[
+					(
+						str(order.id), str(order.user_id), order.status.value, _timestamp(order.created_at),
+						order.phone_number, order.shipping_address,
+						OrderSummary(**order.model_dump(exclude={"items"}), items_count=len(order.items))
+						.model_dump_json(),
+						segment, offset, length,
+					)
+					for order, offset, length in entries
+				],
+			)
+			conn.executemany(
+				"INSERT OR IGNORE INTO archived_order_products VALUES (?, ?)",
+				{(str(item.product_id), str(order.id)) for order in orders for item in order.items},
+			)
+
+	def _get(self, order_id: UUID) -> Optional[OrderRead]:
+		conn = self._connect()
+		if conn is None:
+			return None
+		with closing(conn):
+			row = conn.execute(
+				"SELECT segment, byte_offset, byte_length FROM archived_orders WHERE order_id = ?",
+				(str(order_id),),
+			).fetchone()
+		if row is None:
+			return None
+		segment, offset, length = row
+		with open(self.root / SEGMENTS_DIR / segment, "rb") as file:
+			file.seek(offset)
+			return OrderRead.model_validate_json(gzip.decompress(file.read(length)))
+
+	def _search(self, limit: int, cursor: Optional[Tuple[datetime, UUID]], created_from: Optional[datetime],
+				created_to: Optional[datetime], user_id: Optional[UUID], status: Optional[OrderStatus],
+				product_id: Optional[UUID], phone: Optional[str], address: Optional[str]) -> List[OrderSummary]:
+		conn = self._connect()
+		if conn is None:
+			return []
+		conditions, params = [], []
+		if cursor is not None:
+			conditions.append("(created_at, order_id) < (?, ?)")
+			params += [_timestamp(cursor[0]), str(cursor[1])]
+		if created_from is not None:
+			conditions.append("created_at >= ?")
+			params.append(_timestamp(created_from))
+		if created_to is not None:
+			conditions.append("created_at < ?")
+			params.append(_timestamp(created_to))
+		if user_id is not None:
+			conditions.append("user_id = ?")
+			params.append(str(user_id))
+		if status is not None:
+			conditions.append("status = ?")
+			params.append(status.value)
+		if product_id is not None:
+			conditions.append("order_id IN (SELECT order_id FROM archived_order_products WHERE product_id = ?)")
+			params.append(str(product_id))
+		if phone:
+			conditions.append("contains(phone_number, ?)")
+			params.append(phone)
+		if address:
+			conditions.append("contains(shipping_address, ?)")
+			params.append(address)
+
+		where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+		with closing(conn):
+			rows = conn.execute(
+				f"SELECT summary FROM archived_orders {where} "
+				"ORDER BY created_at DESC, order_id DESC LIMIT ?",
+				[*params, limit],
+			).fetchall()
+		return [OrderSummary.model_validate_json(summary) for summary, in rows]
+
+	async def write(self, orders: List[OrderRead]) -> None:
+		await asyncio.to_thread(self._write, orders)
+
+	async def get_order(self, order_id: UUID) -> Optional[OrderRead]:
+		return await asyncio.to_thread(self._get, order_id)
+
+	async def search_orders(
+			self,
+			limit: int = 100,
+			cursor: Optional[Tuple[datetime, UUID]] = None,
+			created_from: Optional[datetime] = None,
+			created_to: Optional[datetime] = None,
+			user_id: Optional[UUID] = None,
+			status: Optional[OrderStatus] = None,
+			product_id: Optional[UUID] = None,
+			phone: Optional[str] = None,
+			address: Optional[str] = None
+	) -> List[OrderSummary]:
+		"""Те же фильтры и порядок (created_at, id) по убыванию, что у OrderRepository.search_orders"""
+		if status is not None and status not in ARCHIVED_STATUSES:
+			return []
+		return await asyncio.to_thread(
+			self._search, limit, cursor, created_from, created_to, user_id, status, product_id, phone, address
+		)
+
+
+order_archive = OrderArchive()
+
+
+async def archive_orders(order_repo: OrderRepository, archive: OrderArchive, before: datetime,
+						 batch_size: int) -> int:
+	"""
+	Перенести одну пачку заказов, созданных раньше before: запись в архив,
+	затем удаление из orders/order_items в той же транзакции, что и выборка.
+	Возвращает число перенесённых заказов.
+	"""
+	orders = await order_repo.get_archivable_orders(list(ARCHIVED_STATUSES), before, batch_size)
+	if not orders:
+		await order_repo.db.commit()
+		return 0
+	await archive.write([OrderRead.model_validate(order) for order in orders])
+	await order_repo.delete_archived_orders(orders)
+	orders_archived_total.inc(len(orders))
+	return len(orders)
+
+
+class OrderArchiver:
+	"""
+	Раз в archive_interval_seconds переносит выполненные и отменённые заказы
+	старше archive_after_days в архив пачками по archive_batch_size.
+	Пишет один процесс под advisory-блокировкой: архив - локальный каталог,
+	archive_dir должен быть общим для всех экземпляров (или архиватор включён на одном).
+	"""
+
+	LOCK_KEY = 0x61726368697665
+
+	def __init__(self):
+		self.config = settings.orders
+		self._task: Optional[asyncio.Task] = None
+
+	async def run_once(self, now: Optional[datetime] = None) -> int:
+		before = (now or datetime.utcnow()) - timedelta(days=self.config.archive_after_days)
+		archived = 0
+		async with async_session_maker() as session:
+			order_repo = OrderRepository(session)
+			while True:
+				locked = await session.execute(
+					text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": self.LOCK_KEY}
+				)
+				if not locked.scalar_one():
+					await session.rollback()
+					return archived
+				moved = await archive_orders(order_repo, order_archive, before, self.config.archive_batch_size)
+				# между пачками блокировки строк отпущены, горячие запросы не ждут
+				session.expunge_all()
+				archived += moved
+				if moved < self.config.archive_batch_size:
+					return archived
+
+	async def _run(self) -> None:
+		while True:
+			try:
+				archived = await self.run_once()
+				if archived:
+					logger.info("archived %d orders", archived)
+			except Exception:
+				logger.exception("order archiving failed")
+			await asyncio.sleep(self.config.archive_interval_seconds)
+
+	async def start(self) -> None:
+		if self._task is None and self.config.archive_after_days > 0:
+			self._task = asyncio.create_task(self._run())
+
+	async def stop(self) -> None:
+		if self._task is None:
+			return
+		self._task.cancel()
+		await asyncio.gather(self._task, return_exceptions=True)
+		self._task = None
+
+
+order_archiver = OrderArchiver()
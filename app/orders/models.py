@@ -1,9 +1,13 @@
+import uuid
 from typing import Optional, Any
-from sqlalchemy import Column, String, Float, Integer, Enum as SAEnum, ForeignKey, DateTime
+from datetime import datetime
+from sqlalchemy import Column, String, Float, Integer, Enum as SAEnum, ForeignKey, DateTime, Index, DDL, event
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum
 from app.core.db import Base, BaseModelMixin
+from app.orders.partitions import default_partition_ddl
 
 class OrderStatus(str, Enum):
 	PENDING = "pending"
@@ -15,6 +19,9 @@ class OrderStatus(str, Enum):
 class Order(Base, BaseModelMixin):
 	__tablename__ = "orders"
 
+	# ключ секционирования по месяцам (created_at) обязан входить в первичный ключ: (id, created_at)
+	id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+	created_at = Column(DateTime, primary_key=True, nullable=False, default=datetime.utcnow)
 	user_id = Column(ForeignKey("users.id"), nullable=False)
 	status = Column(SAEnum(OrderStatus, name="order_status_enum"), 
 					nullable=False, default=OrderStatus.PENDING)
@@ -26,8 +33,22 @@ class Order(Base, BaseModelMixin):
 
 	user = relationship("User", backref="orders", lazy="select")
 	items = relationship("OrderItem", back_populates="order", 
+						primaryjoin="and_(Order.id == foreign(OrderItem.order_id), "
+									"Order.created_at == foreign(OrderItem.order_created_at))",
 						cascade="all, delete-orphan", lazy="select")
 
+	__table_args__ = (
+		# keyset-пагинация истории: (user_id | status, created_at, id) по убыванию
+		Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+		Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+		# поиск подстроки (ILIKE '%...%') администратором
+		Index("ix_orders_shipping_address_trgm", "shipping_address",
+			  postgresql_using="gin", postgresql_ops={"shipping_address": "gin_trgm_ops"}),
+		Index("ix_orders_phone_number_trgm", "phone_number",
+			  postgresql_using="gin", postgresql_ops={"phone_number": "gin_trgm_ops"}),
+		{"postgresql_partition_by": "RANGE (created_at)"},
+	)
+
 	def __repr__(self) -> str:
 		return f"Order(id={self.id}, user_id={self.user_id}, status={self.status}, total={self.total_amount})"
 
@@ -45,18 +66,37 @@ class Order(Base, BaseModelMixin):
 			"updated_at": self.updated_at.isoformat() if self.updated_at else None,
 		}
 
+# gin_trgm_ops нужен до создания индексов (create_all в тестах и seed.py)
+event.listen(Order.__table__, "before_create",
+			 DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+# месячные партиции создаёт PartitionMaintainer (app/orders/partitions.py)
+event.listen(Order.__table__, "after_create",
+			 DDL(default_partition_ddl("orders")).execute_if(dialect="postgresql"))
+
 class OrderItem(Base, BaseModelMixin):
 	__tablename__ = "order_items"
 
-	order_id = Column(ForeignKey("orders.id"), nullable=False)
+	id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+	# без внешнего ключа на orders: с ним DETACH PARTITION проверял бы все позиции
+	order_id = Column(UUID(as_uuid=True), nullable=False)
+	# created_at заказа - ключ секционирования, позиции лежат в партиции своего заказа
+	order_created_at = Column(DateTime, primary_key=True, nullable=False)
 	product_id = Column(ForeignKey("products.id"), nullable=False)
 	quantity = Column(Integer, nullable=False, default=1)
 	price_at_time = Column(Float, nullable=False)  # Цена на момент заказа
 	product_name = Column(String, nullable=False)  # Название на момент заказа
 
-	order = relationship("Order", back_populates="items")
+	order = relationship("Order", back_populates="items",
+						 primaryjoin="and_(Order.id == foreign(OrderItem.order_id), "
+									 "Order.created_at == foreign(OrderItem.order_created_at))")
 	product = relationship("Product", backref="order_items")
 
+	__table_args__ = (
+		Index("ix_order_items_order_id", "order_id"),
+		Index("ix_order_items_product_id", "product_id"),
+		{"postgresql_partition_by": "RANGE (order_created_at)"},
+	)
+
 	def __repr__(self) -> str:
 		return f"OrderItem(id={self.id}, order_id={self.order_id}, product={self.product_name}, qty={self.quantity})"
 
@@ -69,4 +109,7 @@ class OrderItem(Base, BaseModelMixin):
 			"quantity": self.quantity,
 			"price_at_time": self.price_at_time,
 			"subtotal": self.quantity * self.price_at_time,
-		}
\ No newline at end of file
+		}
+
+event.listen(OrderItem.__table__, "after_create",
+			 DDL(default_partition_ddl("order_items")).execute_if(dialect="postgresql"))
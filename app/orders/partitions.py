@@ -0,0 +1,251 @@
+import os
+import re
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.core.metrics import registry
+
+logger = logging.getLogger("app.orders.partitions")
+
+order_partition_failures_total = registry.counter(
+	"order_partition_failures_total", "Месяцы, для которых не удалось создать партицию"
+)
+order_partition_moved_rows_total = registry.counter(
+	"order_partition_moved_rows_total", "Строки, перенесённые из DEFAULT-партиции в новую", ("table",)
+)
+
+# секционированная таблица -> колонка-ключ (месяц создания заказа)
+PARTITIONED_TABLES = (
+	("orders", "created_at"),
+	("order_items", "order_created_at"),
+)
+
+_PARTITION_NAME_RE = re.compile(r"^(?P<table>\w+)_(?P<year>\d{4})_(?P<month>\d{2})$")
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def new_order_id(created_at: datetime) -> UUID:
+	"""
+	UUIDv7: первые 48 бит - миллисекунды created_at. По такому id известен
+	месяц заказа, и поиск по id затрагивает одну партицию (см. order_created_range).
+	"""
+	value = ((created_at - _EPOCH) // _MILLISECOND) << 80 | int.from_bytes(os.urandom(10), "big")
+	value = value & ~(0xF << 76) | 0x7 << 76
+	value = value & ~(0x3 << 62) | 0x2 << 62
+	return UUID(int=value)
+
+
+def order_created_range(order_id: UUID) -> Optional[Tuple[datetime, datetime]]:
+	"""[начало, конец) created_at для id из new_order_id; для старых uuid4 - None"""
+	if order_id.version != 7:
+		return None
+	started = _EPOCH + timedelta(milliseconds=order_id.int >> 80)
+	return started, started + _MILLISECOND
+
+
+def month_start(value: date) -> date:
+	return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+	index = month.year * 12 + month.month - 1 + months
+	return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+	return f"{table}_{month:%Y_%m}"
+
+
+def create_partition_ddl(table: str, month: date) -> str:
+	return (
+		f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+		f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+	)
+
+
+def default_partition_ddl(table: str) -> str:
+	# строки вне созданных месяцев (ошибка часов, ручная вставка) не теряются;
+	# пока партиции создаются заранее, она пуста и не замедляет CREATE новых
+	return f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"
+
+
+async def get_partition_months(conn, table: str) -> List[date]:
+	"""Месяцы, для которых у таблицы есть партиция (DEFAULT не считается)"""
+	result = await conn.execute(
+		text(
+			"SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+			"WHERE i.inhparent = CAST(:table AS regclass)"
+		),
+		{"table": table},
+	)
+	months = []
+	for name in result.scalars():
+		match = _PARTITION_NAME_RE.match(name)
+		if match and match["table"] == table:
+			months.append(date(int(match["year"]), int(match["month"]), 1))
+	return sorted(months)
+
+
+async def _default_has_rows(conn, table: str, column: str, month: date) -> bool:
+	result = await conn.execute(text(
+		f"SELECT EXISTS (SELECT 1 FROM {table}_default "
+		f"WHERE {column} >= '{month.isoformat()}' AND {column} < '{add_months(month, 1).isoformat()}')"
+	))
+	return bool(result.scalar_one())
+
+
+async def _create_partition_from_default(conn, table: str, column: str, month: date) -> int:
+	"""
+	CREATE ... PARTITION OF падает, если в DEFAULT уже есть строки этого месяца.
+	DEFAULT отсоединяется, новая партиция создаётся, строки месяца переносятся
+	в неё, DEFAULT присоединяется обратно. Всё в транзакции вызывающего:
+	вставки в таблицу на это время ждут блокировку, а не падают.
+	"""
+	name = partition_name(table, month)
+	default = f"{table}_default"
+	await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+	await conn.execute(text(create_partition_ddl(table, month)))
+	moved = await conn.execute(text(
+		f"WITH moved AS (DELETE FROM {default} "
+		f"WHERE {column} >= '{month.isoformat()}' AND {column} < '{add_months(month, 1).isoformat()}' "
+		f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+	))
+	await conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+	return moved.rowcount
+
+
+async def ensure_month_partitions(conn, month: date) -> List[str]:
+	"""Создать недостающие партиции месяца для обеих таблиц, забрав его строки из DEFAULT"""
+	created = []
+	for table, column in PARTITIONED_TABLES:
+		if month in await get_partition_months(conn, table):
+			continue
+		if await _default_has_rows(conn, table, column, month):
+			moved = await _create_partition_from_default(conn, table, column, month)
+			order_partition_moved_rows_total.inc(moved, table=table)
+			logger.warning("moved %d rows of %s from %s_default", moved, partition_name(table, month), table)
+		else:
+			await conn.execute(text(create_partition_ddl(table, month)))
+		created.append(partition_name(table, month))
+	return created
+
+
+async def ensure_partitions(conn, first_month: date, last_month: date) -> List[str]:
+	"""Создать недостающие партиции за [first_month, last_month] для обеих таблиц"""
+	created = []
+	month = month_start(first_month)
+	while month <= last_month:
+		created.extend(await ensure_month_partitions(conn, month))
+		month = add_months(month, 1)
+	# порядок как в каталоге: сначала все orders, затем order_items
+	tables = [table for table, _ in PARTITIONED_TABLES]
+	return sorted(created, key=lambda name: tables.index(_PARTITION_NAME_RE.match(name)["table"]))
+
+
+async def detach_partitions(conn, before_month: date) -> List[str]:
+	"""
+	Отсоединить партиции месяцев раньше before_month. Это изменение каталога,
+	без чтения строк: внешних ключей на orders нет, DEFAULT-партиция не проверяется.
+	Отсоединённые таблицы остаются в базе под тем же именем.
+	"""
+	detached = []
+	# позиции раньше заказов: между шагами нет момента, когда позиция видна без заказа
+	for table, _ in reversed(PARTITIONED_TABLES):
+		for month in await get_partition_months(conn, table):
+			if month < before_month:
+				name = partition_name(table, month)
+				await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+				detached.append(name)
+	return detached
+
+
+class PartitionMaintainer:
+	"""
+	Раз в partition_check_interval_seconds: партиции на текущий месяц и
+	partition_premake_months вперёд, при partition_retention_months > 0 -
+	отсоединение старых. Выполняет один процесс под advisory-блокировкой,
+	остальные пропускают проверку до следующего раза.
+	"""
+
+	LOCK_KEY = 0x6F7264657273
+
+	def __init__(self, session_factory=async_session_maker):
+		self.config = settings.orders
+		self.session_factory = session_factory
+		self._task: Optional[asyncio.Task] = None
+
+	async def _locked(self, session) -> bool:
+		locked = await session.execute(
+			text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": self.LOCK_KEY}
+		)
+		return bool(locked.scalar_one())
+
+	async def run_once(self, today: Optional[date] = None) -> Tuple[List[str], List[str]]:
+		"""
+		Каждый месяц - в своей транзакции: ошибка одного месяца (например, перенос
+		строк из DEFAULT) не откатывает и не блокирует создание остальных.
+		"""
+		current = month_start(today or datetime.utcnow().date())
+		created = []
+		last = add_months(current, self.config.partition_premake_months)
+		month = current
+		while month <= last:
+			try:
+				async with self.session_factory() as session:
+					if not await self._locked(session):
+						return created, []
+					created.extend(await ensure_month_partitions(session, month))
+					await session.commit()
+			except Exception:
+				order_partition_failures_total.inc()
+				logger.exception("failed to create order partitions for %s", f"{month:%Y-%m}")
+			month = add_months(month, 1)
+		detached = []
+		if self.config.partition_retention_months > 0:
+			async with self.session_factory() as session:
+				if not await self._locked(session):
+					return created, []
+				detached = await detach_partitions(
+					session, add_months(current, -self.config.partition_retention_months)
+				)
+				await session.commit()
+		return created, detached
+
+	async def _maintain(self) -> None:
+		try:
+			created, detached = await self.run_once()
+			if created:
+				logger.info("created order partitions: %s", ", ".join(created))
+			if detached:
+				logger.info("detached order partitions: %s", ", ".join(detached))
+		except Exception:
+			logger.exception("order partition maintenance failed")
+
+	async def _run(self) -> None:
+		while True:
+			await asyncio.sleep(self.config.partition_check_interval_seconds)
+			await self._maintain()
+
+	async def start(self) -> None:
+		if self._task is None:
+			# партиция текущего месяца должна быть до первых запросов
+			await self._maintain()
+			self._task = asyncio.create_task(self._run())
+
+	async def stop(self) -> None:
+		if self._task is None:
+			return
+		self._task.cancel()
+		await asyncio.gather(self._task, return_exceptions=True)
+		self._task = None
+
+
+partition_maintainer = PartitionMaintainer()
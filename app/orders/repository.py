@@ -1,128 +1,353 @@
 from uuid import UUID
-from typing import Optional, List
+from datetime import datetime
+from typing import Optional, List, NamedTuple, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_
+from sqlalchemy import select, update, delete, insert, and_, func, literal, true, exists, tuple_, Row
 from sqlalchemy.orm import selectinload
 from fastapi import Depends
 from app.orders.models import Order, OrderItem, OrderStatus
+from app.orders.partitions import new_order_id, order_created_range
+from app.cart.models import Cart, CartItem
+from app.cart.enum import CartEnum
 from app.catalog.models import Product
+from app.promotions.repository import best_discount_percent, discounted_price
 from app.core.db import get_session
+from app.core.metrics import instrument_repository
+from app.events.outbox import record_event
 
+def _order_key(order_id: UUID) -> list:
+	"""
+	Условие на заказ по id. Для id из new_order_id добавляется узкий диапазон
+	created_at - планировщик оставляет одну месячную партицию вместо всех.
+	"""
+	conditions = [Order.id == order_id]
+	created = order_created_range(order_id)
+	if created is not None:
+		conditions += [Order.created_at >= created[0], Order.created_at < created[1]]
+	return conditions
+
+
+def _item_key(order_id: UUID) -> list:
+	conditions = [OrderItem.order_id == order_id]
+	created = order_created_range(order_id)
+	if created is not None:
+		conditions += [OrderItem.order_created_at >= created[0], OrderItem.order_created_at < created[1]]
+	return conditions
+
+
+def _contains_pattern(value: str) -> str:
+	# % и _ из ввода - обычные символы, а не шаблон LIKE
+	escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+	return f"%{escaped}%"
+
+
+class CheckoutResult(NamedTuple):
+	order_id: UUID
+	cart_id: UUID
+	total_amount: float
+	items_count: int
+
+
+@instrument_repository
 class OrderRepository:
 	def __init__(self, db):
 		self.db = db
 
-	async def create_order(self, user_id: UUID, shipping_address: str, 
-						  phone_number: str, notes: Optional[str] = None) -> Order:
-		order = Order(
-			user_id=user_id,
-			shipping_address=shipping_address,
-			phone_number=phone_number,
-			notes=notes
+	async def lock_active_cart(self, user_id: UUID) -> Optional[UUID]:
+		"""
+		Заблокировать активную корзину до конца транзакции: параллельное
+		оформление той же корзины ждёт и затем не находит её активной.
+		"""
+		result = await self.db.execute(
+			select(Cart.id)
+			.where(Cart.user_id == user_id, Cart.status == CartEnum.ACTIVE)
+			.with_for_update()
 		)
-		self.db.add(order)
-		await self.db.commit()
-		await self.db.refresh(order)
-		return order
+		return result.scalars().first()
+
+	async def create_order_from_cart(self, cart_id: UUID, user_id: UUID, shipping_address: str,
+									 phone_number: str, notes: Optional[str] = None) -> Optional[CheckoutResult]:
+		"""
+		Превратить корзину в заказ одним запросом, независимо от числа позиций:
+		заказ и позиции - INSERT ... SELECT из cart_items по текущим ценам
+		с лучшей действующей акцией, корзина - в ORDERED.
+		None - корзина пуста, ничего не записано.
+		Не фиксирует транзакцию: вызывающий коммитит вместе с задачами
+		(или откатывает, снимая блокировку корзины).
+		"""
+		now = datetime.utcnow()
+		order_id = new_order_id(now)
 
-	async def add_order_item(self, order_id: UUID, product_id: UUID, 
-							quantity: int, price: float, product_name: str) -> OrderItem:
-		item = OrderItem(
-			order_id=order_id,
-			product_id=product_id,
-			quantity=quantity,
-			price_at_time=price,
-			product_name=product_name
+		unit_price = discounted_price(Product.price, best_discount_percent(CartItem.product_id, now))
+		lines = (
+			select(
+				CartItem.product_id,
+				CartItem.quantity,
+				Product.name.label("product_name"),
+				unit_price.label("price"),
+			)
+			.join(Product, Product.id == CartItem.product_id)
+			.where(CartItem.cart_id == cart_id)
+			.cte("lines")
+		)
+
+		# HAVING count(*) > 0: у пустой корзины заказ не создаётся
+		new_order = (
+			insert(Order)
+			.from_select(
+				["id", "user_id", "status", "total_amount", "shipping_address",
+				 "phone_number", "notes", "created_at", "updated_at"],
+				select(
+					literal(order_id, Order.id.type),
+					literal(user_id, Order.id.type),
+					literal(OrderStatus.PENDING, Order.status.type),
+					func.sum(lines.c.quantity * lines.c.price),
+					literal(shipping_address),
+					literal(phone_number),
+					literal(notes, Order.notes.type),
+					literal(now),
+					literal(now),
+				)
+				.select_from(lines)
+				.having(func.count() > 0)
+			)
+			.returning(Order.id, Order.created_at, Order.total_amount)
+			.cte("new_order")
+		)
+		new_items = (
+			insert(OrderItem)
+			.from_select(
+				["id", "order_id", "order_created_at", "product_id", "quantity", "price_at_time",
+				 "product_name", "created_at", "updated_at"],
+				select(
+					func.gen_random_uuid(),
+					new_order.c.id,
+					new_order.c.created_at,
+					lines.c.product_id,
+					lines.c.quantity,
+					lines.c.price,
+					lines.c.product_name,
+					literal(now),
+					literal(now),
+				)
+				.select_from(lines.join(new_order, true()))
+			)
+			.returning(OrderItem.id)
+			.cte("new_items")
+		)
+		ordered_cart = (
+			update(Cart)
+			.where(Cart.id == cart_id, exists(select(new_order.c.id)))
+			.values(status=CartEnum.ORDERED, updated_at=now)
+			.returning(Cart.id)
+			.cte("ordered_cart")
 		)
-		self.db.add(item)
-		await self.db.commit()
-		await self.db.refresh(item)
-		return item
+
+		result = await self.db.execute(
+			select(
+				new_order.c.total_amount,
+				select(func.count()).select_from(new_items).scalar_subquery(),
+				select(func.count()).select_from(ordered_cart).scalar_subquery(),
+			)
+		)
+		row = result.first()
+		if row is None:
+			return None
+
+		total_amount, items_count, _ = row
+		record_event(self.db, "order", order_id, "order.created", {
+			"user_id": str(user_id),
+			"status": OrderStatus.PENDING.value,
+			"cart_id": str(cart_id),
+			"items_count": items_count,
+			"total_amount": float(total_amount),
+		})
+		record_event(self.db, "cart", cart_id, "cart.status_changed", {
+			"user_id": str(user_id),
+			"status": CartEnum.ORDERED.value,
+		})
+		return CheckoutResult(order_id, cart_id, float(total_amount), items_count)
 
 	async def get_order_by_id(self, order_id: UUID) -> Optional[Order]:
-		query = select(Order).options(selectinload(Order.items)).where(Order.id == order_id)
+		query = select(Order).options(selectinload(Order.items)).where(*_order_key(order_id))
 		result = await self.db.execute(query)
 		return result.scalar_one_or_none()
 
 	async def get_user_order(self, user_id: UUID, order_id: UUID) -> Optional[Order]:
 		query = select(Order).options(selectinload(Order.items)).where(
-			and_(Order.id == order_id, Order.user_id == user_id)
+			and_(*_order_key(order_id), Order.user_id == user_id)
 		)
 		result = await self.db.execute(query)
 		return result.scalar_one_or_none()
 
-	async def get_user_orders(self, user_id: UUID, limit: int = 100, 
-							 skip: int = 0) -> List[Order]:
-		query = (select(Order)
-				 .options(selectinload(Order.items))
-				 .where(Order.user_id == user_id)
-				 .order_by(Order.created_at.desc())
-				 .offset(skip)
-				 .limit(limit))
-		result = await self.db.execute(query)
-		return result.scalars().all()
+	def _summary_query(self, cursor: Optional[Tuple[datetime, UUID]], limit: int):
+		"""
+		Строки списка без позиций: количество считается по ix_order_items_order_id
+		в партиции заказа. Порядок (created_at, id) по убыванию совпадает с ключом
+		секционирования: партиции читаются от новых до набора LIMIT, курсор
+		отсекает более новые, период в search_orders - всё вне диапазона.
+		"""
+		items_count = (
+			select(func.count(OrderItem.id))
+			.where(OrderItem.order_id == Order.id, OrderItem.order_created_at == Order.created_at)
+			.correlate(Order)
+			.scalar_subquery()
+		)
+		query = select(*Order.__table__.c, items_count.label("items_count"))
+		if cursor is not None:
+			query = query.where(tuple_(Order.created_at, Order.id) < tuple_(*cursor))
+		return query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit)
 
-	async def get_all_orders(self, limit: int = 100, skip: int = 0,
-							status: Optional[OrderStatus] = None) -> List[Order]:
-		query = select(Order).options(selectinload(Order.items))
+	async def get_user_orders(self, user_id: UUID, limit: int = 100,
+							 cursor: Optional[Tuple[datetime, UUID]] = None) -> List[Row]:
+		query = self._summary_query(cursor, limit).where(Order.user_id == user_id)
+		result = await self.db.execute(query)
+		return result.all()
 
+	async def get_all_orders(self, limit: int = 100, cursor: Optional[Tuple[datetime, UUID]] = None,
+							status: Optional[OrderStatus] = None) -> List[Row]:
+		query = self._summary_query(cursor, limit)
 		if status:
 			query = query.where(Order.status == status)
+		result = await self.db.execute(query)
+		return result.all()
 
-		query = query.order_by(Order.created_at.desc()).offset(skip).limit(limit)
+	async def search_orders(
+			self,
+			limit: int = 100,
+			cursor: Optional[Tuple[datetime, UUID]] = None,
+			created_from: Optional[datetime] = None,
+			created_to: Optional[datetime] = None,
+			user_id: Optional[UUID] = None,
+			status: Optional[OrderStatus] = None,
+			product_id: Optional[UUID] = None,
+			phone: Optional[str] = None,
+			address: Optional[str] = None
+	) -> List[Row]:
+		"""
+		Поиск заказов администратором. Фильтры складываются через AND, каждый
+		в форме, которую планировщик сводит к индексу:
+		период - полуинтервал [created_from, created_to) по created_at,
+		user_id и status - префиксы составных индексов с (created_at, id),
+		товар - полусоединение по ix_order_items_product_id,
+		телефон и адрес - ILIKE '%...%' по триграммным GIN-индексам.
+		"""
+		query = self._summary_query(cursor, limit)
+		if created_from is not None:
+			query = query.where(Order.created_at >= created_from)
+		if created_to is not None:
+			query = query.where(Order.created_at < created_to)
+		if user_id is not None:
+			query = query.where(Order.user_id == user_id)
+		if status is not None:
+			query = query.where(Order.status == status)
+		if product_id is not None:
+			query = query.where(
+				exists().where(
+					OrderItem.order_id == Order.id,
+					OrderItem.order_created_at == Order.created_at,
+					OrderItem.product_id == product_id
+				)
+			)
+		if phone:
+			query = query.where(Order.phone_number.ilike(_contains_pattern(phone), escape="\\"))
+		if address:
+			query = query.where(Order.shipping_address.ilike(_contains_pattern(address), escape="\\"))
 		result = await self.db.execute(query)
-		return result.scalars().all()
+		return result.all()
 
 	async def update_order(self, order_id: UUID, update_data: dict) -> Optional[Order]:
 		if not update_data:
 			return await self.get_order_by_id(order_id)
 
 		# Обновляем заказ
-		stmt = update(Order).where(Order.id == order_id).values(**update_data).returning(Order)
+		stmt = update(Order).where(*_order_key(order_id)).values(**update_data).returning(Order)
 		result = await self.db.execute(stmt)
+		order = result.scalar_one_or_none()
+		if order:
+			record_event(self.db, "order", order_id, "order.updated", {
+				"fields": sorted(update_data),
+			})
+			if "status" in update_data:
+				record_event(self.db, "order", order_id, "order.status_changed", {
+					"user_id": str(order.user_id),
+					"status": order.status.value,
+				})
 		await self.db.commit()
 
-		order = result.scalar_one_or_none()
 		if order:
 			await self.db.refresh(order)
 		return order
 
 	async def update_order_status(self, order_id: UUID, status: OrderStatus) -> Optional[Order]:
-		stmt = update(Order).where(Order.id == order_id).values(status=status).returning(Order)
+		stmt = update(Order).where(*_order_key(order_id)).values(status=status).returning(Order)
 		result = await self.db.execute(stmt)
+		order = result.scalar_one_or_none()
+		if order:
+			record_event(self.db, "order", order_id, "order.status_changed", {
+				"user_id": str(order.user_id),
+				"status": status.value,
+			})
 		await self.db.commit()
 
-		order = result.scalar_one_or_none()
 		if order:
 			await self.db.refresh(order)
 		return order
 
-	async def update_order_total(self, order_id: UUID, total_amount: float) -> None:
-		stmt = update(Order).where(Order.id == order_id).values(total_amount=total_amount)
-		await self.db.execute(stmt)
-		await self.db.commit()
-
 	async def delete_order(self, order_id: UUID) -> bool:
-		stmt = delete(Order).where(Order.id == order_id)
+		# внешнего ключа с каскадом нет (см. OrderItem.order_id) - позиции удаляются явно
+		await self.db.execute(delete(OrderItem).where(*_item_key(order_id)))
+		stmt = delete(Order).where(*_order_key(order_id))
 		result = await self.db.execute(stmt)
+		if result.rowcount:
+			record_event(self.db, "order", order_id, "order.deleted")
 		await self.db.commit()
 		return result.rowcount > 0
 
-	async def get_order_items_total(self, order_id: UUID) -> float:
-		query = select(OrderItem).where(OrderItem.order_id == order_id)
-		result = await self.db.execute(query)
-		items = result.scalars().all()
+	async def get_archivable_orders(self, statuses: List[OrderStatus], before: datetime,
+									limit: int) -> List[Order]:
+		"""
+		Старейшие заказы в statuses, созданные раньше before, с позициями.
+		Строки блокируются до конца транзакции; занятые другим процессом пропускаются.
+		"""
+		result = await self.db.execute(
+			select(Order)
+			.options(selectinload(Order.items))
+			.where(Order.status.in_(statuses), Order.created_at < before)
+			.order_by(Order.created_at)
+			.limit(limit)
+			.with_for_update(of=Order, skip_locked=True)
+		)
+		return result.scalars().all()
 
-		total = sum(item.quantity * item.price_at_time for item in items)
-		return total
+	async def delete_archived_orders(self, orders: List[Order]) -> int:
+		"""Удалить перенесённые в архив заказы с позициями двумя запросами на пачку"""
+		keys = [(order.id, order.created_at) for order in orders]
+		await self.db.execute(
+			delete(OrderItem)
+			.where(tuple_(OrderItem.order_id, OrderItem.order_created_at).in_(keys))
+			.execution_options(synchronize_session=False)
+		)
+		result = await self.db.execute(
+			delete(Order)
+			.where(tuple_(Order.id, Order.created_at).in_(keys))
+			.execution_options(synchronize_session=False)
+		)
+		for order in orders:
+			record_event(self.db, "order", order.id, "order.archived", {
+				"user_id": str(order.user_id),
+				"status": order.status.value,
+			})
+		await self.db.commit()
+		return result.rowcount
 
 	async def get_orders_count(self, user_id: Optional[UUID] = None) -> int:
-		query = select(Order)
+		query = select(func.count()).select_from(Order)
 		if user_id:
 			query = query.where(Order.user_id == user_id)
 
 		result = await self.db.execute(query)
-		return len(result.scalars().all())
+		return result.scalar_one()
 
 
 async def get_order_repository(db: AsyncSession = Depends(get_session)) -> OrderRepository:
@@ -2,7 +2,7 @@ from uuid import UUID
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field
 from app.orders.models import OrderStatus
 
 class OrderStatusEnum(str, Enum):
@@ -12,21 +12,11 @@ class OrderStatusEnum(str, Enum):
 	DELIVERED = "delivered"
 	CANCELLED = "cancelled"
 
-class OrderItemCreate(BaseModel):
-	product_id: UUID
-	quantity: int = Field(ge=1, le=100)
-
-	@validator('quantity')
-	def validate_quantity(cls, v):
-		if v <= 0:
-			raise ValueError('Quantity must be positive')
-		return v
-
 class OrderCreate(BaseModel):
 	shipping_address: str = Field(..., min_length=5, max_length=500)
 	phone_number: str = Field(..., min_length=5, max_length=20)
 	notes: Optional[str] = Field(None, max_length=1000)
-	items: List[OrderItemCreate] = Field(..., min_items=1)
+	# позиции берутся из активной корзины, клиент их не передаёт
 
 
 class OrderUpdate(BaseModel):
@@ -62,5 +52,29 @@ class OrderRead(BaseModel):
 	class Config:
 		from_attributes = True
 
+class OrderSummary(BaseModel):
+	# строка списка заказов: без позиций, только их количество
+	id: UUID
+	user_id: UUID
+	status: OrderStatusEnum
+	total_amount: float
+	items_count: int
+	shipping_address: str
+	phone_number: str
+	notes: Optional[str]
+	ordered_at: datetime
+	created_at: datetime
+	updated_at: datetime
+
+	class Config:
+		from_attributes = True
+
 class OrderStatusUpdate(BaseModel):
-	status: OrderStatusEnum
\ No newline at end of file
+	status: OrderStatusEnum
+
+class OrderStatusEvent(BaseModel):
+	# данные SSE-события /orders/my/stream
+	order_id: UUID
+	status: OrderStatusEnum
+	event: str
+	changed_at: datetime
@@ -1,99 +1,150 @@
 from uuid import UUID
-from typing import List, Optional
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 
 from app.orders.repository import OrderRepository, get_order_repository
-from app.orders.schemas import OrderCreate, OrderRead, OrderUpdate, OrderStatusUpdate, OrderStatusEnum
+from app.orders.archive import OrderArchive, order_archive
+from app.orders.schemas import OrderCreate, OrderRead, OrderSummary, OrderUpdate, OrderStatusUpdate, OrderStatusEnum
 from app.orders.models import OrderStatus
-from app.catalog.repository import ProductRepository, get_product_repository
-from app.cart.service import CartService, get_cart_service
 from app.users.repository import UserRepository, get_user_repository
+from app.core.config import settings
+from app.core.metrics import orders_created_total, carts_checked_out_total
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.tasks import task_queue
+from app.orders.tasks import ORDER_CREATED, ORDER_STATUS_CHANGED
+from app.cart.repository import CartRepository
+from app.cart.store import WriteThroughCartStore, get_cart_store
 
 
 class OrderService:
-	def __init__(self, order_repo: OrderRepository, product_repo: ProductRepository,
-				 user_repo: UserRepository, cart_service: CartService):
+	def __init__(self, order_repo: OrderRepository, user_repo: UserRepository,
+				 archive: OrderArchive = order_archive, cart_store: Optional[WriteThroughCartStore] = None):
 		self.order_repo = order_repo
-		self.product_repo = product_repo
 		self.user_repo = user_repo
-		self.cart_service = cart_service
+		self.archive = archive
+		self.cart_store = cart_store or get_cart_store()
 
 	async def create_order_from_cart(self, user_id: UUID, order_data: OrderCreate) -> OrderRead:
-		user = await self.user_repo.get_by_id(user_id)
-		if not user:
+		"""
+		Единственный путь оформления: активная корзина превращается в заказ
+		в одной транзакции, число запросов не зависит от размера корзины.
+		"""
+		# отложенные правки корзины (write_behind) - в базу до блокировки корзины
+		await self.cart_store.flush_user(CartRepository(self.order_repo.db), user_id)
+		cart_id = await self.order_repo.lock_active_cart(user_id)
+		if cart_id is None:
+			await self.order_repo.db.rollback()
 			raise HTTPException(
 				status_code=status.HTTP_404_NOT_FOUND,
-				detail="User not found"
+				detail="Cart not found"
 			)
 
-		order = await self.order_repo.create_order(
+		checkout = await self.order_repo.create_order_from_cart(
+			cart_id=cart_id,
 			user_id=user_id,
 			shipping_address=order_data.shipping_address,
 			phone_number=order_data.phone_number,
 			notes=order_data.notes
 		)
-
-		total_amount = 0.0
-
-		for item in order_data.items:
-			product = await self.product_repo.get_by_id(item.product_id)
-			if not product:
-				await self.order_repo.delete_order(order.id)
-				raise HTTPException(
-					status_code=status.HTTP_404_NOT_FOUND,
-					detail=f"Product with id {item.product_id} not found"
-				)
-
-			if hasattr(product, 'stock_quantity') and product.stock_quantity < item.quantity:
-				await self.order_repo.delete_order(order.id)
-				raise HTTPException(
-					status_code=status.HTTP_400_BAD_REQUEST,
-					detail=f"Not enough stock for product {product.name}. Available: {product.stock_quantity}"
-				)
-
-			await self.order_repo.add_order_item(
-				order_id=order.id,
-				product_id=product.id,
-				quantity=item.quantity,
-				price=product.price,
-				product_name=product.name
+		if checkout is None:
+			await self.order_repo.db.rollback()
+			raise HTTPException(
+				status_code=status.HTTP_400_BAD_REQUEST,
+				detail="Cart is empty"
 			)
 
-			if hasattr(product, 'stock_quantity'):
-				await self.product_repo.update_product(
-					product.id, 
-					{"stock_quantity": product.stock_quantity - item.quantity}
-				)
-
-			total_amount += item.quantity * product.price
-
-		await self.order_repo.update_order_total(order.id, total_amount)
-
-		full_order = await self.order_repo.get_order_by_id(order.id)
+		# задача фиксируется тем же commit, что и заказ
+		task_queue.enqueue(self.order_repo.db, ORDER_CREATED, {
+			"order_id": str(checkout.order_id),
+			"user_id": str(user_id),
+			"total_amount": checkout.total_amount,
+		})
+		await self.order_repo.db.commit()
+		orders_created_total.inc()
+		carts_checked_out_total.inc()
+
+		full_order = await self.order_repo.get_order_by_id(checkout.order_id)
 		return OrderRead.model_validate(full_order)
 
 	async def get_user_order(self, user_id: UUID, order_id: UUID) -> OrderRead:
 		order = await self.order_repo.get_user_order(user_id, order_id)
-		if not order:
+		if order:
+			return OrderRead.model_validate(order)
+
+		# старые выполненные и отменённые заказы - в архиве
+		archived = await self.archive.get_order(order_id)
+		if archived is None or archived.user_id != user_id:
 			raise HTTPException(
 				status_code=status.HTTP_404_NOT_FOUND,
 				detail="Order not found"
 			)
-		return OrderRead.model_validate(order)
-
-	async def get_user_orders(self, user_id: UUID, limit: int = 100, 
-							 skip: int = 0) -> List[OrderRead]:
-		orders = await self.order_repo.get_user_orders(user_id, limit, skip)
-		return [OrderRead.model_validate(order) for order in orders]
-
-	async def get_all_orders(self, limit: int = 100, skip: int = 0,
-							status: Optional[OrderStatusEnum] = None) -> List[OrderRead]:
+		return archived
+
+	@staticmethod
+	def _page(rows, limit: int) -> Tuple[List[OrderSummary], Optional[str]]:
+		# запрошено limit + 1: лишняя строка означает, что есть следующая страница
+		next_cursor = None
+		if len(rows) > limit:
+			rows = rows[:limit]
+			next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+		return [OrderSummary.model_validate(row) for row in rows], next_cursor
+
+	@staticmethod
+	def _archive_may_fill(rows, limit: int) -> bool:
+		"""
+		Нужен ли архив для страницы поиска: база вернула меньше limit + 1 строк
+		или страница уходит старше archive_after_days - в архиве только такие заказы.
+		При выключенном архиваторе граница неизвестна, архив читается только на неполной странице.
+		"""
+		if len(rows) <= limit:
+			return True
+		days = settings.orders.archive_after_days
+		return days > 0 and rows[-1].created_at < datetime.utcnow() - timedelta(days=days)
+
+	async def get_user_orders(self, user_id: UUID, limit: int = 100,
+							 cursor: Optional[str] = None) -> Tuple[List[OrderSummary], Optional[str]]:
+		rows = await self.order_repo.get_user_orders(user_id, limit + 1, decode_cursor(cursor))
+		return self._page(rows, limit)
+
+	async def get_all_orders(self, limit: int = 100, cursor: Optional[str] = None,
+							status: Optional[OrderStatusEnum] = None) -> Tuple[List[OrderSummary], Optional[str]]:
 		order_status = None
 		if status:
 			order_status = OrderStatus(status.value)
 
-		orders = await self.order_repo.get_all_orders(limit, skip, order_status)
-		return [OrderRead.model_validate(order) for order in orders]
+		rows = await self.order_repo.get_all_orders(limit + 1, decode_cursor(cursor), order_status)
+		return self._page(rows, limit)
+
+	async def search_orders(self, limit: int = 100, cursor: Optional[str] = None,
+							created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+							user_id: Optional[UUID] = None, status: Optional[OrderStatusEnum] = None,
+							product_id: Optional[UUID] = None, phone: Optional[str] = None,
+							address: Optional[str] = None) -> Tuple[List[OrderSummary], Optional[str]]:
+		filters = dict(
+			created_from=created_from,
+			created_to=created_to,
+			user_id=user_id,
+			status=OrderStatus(status.value) if status else None,
+			product_id=product_id,
+			phone=phone,
+			address=address
+		)
+		page_cursor = decode_cursor(cursor)
+		rows = await self.order_repo.search_orders(limit + 1, page_cursor, **filters)
+		archived = []
+		if self._archive_may_fill(rows, limit):
+			archived = await self.archive.search_orders(limit + 1, page_cursor, **filters)
+		if archived:
+			# обе выборки упорядочены одинаково - страница собирается из их слияния;
+			# заказ, ещё не удалённый из базы после переноса, берётся один раз
+			seen = {row.id for row in rows}
+			rows = sorted(
+				[*rows, *(row for row in archived if row.id not in seen)],
+				key=lambda row: (row.created_at, row.id),
+				reverse=True
+			)[:limit + 1]
+		return self._page(rows, limit)
 
 	async def update_order_status(self, order_id: UUID, status_update: OrderStatusUpdate,
 								 current_user_id: UUID) -> OrderRead:
@@ -120,6 +171,13 @@ class OrderService:
 				detail="Not enough permissions to update order status"
 			)
 
+		# до commit в репозитории: задача фиксируется вместе со сменой статуса
+		task_queue.enqueue(self.order_repo.db, ORDER_STATUS_CHANGED, {
+			"order_id": str(order_id),
+			"user_id": str(order.user_id),
+			"old_status": order.status.value,
+			"new_status": status_update.status.value,
+		})
 		updated_order = await self.order_repo.update_order_status(
 			order_id, 
 			OrderStatus(status_update.status.value)
@@ -151,8 +209,6 @@ class OrderService:
 
 async def get_order_service(
 	order_repo: OrderRepository = Depends(get_order_repository),
-	product_repo: ProductRepository = Depends(get_product_repository),
 	user_repo: UserRepository = Depends(get_user_repository),
-	cart_service: CartService = Depends(get_cart_service),
 ) -> OrderService:
-	return OrderService(order_repo, product_repo, user_repo, cart_service)
\ No newline at end of file
+	return OrderService(order_repo, user_repo)
\ No newline at end of file
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.core.metrics import registry
+from app.events.models import OutboxEvent
+from app.events.relay import outbox_relay
+from app.events.repository import EventRepository
+from app.orders.schemas import OrderStatusEvent
+
+logger = logging.getLogger("app.orders")
+
+ORDER_STREAM_EVENTS = ("order.created", "order.status_changed")
+# событий за один проход рассылки / догрузки по Last-Event-ID
+FANOUT_BATCH_SIZE = 1000
+STREAM_RETRY_MS = 3000
+
+
+class OrderSubscription:
+	def __init__(self, user_id: UUID, queue_size: int):
+		self.user_id = str(user_id)
+		self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+		self.overflowed = False
+
+
+class OrderStatusBroadcaster:
+	"""
+	Рассылка изменений заказов SSE-клиентам процесса.
+
+	Один цикл на процесс после каждой публикации (NOTIFY через общий
+	listener) читает новые события заказов и раскладывает их по очередям
+	подписчиков по user_id. Число запросов к базе не зависит от числа
+	открытых потоков; пока подписчиков нет, запоминается только голова потока.
+	"""
+
+	def __init__(self):
+		self.config = settings.events
+		self._subscribers: dict[str, set[OrderSubscription]] = {}
+		self._cursor: Optional[int] = None
+		self._task: Optional[asyncio.Task] = None
+
+	@property
+	def subscriber_count(self) -> int:
+		return sum(len(subs) for subs in self._subscribers.values())
+
+	def subscribe(self, user_id: UUID) -> OrderSubscription:
+		sub = OrderSubscription(user_id, self.config.subscriber_queue_size)
+		self._subscribers.setdefault(sub.user_id, set()).add(sub)
+		return sub
+
+	def unsubscribe(self, sub: OrderSubscription) -> None:
+		subs = self._subscribers.get(sub.user_id)
+		if subs is None:
+			return
+		subs.discard(sub)
+		if not subs:
+			del self._subscribers[sub.user_id]
+
+	def dispatch(self, events: list[OutboxEvent]) -> None:
+		for event in events:
+			for sub in list(self._subscribers.get(event.payload.get("user_id"), ())):
+				try:
+					sub.queue.put_nowait(event)
+				except asyncio.QueueFull:
+					# клиент не успевает читать: поток закроется после очереди,
+					# клиент переподключится и догрузит пропущенное по Last-Event-ID
+					sub.overflowed = True
+					self.unsubscribe(sub)
+
+	async def poll(self) -> None:
+		async with async_session_maker() as session:
+			repo = EventRepository(session)
+			# не голова последовательности: номера незафиксированной публикации
+			# оказались бы за курсором и не дошли бы до подписчиков
+			head = await repo.get_visible_seq()
+			if self._cursor is None or not self._subscribers:
+				self._cursor = max(self._cursor or 0, head)
+				return
+
+			while self._cursor < head:
+				events = await repo.get_events_after(
+					self._cursor, FANOUT_BATCH_SIZE, "order", ORDER_STREAM_EVENTS, up_to_seq=head
+				)
+				self.dispatch(events)
+				if len(events) < FANOUT_BATCH_SIZE:
+					break
+				self._cursor = events[-1].published_seq
+			# после очистки старых событий видимый максимум меньше курсора
+			self._cursor = max(self._cursor, head)
+
+	async def _run(self) -> None:
+		while True:
+			published = outbox_relay.published_event()
+			try:
+				await self.poll()
+			except Exception:
+				logger.exception("order status fan-out failed")
+			await outbox_relay.wait_published(published, self.config.tail_poll_interval_seconds)
+
+	async def start(self) -> None:
+		if self._task is None:
+			self._task = asyncio.create_task(self._run())
+
+	async def stop(self) -> None:
+		if self._task is None:
+			return
+		self._task.cancel()
+		await asyncio.gather(self._task, return_exceptions=True)
+		self._task = None
+
+
+order_broadcaster = OrderStatusBroadcaster()
+
+registry.gauge(
+	"order_stream_subscribers", "Открытые SSE-потоки статусов заказов",
+	collect=lambda: order_broadcaster.subscriber_count
+)
+
+
+def format_order_event(event: OutboxEvent) -> str:
+	data = OrderStatusEvent(
+		order_id=event.aggregate_id,
+		status=event.payload["status"],
+		event=event.event_type,
+		changed_at=event.created_at,
+	).model_dump_json()
+	return f"id: {event.published_seq}\nevent: {event.event_type}\ndata: {data}\n\n"
+
+
+async def order_status_stream(
+		repo: EventRepository,
+		user_id: UUID,
+		last_event_id: Optional[int],
+		is_disconnected: Callable[[], Awaitable[bool]]
+) -> AsyncIterator[str]:
+	"""
+	SSE-поток создания и смены статуса заказов пользователя.
+
+	Подписка оформляется до догрузки по Last-Event-ID, поэтому события между
+	догрузкой и живым потоком не теряются; повторы отсекаются по id.
+	Если клиент отстал больше чем на max_resume_gap, приходит event: reset -
+	заказы нужно перечитать через GET /orders/my.
+	"""
+	config = settings.events
+	sub = order_broadcaster.subscribe(user_id)
+	try:
+		yield f"retry: {STREAM_RETRY_MS}\n\n"
+		last_sent = last_event_id or 0
+
+		if last_event_id is not None:
+			head = await repo.get_head_seq()
+			if head - last_event_id > config.max_resume_gap:
+				yield "event: reset\ndata: {}\n\n"
+			else:
+				while True:
+					events = await repo.get_user_events_after(
+						user_id, last_sent, "order", ORDER_STREAM_EVENTS, FANOUT_BATCH_SIZE
+					)
+					if events:
+						last_sent = events[-1].published_seq
+						yield "".join(format_order_event(event) for event in events)
+					if len(events) < FANOUT_BATCH_SIZE:
+						break
+
+		# транзакция сессии запроса (её уже открыла проверка токена) завершается
+		# при любом Last-Event-ID: соединение возвращается в пул, а не висит
+		# "idle in transaction" всё время жизни потока - дальше события приходят через очередь
+		await repo.db.commit()
+
+		while True:
+			try:
+				event = await asyncio.wait_for(sub.queue.get(), timeout=config.heartbeat_seconds)
+			except asyncio.TimeoutError:
+				if sub.overflowed or await is_disconnected():
+					return
+				yield ": ping\n\n"
+				continue
+
+			if event.published_seq > last_sent:
+				last_sent = event.published_seq
+				yield format_order_event(event)
+			if sub.overflowed and sub.queue.empty():
+				return
+	finally:
+		order_broadcaster.unsubscribe(sub)
@@ -0,0 +1,42 @@
+import logging
+
+import aiohttp
+
+from app.core.config import settings
+from app.core.tasks import task_queue
+
+logger = logging.getLogger("app.orders")
+
+ORDER_CREATED = "orders.created"
+ORDER_STATUS_CHANGED = "orders.status_changed"
+
+
+async def post_notification(event: str, payload: dict) -> None:
+	"""
+	Отправить уведомление о заказе на notify_webhook_url (склад, рассылка писем).
+	Сетевая ошибка или ответ >= 400 поднимает исключение - очередь повторит задачу
+	с задержкой. Повтор может доставить уведомление дважды: получатель
+	отсекает дубли по (event, order_id, status).
+	"""
+	config = settings.orders
+	if not config.notify_webhook_url:
+		logger.info("order notification %s: %s", event, payload["order_id"], extra={"event": payload})
+		return
+
+	timeout = aiohttp.ClientTimeout(total=config.notify_timeout_seconds)
+	async with aiohttp.ClientSession(timeout=timeout) as http:
+		async with http.post(config.notify_webhook_url, json={"event": event, **payload}) as resp:
+			if resp.status >= 400:
+				raise RuntimeError(f"order webhook responded {resp.status}: {(await resp.text())[:200]}")
+
+
+@task_queue.task(ORDER_CREATED)
+async def notify_order_created(payload: dict) -> None:
+	"""Уведомление о новом заказе"""
+	await post_notification(ORDER_CREATED, payload)
+
+
+@task_queue.task(ORDER_STATUS_CHANGED)
+async def notify_order_status_changed(payload: dict) -> None:
+	"""Уведомление о смене статуса заказа"""
+	await post_notification(ORDER_STATUS_CHANGED, payload)
@@ -1,6 +1,6 @@
 from uuid import UUID
 from typing import List, Optional
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 
 from app.promotions.service import PromotionService, get_promotion_service
 from app.promotions.schemas import (
@@ -8,6 +8,7 @@ from app.promotions.schemas import (
     PromotionWithProducts, AttachProductsRequest
 )
 from app.auth.service import get_current_user_dep
+from app.core.cache import response_cache
 from app.users.models import User
 from app.users.enum import UserRole
 
@@ -24,13 +25,20 @@ router = APIRouter(
     summary="Получить список активных акций"
 )
 async def get_active_promotions(
+        request: Request,
         service: PromotionService = Depends(get_promotion_service)
-) -> List[PromotionWithProducts]:
+) -> Response:
     """
     Получить список действующих акций.
     Доступно всем пользователям (Guest, User, Admin).
-    """
-    return await service.get_active_promotions()
+    Ответ кэшируется вместе со сжатыми вариантами.
+    """
+    payload = await response_cache.get_or_set(
+        "promotions:active",
+        service.get_active_promotions,
+        List[PromotionWithProducts]
+    )
+    return response_cache.render(request, payload)
 
 
 @router.get(
@@ -1,5 +1,5 @@
 from typing import Any
-from sqlalchemy import Column, String, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Float, Boolean, DateTime, ForeignKey, Index, Integer
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from app.core.db import Base, BaseModelMixin
@@ -23,6 +23,14 @@ class Promotion(Base, BaseModelMixin):
         lazy="selectin"
     )
 
+    __table_args__ = (
+        # "что действует в момент T": истёкшие акции планировщик выключает,
+        # поэтому диапазон is_active = true остаётся коротким
+        Index("ix_promotions_is_active_starts_at_ends_at", "is_active", "starts_at", "ends_at"),
+        # окончания акций - для планировщика (PromotionScheduler)
+        Index("ix_promotions_ends_at", "ends_at"),
+    )
+
     def __repr__(self) -> str:
         return f"Promotion(id={self.id}, title={self.title}, discount={self.discount_percent}%)"
 
@@ -68,3 +76,18 @@ class PromotionProduct(Base):
             "promotion_id": self.promotion_id,
             "product_id": self.product_id
         }
+
+
+class PromotionSchedulerState(Base):
+    """
+    Момент, до которого планировщик (PromotionScheduler) обработал начала и
+    окончания акций. Одна строка; читается и сдвигается под advisory-блокировкой,
+    поэтому границы не теряются ни при простое, ни при смене процесса.
+    """
+    __tablename__ = "promotion_scheduler_state"
+
+    id = Column(Integer, primary_key=True, autoincrement=False, default=1)
+    checked_at = Column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"PromotionSchedulerState(checked_at={self.checked_at})"
@@ -1,13 +1,39 @@
-from uuid import UUID
+from uuid import UUID, uuid4
 from datetime import datetime
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_
+from sqlalchemy import select, update, delete, and_, or_, func, cast, Numeric
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
 
-from app.promotions.models import Promotion, PromotionProduct
+from app.core.metrics import instrument_repository
+from app.promotions.models import Promotion, PromotionProduct, PromotionSchedulerState
 
 
+def best_discount_percent(product_id, at: datetime):
+    """
+    Скалярный подзапрос: наибольшая скидка акций, действующих на товар в момент at
+    (NULL - таких нет). product_id - колонка внешнего запроса.
+    """
+    return (
+        select(func.max(Promotion.discount_percent))
+        .join(PromotionProduct, PromotionProduct.promotion_id == Promotion.id)
+        .where(
+            PromotionProduct.product_id == product_id,
+            Promotion.is_active == True,
+            Promotion.starts_at <= at,
+            Promotion.ends_at >= at
+        )
+        .scalar_subquery()
+    )
+
+
+def discounted_price(price, discount_percent):
+    """Цена со скидкой в процентах, до копеек; NULL-скидка - цена без изменений"""
+    return func.round(price * (1 - cast(func.coalesce(discount_percent, 0), Numeric) / 100), 2)
+
+
+@instrument_repository
 class PromotionRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -19,9 +45,11 @@ class PromotionRepository:
             discount_percent: float,
             starts_at: datetime,
             ends_at: datetime,
-            is_active: bool = True
+            is_active: bool = True,
+            promotion_id: Optional[UUID] = None
     ) -> Promotion:
         promotion = Promotion(
+            id=promotion_id or uuid4(),
             title=title,
             description=description,
             discount_percent=discount_percent,
@@ -98,6 +126,73 @@ class PromotionRepository:
         await self.db.commit()
         return result.rowcount > 0
 
+    # границы действия акций (PromotionScheduler)
+    async def get_crossed_promotion_ids(self, since: datetime, until: datetime) -> List[UUID]:
+        """Акции, которые начались или закончились в промежутке (since, until]"""
+        result = await self.db.execute(
+            select(Promotion.id).where(
+                or_(
+                    and_(Promotion.is_active == True, Promotion.starts_at > since, Promotion.starts_at <= until),
+                    # по get_active_promotions акция действует и в сам момент ends_at
+                    and_(Promotion.ends_at >= since, Promotion.ends_at < until)
+                )
+            )
+        )
+        return list(result.scalars().all())
+
+    async def expire_promotions(self, now: datetime) -> List[UUID]:
+        """Выключить закончившиеся акции; без commit - вызывающий фиксирует вместе с остальным"""
+        result = await self.db.execute(
+            update(Promotion)
+            .where(Promotion.is_active == True, Promotion.ends_at < now)
+            .values(is_active=False)
+            .returning(Promotion.id)
+            .execution_options(synchronize_session=False)
+        )
+        return list(result.scalars().all())
+
+    async def get_next_boundary(self, now: datetime) -> Optional[datetime]:
+        """Ближайшее после now начало или окончание включённой акции"""
+        next_start = (
+            select(func.min(Promotion.starts_at))
+            .where(Promotion.is_active == True, Promotion.starts_at > now)
+            .scalar_subquery()
+        )
+        next_end = (
+            select(func.min(Promotion.ends_at))
+            .where(Promotion.is_active == True, Promotion.ends_at >= now)
+            .scalar_subquery()
+        )
+        result = await self.db.execute(select(next_start, next_end))
+        boundaries = [boundary for boundary in result.one() if boundary is not None]
+        return min(boundaries) if boundaries else None
+
+    async def get_scheduler_watermark(self) -> Optional[datetime]:
+        """До какого момента планировщик уже обработал границы акций"""
+        result = await self.db.execute(
+            select(PromotionSchedulerState.checked_at).where(PromotionSchedulerState.id == 1)
+        )
+        return result.scalar_one_or_none()
+
+    async def set_scheduler_watermark(self, checked_at: datetime) -> None:
+        """Сдвинуть отметку планировщика; без commit - вместе с обработкой границ"""
+        stmt = pg_insert(PromotionSchedulerState).values(id=1, checked_at=checked_at)
+        await self.db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[PromotionSchedulerState.id],
+                # назад не двигается, даже если часы процессов расходятся
+                set_={"checked_at": func.greatest(PromotionSchedulerState.checked_at, stmt.excluded.checked_at)},
+            )
+        )
+
+    async def get_product_ids(self, promotion_ids: List[UUID]) -> List[UUID]:
+        result = await self.db.execute(
+            select(PromotionProduct.product_id)
+            .where(PromotionProduct.promotion_id.in_(promotion_ids))
+            .distinct()
+        )
+        return list(result.scalars().all())
+
     # Методы для работы с PromotionProduct
     async def attach_products_to_promotion(
             self,
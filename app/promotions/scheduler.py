@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.core.cache import response_cache
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.core.metrics import registry
+from app.promotions.repository import PromotionRepository
+from app.cart.tasks import enqueue_reprice
+
+logger = logging.getLogger("app.promotions.scheduler")
+
+# не крутиться вхолостую на границе, которая ещё не наступила по часам процесса
+MIN_SLEEP_SECONDS = 0.05
+
+promotions_expired_total = registry.counter(
+    "promotions_expired_total", "Акции, выключенные планировщиком по окончании"
+)
+
+
+class PromotionScheduler:
+    """
+    Планировщик границ акций, работает в каждом процессе:
+
+    * спит до ближайшего начала или окончания включённой акции, но не дольше
+      scheduler_max_sleep_seconds (так подхватываются новые и изменённые акции);
+    * если с прошлого прохода этого процесса акция началась или закончилась -
+      сбрасывает кэш акций и каталога своего процесса;
+    * под advisory-блокировкой (один процесс на проход) выключает закончившиеся
+      акции (is_active = false) и ставит пересчёт цен в корзинах для товаров
+      акций, начавшихся или закончившихся с отметки в promotion_scheduler_state.
+      Отметка общая и сдвигается в той же транзакции: границы, пришедшиеся на
+      простой или на проход другого процесса, не теряются.
+    """
+
+    LOCK_KEY = 0x70726f6d6f74696f
+
+    def __init__(self, session_factory=async_session_maker):
+        self.config = settings.promotions
+        self.session_factory = session_factory
+        self._checked_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        """Обработать границы с прошлого прохода; возвращает следующую границу"""
+        now = now or datetime.utcnow()
+        since, self._checked_at = self._checked_at or now, now
+        async with self.session_factory() as session:
+            repo = PromotionRepository(session)
+            # кэш у каждого процесса свой: промежуток - с его прошлого прохода
+            if await repo.get_crossed_promotion_ids(since, now):
+                response_cache.invalidate("promotions:", "catalog:")
+
+            locked = await session.execute(
+                text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": self.LOCK_KEY}
+            )
+            if locked.scalar_one():
+                watermark = await repo.get_scheduler_watermark()
+                crossed = (
+                    await repo.get_crossed_promotion_ids(watermark, now)
+                    if watermark is not None and watermark < now else []
+                )
+                expired = await repo.expire_promotions(now)
+                promotions_expired_total.inc(len(expired))
+                changed = list({*crossed, *expired})
+                product_ids = await repo.get_product_ids(changed) if changed else []
+                if product_ids:
+                    enqueue_reprice(session, product_ids)
+                await repo.set_scheduler_watermark(now)
+                # пересчёт и отметка фиксируются вместе с выключением акций
+                await session.commit()
+                if expired:
+                    logger.info("expired %d promotions", len(expired))
+            else:
+                await session.rollback()
+
+            return await repo.get_next_boundary(now)
+
+    async def _run(self) -> None:
+        while True:
+            sleep = self.config.scheduler_max_sleep_seconds
+            try:
+                boundary = await self.run_once()
+                if boundary is not None:
+                    sleep = min(sleep, (boundary - datetime.utcnow()).total_seconds())
+            except Exception:
+                logger.exception("promotion scheduler failed")
+            await asyncio.sleep(max(sleep, MIN_SLEEP_SECONDS))
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+promotion_scheduler = PromotionScheduler()
@@ -1,4 +1,5 @@
-from uuid import UUID
+import logging
+from uuid import UUID, uuid4
 from datetime import datetime
 from typing import List, Optional
 from fastapi import Depends, HTTPException, status
@@ -10,8 +11,12 @@ from app.promotions.schemas import (
 )
 from app.catalog.repository import ProductRepository, get_product_repository
 from app.core.db import get_session
+from app.core.cache import response_cache
+from app.cart.tasks import enqueue_reprice
 from sqlalchemy.ext.asyncio import AsyncSession
 
+logger = logging.getLogger("app.promotions")
+
 
 def get_promotion_repository(db: AsyncSession = Depends(get_session)) -> PromotionRepository:
     return PromotionRepository(db)
@@ -26,6 +31,24 @@ class PromotionService:
         self.promotion_repo = promotion_repo
         self.product_repo = product_repo
 
+    def _record_change(self, product_ids: Optional[List[UUID]] = None) -> None:
+        """
+        Пересчёт цен в активных корзинах - в транзакцию изменения акции:
+        вызывается до метода репозитория, который её фиксирует.
+        product_ids - товары, скидка на которые могла измениться.
+        """
+        if product_ids:
+            enqueue_reprice(self.promotion_repo.db, product_ids)
+
+    async def _after_change(self, promotion_id: UUID, action: str) -> None:
+        """
+        Сбросить кэш акций и каталога сразу после коммита. Кэш у каждого
+        процесса свой: остальные увидят изменение по истечении TTL, как и
+        после правки товара - ставить на это задачу в очередь незачем.
+        """
+        response_cache.invalidate("promotions:", "catalog:")
+        logger.info("promotion %s %s", promotion_id, action)
+
     async def create_promotion(self, data: PromotionCreate) -> PromotionRead:
         """Создание новой акции"""
         # Валидация дат
@@ -35,14 +58,17 @@ class PromotionService:
                 detail="End date must be after start date"
             )
 
+        promotion_id = uuid4()
         promotion = await self.promotion_repo.create_promotion(
             title=data.title,
             description=data.description,
             discount_percent=data.discount_percent,
             starts_at=data.starts_at,
             ends_at=data.ends_at,
-            is_active=data.is_active
+            is_active=data.is_active,
+            promotion_id=promotion_id
         )
+        await self._after_change(promotion_id, "created")
 
         return PromotionRead.model_validate(promotion)
 
@@ -112,10 +138,14 @@ class PromotionService:
             )
 
         update_data = data.model_dump(exclude_unset=True)
+        product_ids = [pp.product_id for pp in promotion.promotion_products]
+        pricing_changed = update_data.keys() & {"discount_percent", "starts_at", "ends_at", "is_active"}
+        self._record_change(product_ids if pricing_changed else None)
         updated_promotion = await self.promotion_repo.update_promotion(
             promotion_id=promotion_id,
             **update_data
         )
+        await self._after_change(promotion_id, "updated")
 
         return PromotionRead.model_validate(updated_promotion)
 
@@ -129,7 +159,10 @@ class PromotionService:
                 detail="Promotion not found"
             )
 
+        product_ids = [pp.product_id for pp in promotion.promotion_products]
+        self._record_change(product_ids)
         deleted = await self.promotion_repo.delete_promotion(promotion_id)
+        await self._after_change(promotion_id, "deleted")
 
         if not deleted:
             raise HTTPException(
@@ -163,10 +196,12 @@ class PromotionService:
                 )
 
         # Привязываем товары
+        self._record_change(data.product_ids)
         await self.promotion_repo.attach_products_to_promotion(
             promotion_id=promotion_id,
             product_ids=data.product_ids
         )
+        await self._after_change(promotion_id, "products_attached")
 
         # Возвращаем обновленную акцию
         return await self.get_promotion(promotion_id)
@@ -185,10 +220,12 @@ class PromotionService:
                 detail="Promotion not found"
             )
 
+        self._record_change(data.product_ids)
         await self.promotion_repo.detach_products_from_promotion(
             promotion_id=promotion_id,
             product_ids=data.product_ids
         )
+        await self._after_change(promotion_id, "products_detached")
 
         return await self.get_promotion(promotion_id)
 
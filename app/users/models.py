@@ -16,11 +16,14 @@ class User(Base, BaseModelMixin):
     password_hash = Column(String(200), nullable=False)
     role = Column(SAEnum(UserRole, name="user_role_enum"), nullable=False, default=UserRole.USER)
 
+    # история корзин не загружается вместе с пользователем;
+    # при удалении пользователя корзины удаляет ON DELETE CASCADE в базе
     carts = relationship(
         "Cart",
         back_populates="user",
-        lazy="selectin",
-        cascade="all, delete-orphan"
+        lazy="select",
+        cascade="all, delete-orphan",
+        passive_deletes=True
     )
 
     reviews = relationship(
@@ -5,9 +5,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 
 from app.core.db import get_session
+from app.core.metrics import instrument_repository
 from app.users.models import User, UserRole
 
 
+@instrument_repository
 class UserRepository:
   def __init__(self, db: AsyncSession):
     self.db = db
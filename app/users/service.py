@@ -4,7 +4,7 @@ from fastapi import Depends, HTTPException, status
 
 from app.users.repository import UserRepository, get_user_repository
 from app.users.schemas import UserCreate, UserUpdate, UserRead, UserChangePassword
-from app.core.security import hash_password, verify_password
+from app.core.security import hash_password_async, verify_password_async
 
 
 class UserService:
@@ -18,7 +18,7 @@ class UserService:
                 detail="User with this login already exists",
             )
 
-        password_hash = hash_password(data.password)
+        password_hash = await hash_password_async(data.password)
 
         user = await self.repo.create_user(
             first_name=data.first_name,
@@ -67,13 +67,13 @@ class UserService:
                 detail="User not found",
             )
 
-        if not verify_password(payload.old_password, user.password_hash):
+        if not await verify_password_async(payload.old_password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Incorrect old password",
             )
 
-        new_hash = hash_password(payload.new_password)
+        new_hash = await hash_password_async(payload.new_password)
         await self.repo.update_password(user_id, new_hash)
 
 
@@ -0,0 +1,478 @@
+"""
+Бенчмарки горячих эндпоинтов.
+
+Перед запуском база заполняется scripts/seed.py. По умолчанию приложение
+поднимается в этом же процессе (httpx + ASGITransport), с --base-url запросы
+идут на запущенный uvicorn. --concurrency задаёт число параллельных клиентов
+(режим нагрузки).
+
+    poetry run python scripts/bench.py --duration 10 --concurrency 16 --output bench_results/run.json
+    poetry run python scripts/bench.py --compare bench_results/baseline.json bench_results/run.json
+
+--export прогоняет потоковую выгрузку в процессе (без HTTP: ASGITransport
+копит тело ответа целиком) и проверяет, что пиковый RSS вырос не больше
+--rss-budget-mb:
+
+    poetry run python scripts/bench.py --export orders --rss-budget-mb 256
+
+--outbox N пишет N событий outbox, публикует их relay и читает потребителем;
+код возврата 1, если любой этап медленнее --outbox-target событий/с:
+
+    poetry run python scripts/bench.py --outbox 200000 --outbox-target 10000
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))  # Добавляет shop_core в путь поиска
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+API = "/api/v1"
+ORDERS = f"{API}/orders/orders"
+BENCH_PASSWORD = "password"
+
+
+class BenchContext:
+    """Общие данные сценариев: токены пользователей и идентификаторы товаров"""
+
+    def __init__(self, client: httpx.AsyncClient, rnd: random.Random):
+        self.client = client
+        self.rnd = rnd
+        self.user_tokens: list[str] = []
+        self.admin_token: Optional[str] = None
+        self.product_ids: list[str] = []
+
+    async def prepare(self, users: int) -> None:
+        for n in range(users):
+            resp = await self.client.post(
+                f"{API}/auth/token",
+                json={"login": f"bench_user_{n}", "password": BENCH_PASSWORD},
+            )
+            resp.raise_for_status()
+            self.user_tokens.append(resp.json()["access_token"])
+
+        resp = await self.client.post(
+            f"{API}/auth/token", json={"login": "bench_admin", "password": BENCH_PASSWORD}
+        )
+        if resp.status_code == 200:
+            self.admin_token = resp.json()["access_token"]
+
+        skip = 0
+        while len(self.product_ids) < 1000:
+            resp = await self.client.get(f"{API}/catalog/products", params={"limit": 10, "skip": skip})
+            resp.raise_for_status()
+            page = resp.json()
+            if not page:
+                break
+            self.product_ids.extend(p["id"] for p in page)
+            skip += len(page)
+
+        if not self.user_tokens or not self.product_ids:
+            raise RuntimeError("Нет данных для бенчмарка: запустите scripts/seed.py")
+
+    def auth(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.rnd.choice(self.user_tokens)}"}
+
+    def admin_auth(self) -> dict[str, str]:
+        if self.admin_token is None:
+            raise RuntimeError("Нет bench_admin: запустите scripts/seed.py")
+        return {"Authorization": f"Bearer {self.admin_token}"}
+
+    def product_id(self) -> str:
+        return self.rnd.choice(self.product_ids)
+
+
+Scenario = Callable[[BenchContext], Awaitable[httpx.Response]]
+
+
+async def catalog_list(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.get(
+        f"{API}/catalog/products", params={"limit": 10, "skip": ctx.rnd.randint(0, 1000)}
+    )
+
+
+async def categories_list(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.get(f"{API}/catalog/categories", params={"limit": 500})
+
+
+async def product_get(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.get(f"{API}/catalog/products/{ctx.product_id()}")
+
+
+async def cart_add(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.post(
+        f"{API}/cart/items",
+        json={"product_id": ctx.product_id(), "quantity": 1},
+        headers=ctx.auth(),
+    )
+
+
+async def cart_update(ctx: BenchContext) -> httpx.Response:
+    headers = ctx.auth()
+    product_id = ctx.product_id()
+    await ctx.client.post(
+        f"{API}/cart/items", json={"product_id": product_id, "quantity": 1}, headers=headers
+    )
+    return await ctx.client.put(
+        f"{API}/cart/items/{product_id}", json={"quantity": ctx.rnd.randint(1, 5)}, headers=headers
+    )
+
+
+async def checkout(ctx: BenchContext) -> httpx.Response:
+    headers = ctx.auth()
+    await ctx.client.post(
+        f"{API}/cart/items", json={"product_id": ctx.product_id(), "quantity": 1}, headers=headers
+    )
+    return await ctx.client.post(
+        f"{ORDERS}/",
+        json={"shipping_address": "ул. Нагрузочная, 1", "phone_number": "+79990000000"},
+        headers=headers,
+    )
+
+
+async def order_history(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.get(f"{ORDERS}/my", params={"limit": 50}, headers=ctx.auth())
+
+
+async def order_search(ctx: BenchContext) -> httpx.Response:
+    # типичные запросы поддержки: часть телефона/адреса, товар, статус за период
+    # (seed.py: адреса "Bench street N", телефоны "+7999NNNNNNN")
+    kind = ctx.rnd.randrange(4)
+    if kind == 0:
+        params = {"phone": f"{ctx.rnd.randint(0, 9999999):07d}"[-5:]}
+    elif kind == 1:
+        params = {"address": f"street {ctx.rnd.randint(0, 99999)}"}
+    elif kind == 2:
+        params = {"product_id": ctx.product_id()}
+    else:
+        created_to = datetime.utcnow() - timedelta(days=ctx.rnd.randint(0, 330))
+        params = {"status": "pending", "created_from": (created_to - timedelta(days=30)).isoformat(),
+                  "created_to": created_to.isoformat()}
+    return await ctx.client.get(
+        f"{ORDERS}/search", params={"limit": 50, **params}, headers=ctx.admin_auth()
+    )
+
+
+async def promotions_list(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.get(f"{API}/promotions/")
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "catalog_list": catalog_list,
+    "categories_list": categories_list,
+    "product_get": product_get,
+    "cart_add": cart_add,
+    "cart_update": cart_update,
+    "checkout": checkout,
+    "order_history": order_history,
+    "order_search": order_search,
+    "promotions_list": promotions_list,
+}
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_scenario(ctx: BenchContext, scenario: Scenario, duration: float,
+                       concurrency: int) -> dict[str, Any]:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                resp = await scenario(ctx)
+                if resp.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_client(base_url: Optional[str], concurrency: int) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if base_url:
+        return httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30)
+
+    from app.main import app
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30
+    )
+
+
+@asynccontextmanager
+async def app_lifespan(base_url: Optional[str]):
+    """ASGITransport не вызывает lifespan, поэтому в режиме ASGI запускаем его сами"""
+    if base_url:
+        yield
+        return
+
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        yield
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    names = args.scenarios or list(SCENARIOS)
+    async with app_lifespan(args.base_url), make_client(args.base_url, args.concurrency) as client:
+        ctx = BenchContext(client, random.Random(args.seed))
+        await ctx.prepare(args.users)
+
+        results = {}
+        for name in names:
+            if args.warmup:
+                await run_scenario(ctx, SCENARIOS[name], args.warmup, args.concurrency)
+            results[name] = await run_scenario(ctx, SCENARIOS[name], args.duration, args.concurrency)
+            print(f"{name:<18} {json.dumps(results[name])}")
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "mode": "http" if args.base_url else "asgi",
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+        },
+        "results": results,
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def export_check(name: str, fmt: str, budget_mb: float) -> int:
+    """Потоковая выгрузка целиком в никуда; код возврата 1, если RSS вырос больше бюджета"""
+    from app.core.db import async_session_maker, engine
+    from app.admin.exports import products_export, orders_export, reviews_export, stream_export
+
+    exports = {"products": products_export, "orders": orders_export, "reviews": reviews_export}
+    rss_before = peak_rss_mb()
+    total_bytes = lines = 0
+    started = time.perf_counter()
+    try:
+        async with async_session_maker() as session:
+            async for chunk in stream_export(session, exports[name](), fmt):
+                total_bytes += len(chunk)
+                lines += chunk.count(b"\n")
+    finally:
+        await engine.dispose()
+    elapsed = time.perf_counter() - started
+    rss_growth = peak_rss_mb() - rss_before
+
+    print(json.dumps({
+        "export": name,
+        "format": fmt,
+        "lines": lines,
+        "megabytes": round(total_bytes / (1024 * 1024), 1),
+        "seconds": round(elapsed, 2),
+        "lines_per_second": round(lines / elapsed, 1) if elapsed else 0.0,
+        "peak_rss_growth_mb": round(rss_growth, 1),
+        "rss_budget_mb": budget_mb,
+    }))
+    return 1 if rss_growth > budget_mb else 0
+
+
+async def outbox_check(total: int, writers: int, per_transaction: int, target: float) -> int:
+    """
+    Пропускная способность outbox на локальном Postgres: запись событий
+    транзакциями по per_transaction штук в writers соединений, публикация
+    relay пачками и чтение потребителем. Тестовые события удаляются в конце.
+    """
+    import uuid
+    from sqlalchemy import delete
+    from app.core.config import settings
+    from app.core.db import async_session_maker, engine
+    from app.events.consumer import EventConsumer
+    from app.events.models import OutboxEvent, ConsumerOffset
+    from app.events.outbox import record_event
+    from app.events.relay import outbox_relay
+    from app.events.repository import EventRepository
+
+    consumer_name = "bench_outbox"
+    transactions = max(total // per_transaction, writers)
+
+    async def writer(count: int) -> None:
+        async with async_session_maker() as session:
+            for _ in range(count):
+                aggregate_id = uuid.uuid4()
+                for n in range(per_transaction):
+                    record_event(session, "bench", aggregate_id, "bench.event", {"n": n})
+                await session.commit()
+
+    async def stage(work: Callable[[], Awaitable[int]]) -> tuple[int, float]:
+        started = time.perf_counter()
+        done = 0
+        while True:
+            batch = await work()
+            if not batch:
+                return done, time.perf_counter() - started
+            done += batch
+
+    async def publish() -> int:
+        async with async_session_maker() as session:
+            return await outbox_relay.publish_batch(session)
+
+    consumed = 0
+
+    async def handle(events: list) -> None:
+        nonlocal consumed
+        consumed += sum(1 for event in events if event.aggregate_type == "bench")
+
+    try:
+        # потребитель начинает с текущей головы потока
+        async with async_session_maker() as session:
+            repo = EventRepository(session)
+            await repo.claim_offset(consumer_name)
+            await repo.advance_offset(consumer_name, await repo.get_head_seq())
+
+        started = time.perf_counter()
+        per_writer = [transactions // writers + (1 if n < transactions % writers else 0)
+                      for n in range(writers)]
+        await asyncio.gather(*(writer(count) for count in per_writer))
+        write_seconds = time.perf_counter() - started
+        written = transactions * per_transaction
+
+        published, publish_seconds = await stage(publish)
+        consumer = EventConsumer(consumer_name, handle, batch_size=settings.events.relay_batch_size)
+        _, consume_seconds = await stage(consumer.poll)
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(delete(OutboxEvent).where(OutboxEvent.aggregate_type == "bench"))
+            await session.execute(delete(ConsumerOffset).where(ConsumerOffset.consumer == consumer_name))
+            await session.commit()
+        await engine.dispose()
+
+    rates = {
+        "write": written / write_seconds if write_seconds else 0.0,
+        "publish": published / publish_seconds if publish_seconds else 0.0,
+        "consume": consumed / consume_seconds if consume_seconds else 0.0,
+    }
+    print(json.dumps({
+        "events": written,
+        "published": published,
+        "consumed": consumed,
+        "writers": writers,
+        "events_per_transaction": per_transaction,
+        **{f"{name}_events_per_second": round(rate, 1) for name, rate in rates.items()},
+        "target_events_per_second": target,
+    }))
+    return 1 if min(rates.values()) < target else 0
+
+
+def compare(baseline_path: Path, current_path: Path, threshold: float) -> int:
+    """Сравнить два прогона; код возврата 1, если p95 вырос больше чем на threshold"""
+    baseline = json.loads(baseline_path.read_text())["results"]
+    current = json.loads(current_path.read_text())["results"]
+    regressions = 0
+
+    print(f"{'scenario':<18} {'p95 base':>10} {'p95 now':>10} {'delta':>8} {'rps base':>10} {'rps now':>10}")
+    for name, now in current.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        delta = (now["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        marker = ""
+        if delta > threshold:
+            regressions += 1
+            marker = "  REGRESSION"
+        print(
+            f"{name:<18} {base['p95_ms']:>10.2f} {now['p95_ms']:>10.2f} {delta:>+8.1%} "
+            f"{base['rps']:>10.1f} {now['rps']:>10.1f}{marker}"
+        )
+    return 1 if regressions else 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарки эндпоинтов shop_core")
+    parser.add_argument("--base-url", help="адрес запущенного сервера; по умолчанию ASGI в процессе")
+    parser.add_argument("--scenarios", nargs="*", choices=list(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд на сценарий")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--users", type=int, default=50, help="сколько bench_user_N авторизовать")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="куда сохранить результаты (JSON)")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("BASELINE", "CURRENT"))
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимый рост p95")
+    parser.add_argument("--export", choices=["products", "orders", "reviews"],
+                        help="проверить потоковую выгрузку вместо сценариев")
+    parser.add_argument("--export-format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--rss-budget-mb", type=float, default=256.0,
+                        help="допустимый рост пикового RSS при выгрузке")
+    parser.add_argument("--outbox", type=int, metavar="EVENTS",
+                        help="проверить пропускную способность outbox вместо сценариев")
+    parser.add_argument("--outbox-writers", type=int, default=8)
+    parser.add_argument("--outbox-per-transaction", type=int, default=10,
+                        help="событий в одной транзакции записи")
+    parser.add_argument("--outbox-target", type=float, default=10000.0,
+                        help="минимум событий в секунду на каждом этапе")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.compare:
+        sys.exit(compare(*args.compare, threshold=args.threshold))
+    if args.export:
+        sys.exit(asyncio.run(export_check(args.export, args.export_format, args.rss_budget_mb)))
+    if args.outbox:
+        sys.exit(asyncio.run(outbox_check(
+            args.outbox, args.outbox_writers, args.outbox_per_transaction, args.outbox_target
+        )))
+
+    report = asyncio.run(run(args))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
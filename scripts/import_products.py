@@ -0,0 +1,66 @@
+"""
+Массовый импорт товаров из CSV/JSONL напрямую в БД (без HTTP).
+
+    poetry run python scripts/import_products.py supplier.csv
+    poetry run python scripts/import_products.py supplier.jsonl --create-categories
+
+Формат определяется по расширению файла (.csv, .jsonl/.ndjson) или --format.
+Колонки и правила те же, что у POST /api/v1/catalog/products/import.
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))  # Добавляет shop_core в путь поиска
+
+import json
+import asyncio
+import argparse
+from typing import AsyncIterator
+
+from app.core.db import async_session_maker, engine
+from app.catalog.importer import IMPORT_FORMATS, ProductImporter
+from app.catalog.repository import ProductRepository, CategoryRepository
+
+READ_CHUNK_SIZE = 1 << 20
+
+
+async def read_chunks(path: Path) -> AsyncIterator[bytes]:
+    with path.open("rb") as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            yield chunk
+
+
+def detect_format(path: Path) -> str:
+    return "jsonl" if path.suffix.lower() in (".jsonl", ".ndjson", ".json") else "csv"
+
+
+async def run(args: argparse.Namespace) -> int:
+    fmt = args.format or detect_format(args.path)
+    try:
+        async with async_session_maker() as session:
+            importer = ProductImporter(
+                ProductRepository(session),
+                CategoryRepository(session),
+                batch_size=args.batch_size,
+            )
+            result = await importer.run(
+                read_chunks(args.path), fmt, create_categories=args.create_categories
+            )
+    finally:
+        await engine.dispose()
+
+    print(json.dumps(result.model_dump(), indent=2, ensure_ascii=False, default=str))
+    return 1 if result.failed else 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Импорт товаров из CSV/JSONL")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--create-categories", action="store_true",
+                        help="создавать категории, которых нет в БД")
+    parser.add_argument("--batch-size", type=int, help="строк в порции (по умолчанию из settings.toml)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
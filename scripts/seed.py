@@ -0,0 +1,266 @@
+"""
+Генерация большого набора данных для бенчмарков.
+
+Данные загружаются через COPY (asyncpg copy_records_to_table) порциями,
+поэтому миллионы строк вставляются за секунды-минуты, а не часы.
+
+    poetry run python scripts/seed.py --users 10000 --products 50000 --orders 200000
+
+Все пользователи получают логин bench_user_<n> и пароль "password"
+(bench_admin - администратор), их использует scripts/bench.py.
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))  # Добавляет shop_core в путь поиска
+
+import random
+import asyncio
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Iterable, Iterator
+
+import asyncpg
+
+from app.core.db import Base, engine, db_dsn
+from app.core.config import settings
+from app.core.security import hash_password
+from app.orders.partitions import ensure_partitions, month_start, add_months
+
+import app.users.models  # noqa: F401  регистрация моделей в metadata
+import app.cart.models  # noqa: F401
+import app.catalog.models  # noqa: F401
+import app.orders.models  # noqa: F401
+import app.promotions.models  # noqa: F401
+import app.reviews.models  # noqa: F401
+
+CHUNK_SIZE = 50_000
+BENCH_PASSWORD = "password"
+
+
+def chunks(records: Iterable[tuple], size: int = CHUNK_SIZE) -> Iterator[list[tuple]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def copy(conn: asyncpg.Connection, table: str, columns: list[str], records: Iterable[tuple]) -> int:
+    total = 0
+    for batch in chunks(records):
+        await conn.copy_records_to_table(table, records=batch, columns=columns)
+        total += len(batch)
+    return total
+
+
+class Seeder:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.now = datetime.utcnow()
+        self.user_ids: list[uuid.UUID] = []
+        self.category_ids: list[uuid.UUID] = []
+        self.products: list[tuple[uuid.UUID, str, Decimal]] = []
+
+    def _uuid(self) -> uuid.UUID:
+        return uuid.UUID(int=self.rnd.getrandbits(128), version=4)
+
+    def _past(self, days: int = 365) -> datetime:
+        return self.now - timedelta(seconds=self.rnd.randint(0, days * 86400))
+
+    def users(self) -> Iterator[tuple]:
+        password_hash = hash_password(BENCH_PASSWORD)
+        admin_id = self._uuid()
+        self.user_ids.append(admin_id)
+        yield (admin_id, "Bench", "Admin", "bench_admin", password_hash, "ADMIN", self.now, self.now)
+        for n in range(self.args.users):
+            user_id = self._uuid()
+            self.user_ids.append(user_id)
+            created = self._past()
+            yield (user_id, f"User{n}", "Bench", f"bench_user_{n}", password_hash, "USER", created, created)
+
+    def categories(self) -> Iterator[tuple]:
+        for n in range(self.args.categories):
+            category_id = self._uuid()
+            self.category_ids.append(category_id)
+            yield (category_id, f"Category {n}", self.now, self.now)
+
+    def products_rows(self) -> Iterator[tuple]:
+        for n in range(self.args.products):
+            product_id = self._uuid()
+            name = f"Product {n}"
+            price = Decimal(self.rnd.randint(100, 100_000)) / 100
+            self.products.append((product_id, name, price))
+            created = self._past()
+            yield (
+                product_id, name, f"BENCH-{n:08d}", f"Description of product {n}", price,
+                round(self.rnd.uniform(0, 5), 1), self.rnd.choice(self.category_ids),
+                created, created,
+            )
+
+    def reviews(self) -> Iterator[tuple]:
+        for _ in range(self.args.reviews):
+            created = self._past()
+            yield (
+                self._uuid(), self.rnd.choice(self.user_ids), self.rnd.choice(self.products)[0],
+                float(self.rnd.randint(1, 5)), "Bench review", created, created,
+            )
+
+    def promotions(self) -> tuple[list[tuple], list[tuple]]:
+        promotions, links = [], []
+        for n in range(self.args.promotions):
+            promotion_id = self._uuid()
+            starts_at = self._past()
+            ends_at = starts_at + timedelta(days=self.rnd.randint(1, 60))
+            promotions.append((
+                promotion_id, f"Promotion {n}", None, float(self.rnd.randint(5, 50)),
+                starts_at, ends_at, True, starts_at, starts_at,
+            ))
+            for product in self.rnd.sample(self.products, min(20, len(self.products))):
+                links.append((promotion_id, product[0]))
+        return promotions, links
+
+    def carts(self) -> tuple[list[tuple], list[tuple]]:
+        carts, items = [], []
+        for user_id in self.rnd.sample(self.user_ids, int(len(self.user_ids) * self.args.active_cart_ratio)):
+            cart_id = self._uuid()
+            created = self._past(30)
+            carts.append((cart_id, user_id, "ACTIVE", created, created))
+            for product_id, _, price in self.rnd.sample(self.products, self.rnd.randint(1, 5)):
+                items.append((self._uuid(), cart_id, product_id, self.rnd.randint(1, 3), price, created, created))
+        return carts, items
+
+    def order_batches(self) -> Iterator[tuple[list[tuple], list[tuple]]]:
+        """Заказы и их позиции порциями, чтобы не держать в памяти миллионы строк"""
+        statuses = ["PENDING", "PROCESSING", "SHIPPED", "DELIVERED", "CANCELLED"]
+        order_rows, item_rows = [], []
+        for n in range(self.args.orders):
+            order_id = self._uuid()
+            created = self._past()
+            total = 0.0
+            for product_id, name, price in self.rnd.sample(self.products, self.args.items_per_order):
+                quantity = self.rnd.randint(1, 3)
+                total += float(price) * quantity
+                item_rows.append((
+                    self._uuid(), order_id, created, product_id, quantity, float(price), name, created, created,
+                ))
+            order_rows.append((
+                order_id, self.rnd.choice(self.user_ids), self.rnd.choice(statuses), round(total, 2),
+                f"Bench street {n}", f"+7999{n:07d}", None, created, created, created,
+            ))
+            if len(order_rows) >= CHUNK_SIZE:
+                yield order_rows, item_rows
+                order_rows, item_rows = [], []
+        if order_rows:
+            yield order_rows, item_rows
+
+    async def create_partitions(self) -> None:
+        """Месячные партиции orders/order_items на весь период данных, иначе строки уйдут в DEFAULT"""
+        current = month_start(self.now.date())
+        async with engine.begin() as conn:
+            await ensure_partitions(
+                conn, add_months(current, -12), add_months(current, settings.orders.partition_premake_months)
+            )
+        await engine.dispose()
+
+    async def run(self) -> None:
+        await self.create_partitions()
+        dsn = db_dsn.replace("postgresql+asyncpg://", "postgresql://")
+        conn = await asyncpg.connect(dsn)
+        try:
+            started = time.perf_counter()
+            await self._load(conn)
+            print(f"Seeded in {time.perf_counter() - started:.1f}s")
+        finally:
+            await conn.close()
+
+    async def _load(self, conn: asyncpg.Connection) -> None:
+        def report(table: str, count: int) -> None:
+            print(f"{table:<20} {count:>10}")
+
+        report("users", await copy(conn, "users", [
+            "id", "first_name", "last_name", "login", "password_hash", "role", "created_at", "updated_at",
+        ], self.users()))
+        report("categories", await copy(conn, "categories", [
+            "id", "name", "created_at", "updated_at",
+        ], self.categories()))
+        report("products", await copy(conn, "products", [
+            "id", "name", "sku", "description", "price", "rating", "category_id", "created_at", "updated_at",
+        ], self.products_rows()))
+        report("reviews", await copy(conn, "reviews", [
+            "id", "user_id", "product_id", "rating", "comment", "created_at", "updated_at",
+        ], self.reviews()))
+
+        promotions, links = self.promotions()
+        report("promotions", await copy(conn, "promotions", [
+            "id", "title", "description", "discount_percent", "starts_at", "ends_at", "is_active",
+            "created_at", "updated_at",
+        ], promotions))
+        report("promotion_products", await copy(conn, "promotion_products", [
+            "promotion_id", "product_id",
+        ], links))
+
+        carts, cart_items = self.carts()
+        report("carts", await copy(conn, "carts", [
+            "id", "user_id", "status", "created_at", "updated_at",
+        ], carts))
+        report("cart_items", await copy(conn, "cart_items", [
+            "id", "cart_id", "product_id", "quantity", "price_at_add", "created_at", "updated_at",
+        ], cart_items))
+
+        orders_count = items_count = 0
+        for orders, order_items in self.order_batches():
+            orders_count += await copy(conn, "orders", [
+                "id", "user_id", "status", "total_amount", "shipping_address", "phone_number", "notes",
+                "ordered_at", "created_at", "updated_at",
+            ], orders)
+            items_count += await copy(conn, "order_items", [
+                "id", "order_id", "order_created_at", "product_id", "quantity", "price_at_time", "product_name",
+                "created_at", "updated_at",
+            ], order_items)
+        report("orders", orders_count)
+        report("order_items", items_count)
+
+        await conn.execute("ANALYZE")
+
+
+async def create_schema() -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Заполнение БД данными для бенчмарков")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=100)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--reviews", type=int, default=100_000)
+    parser.add_argument("--promotions", type=int, default=1_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    parser.add_argument("--active-cart-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--recreate-schema", action="store_true",
+        help="удалить и создать таблицы заново (Base.metadata), иначе схема должна быть пустой"
+    )
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    if args.recreate_schema:
+        await create_schema()
+    await Seeder(args).run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+import logging
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from app.core.db import slow_query_log
+
+ADMIN_PREFIX = "/api/v1/admin"
+AUTH_PREFIX = "/api/v1/auth"
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def register_and_login(aiohttp_client, login_suffix: str, role: str = "user"):
+    login = f"{login_suffix}_{uuid.uuid4().hex[:8]}"
+
+    resp = await aiohttp_client.post(f"{AUTH_PREFIX}/registrate", json={
+        "first_name": "Test",
+        "last_name": "User",
+        "login": login,
+        "password": "pwd1",
+        "role": role,
+    })
+    assert resp.status == 200, await resp.text()
+
+    resp = await aiohttp_client.post(f"{AUTH_PREFIX}/token", json={
+        "login": login,
+        "password": "pwd1",
+    })
+    assert resp.status == 200, await resp.text()
+    return await resp.json()
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_requires_admin_403(aiohttp_client):
+    tokens = await register_and_login(aiohttp_client, "slowq_user")
+
+    resp = await aiohttp_client.get(
+        f"{ADMIN_PREFIX}/slow-queries",
+        headers=bearer(tokens["access_token"])
+    )
+    assert resp.status == 403, await resp.text()
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_admin_ok_200(aiohttp_client):
+    tokens = await register_and_login(aiohttp_client, "slowq_admin", "admin")
+
+    resp = await aiohttp_client.get(
+        f"{ADMIN_PREFIX}/slow-queries",
+        params={"limit": 5},
+        headers=bearer(tokens["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+
+    data = await resp.json()
+    assert isinstance(data, list)
+    assert len(data) <= 5
+
+
+@pytest.mark.asyncio
+async def test_slow_query_recorded_normalized_and_redacted(
+        aiohttp_client, test_session, monkeypatch, caplog
+):
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 10)
+    monkeypatch.setattr(slow_query_log, "explain_sample_rate", 0.0)
+    slow_query_log.reset()
+
+    with caplog.at_level(logging.WARNING, logger="app.slow_query"):
+        for email in ("slowq-first@example.com", "slowq-second@example.com"):
+            await test_session.execute(
+                text(f"SELECT pg_sleep(0.05), '{email}' AS email, :login AS login"),
+                {"login": "slowq-secret-login"},
+            )
+
+    tokens = await register_and_login(aiohttp_client, "slowq_admin", "admin")
+    resp = await aiohttp_client.get(
+        f"{ADMIN_PREFIX}/slow-queries",
+        params={"order_by": "count"},
+        headers=bearer(tokens["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+
+    entries = [e for e in await resp.json() if "pg_sleep" in e["shape"]]
+    # два запроса с разными литералами - одна форма
+    assert len(entries) == 1
+    entry = entries[0]
+    assert entry["count"] == 2
+    assert entry["max_ms"] >= 50
+    assert "example.com" not in entry["shape"]
+    assert "pg_sleep(?.?), ? AS email" in entry["shape"]
+
+    logged = "\n".join(r.getMessage() for r in caplog.records if r.name == "app.slow_query")
+    assert "pg_sleep" in logged
+    assert "example.com" not in logged
+    assert "slowq-secret-login" not in logged
+
+
+@pytest.mark.asyncio
+async def test_slow_query_explain_does_not_execute_locking_statements(caplog):
+    with caplog.at_level(logging.WARNING, logger="app.slow_query"):
+        await slow_query_log._capture_explain("plain", "SELECT 1", ())
+        await slow_query_log._capture_explain(
+            "locking", "SELECT id FROM background_tasks LIMIT 1 FOR UPDATE SKIP LOCKED", ()
+        )
+
+    plans = {r.args[0]: r.args[1] for r in caplog.records
+             if r.name == "app.slow_query" and r.getMessage().startswith("plan for")}
+    assert "actual time" in plans["plain"]
+    # план без ANALYZE: запрос не выполнялся и строки не блокировал
+    assert "LockRows" in plans["locking"]
+    assert "actual time" not in plans["locking"]
+
+
+@pytest.mark.asyncio
+async def test_export_products_csv_admin_ok_200(aiohttp_client):
+    tokens = await register_and_login(aiohttp_client, "export_admin", "admin")
+    name = f"Export_Product_{uuid.uuid4().hex[:8]}"
+
+    resp = await aiohttp_client.post(
+        "/api/v1/catalog/products",
+        json={"name": name, "price": 10.0},
+        headers=bearer(tokens["access_token"])
+    )
+    assert resp.status == 201, await resp.text()
+
+    resp = await aiohttp_client.get(
+        f"{ADMIN_PREFIX}/exports/products",
+        params={"format": "csv"},
+        headers=bearer(tokens["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+    assert resp.headers["Content-Type"].startswith("text/csv")
+
+    lines = (await resp.text()).splitlines()
+    assert lines[0].startswith("id,sku,name")
+    assert any(name in line for line in lines[1:])
+
+
+@pytest.mark.asyncio
+async def test_export_orders_requires_admin_403(aiohttp_client):
+    tokens = await register_and_login(aiohttp_client, "export_user")
+
+    resp = await aiohttp_client.get(
+        f"{ADMIN_PREFIX}/exports/orders",
+        headers=bearer(tokens["access_token"])
+    )
+    assert resp.status == 403, await resp.text()
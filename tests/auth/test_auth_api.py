@@ -144,3 +144,19 @@ async def test_auth_refresh_ok(aiohttp_client):
 async def test_auth_refresh_invalid_token_401_or_403(aiohttp_client):
     resp = await aiohttp_client.post(f"{AUTH_PREFIX}/refresh", json={"refresh_token": "not_a_jwt"})
     assert resp.status in (401, 403), await resp.text()
+
+
+@pytest.mark.asyncio
+async def test_auth_login_failure_counted_in_metrics(aiohttp_client):
+    resp = await aiohttp_client.post(f"{AUTH_PREFIX}/token", json={
+        "login": "auth_metrics_unknown",
+        "password": "wrong",
+    })
+    assert resp.status == 401, await resp.text()
+
+    resp = await aiohttp_client.get("/metrics")
+    assert resp.status == 200, await resp.text()
+
+    text = await resp.text()
+    failures = [line for line in text.splitlines() if line.startswith("login_failures_total ")]
+    assert failures and float(failures[0].split()[1]) >= 1
@@ -4,6 +4,10 @@ import uuid
 CART_PREFIX = "/api/v1/cart"
 AUTH_PREFIX = "/api/v1/auth"
 CATALOG_PREFIX = "/api/v1/catalog"
+ORDERS_PREFIX = "/api/v1/orders/orders"
+PROMOTIONS_PREFIX = "/api/v1/promotions"
+
+SHIPPING = {"shipping_address": "ул. Тестовая, 1", "phone_number": "+79991234567"}
 
 
 def bearer(token: str) -> dict:
@@ -227,3 +231,476 @@ async def test_get_user_cart_admin_access_ok_200(aiohttp_client):
         data = await resp.json()
         if "user_id" in data:
             assert data["user_id"] == user_id
+
+
+@pytest.mark.asyncio
+async def test_checkout_idempotency_key_replays_response(aiohttp_client):
+    _, admin_tokens = await register_and_login(aiohttp_client, "cart_idem_admin", "admin")
+    _, tokens = await register_and_login(aiohttp_client, "cart_idem_user")
+    product = await create_test_product(aiohttp_client, admin_tokens["access_token"])
+
+    resp = await aiohttp_client.post(
+        f"{CART_PREFIX}/items",
+        json={"product_id": product["id"], "quantity": 1},
+        headers=bearer(tokens["access_token"])
+    )
+    assert resp.status == 201, await resp.text()
+
+    headers = {**bearer(tokens["access_token"]), "Idempotency-Key": uuid.uuid4().hex}
+    first = await aiohttp_client.post(f"{CART_PREFIX}/checkout", json=SHIPPING, headers=headers)
+    assert first.status == 201, await first.text()
+    assert "Idempotent-Replayed" not in first.headers
+
+    # корзина уже оформлена: без ключа повтор получил бы 404
+    retry = await aiohttp_client.post(f"{CART_PREFIX}/checkout", json=SHIPPING, headers=headers)
+    assert retry.status == 201, await retry.text()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert await retry.read() == await first.read()
+
+
+@pytest.mark.asyncio
+async def test_checkout_idempotency_key_replays_error_and_rejects_other_request(aiohttp_client):
+    _, tokens = await register_and_login(aiohttp_client, "cart_idem_empty")
+    key = uuid.uuid4().hex
+    headers = {**bearer(tokens["access_token"]), "Idempotency-Key": key}
+
+    await aiohttp_client.get(f"{CART_PREFIX}/", headers=bearer(tokens["access_token"]))
+    first = await aiohttp_client.post(f"{CART_PREFIX}/checkout", json=SHIPPING, headers=headers)
+    assert first.status == 400, await first.text()
+
+    retry = await aiohttp_client.post(f"{CART_PREFIX}/checkout", json=SHIPPING, headers=headers)
+    assert retry.status == 400
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert await retry.read() == await first.read()
+
+    # тот же ключ на другом эндпоинте - ошибка клиента
+    resp = await aiohttp_client.post(f"{ORDERS_PREFIX}/", json=SHIPPING, headers=headers)
+    assert resp.status == 422, await resp.text()
+
+
+async def fill_cart(aiohttp_client, token: str, admin_token: str, count: int) -> list:
+    products = []
+    for _ in range(count):
+        product = await create_test_product(aiohttp_client, admin_token)
+        resp = await aiohttp_client.post(
+            f"{CART_PREFIX}/items",
+            json={"product_id": product["id"], "quantity": 2},
+            headers=bearer(token)
+        )
+        assert resp.status == 201, await resp.text()
+        products.append(product)
+    return products
+
+
+@pytest.mark.asyncio
+async def test_order_from_cart_consumes_cart_and_applies_promotion(aiohttp_client):
+    _, admin_tokens = await register_and_login(aiohttp_client, "checkout_admin", "admin")
+    _, tokens = await register_and_login(aiohttp_client, "checkout_user")
+    admin_token = admin_tokens["access_token"]
+    promoted, regular = await fill_cart(aiohttp_client, tokens["access_token"], admin_token, 2)
+
+    resp = await aiohttp_client.post(
+        f"{PROMOTIONS_PREFIX}/admin",
+        json={"title": "Минус 10%", "discount_percent": 10,
+              "starts_at": "2000-01-01T00:00:00", "ends_at": "2100-01-01T00:00:00"},
+        headers=bearer(admin_token)
+    )
+    assert resp.status == 200, await resp.text()
+    promotion = await resp.json()
+    resp = await aiohttp_client.post(
+        f"{PROMOTIONS_PREFIX}/admin/{promotion['id']}/products",
+        json={"product_ids": [promoted["id"]]},
+        headers=bearer(admin_token)
+    )
+    assert resp.status == 200, await resp.text()
+
+    resp = await aiohttp_client.post(
+        f"{ORDERS_PREFIX}/", json=SHIPPING, headers=bearer(tokens["access_token"])
+    )
+    assert resp.status == 201, await resp.text()
+    order = await resp.json()
+    prices = {item["product_id"]: item["price_at_time"] for item in order["items"]}
+    assert prices == {promoted["id"]: 90.45, regular["id"]: 100.50}
+    assert order["total_amount"] == pytest.approx(2 * 90.45 + 2 * 100.50)
+    assert order["status"] == "pending"
+
+    # корзина оформлена: повторное оформление без ключа - 404, новая корзина пуста
+    resp = await aiohttp_client.post(
+        f"{ORDERS_PREFIX}/", json=SHIPPING, headers=bearer(tokens["access_token"])
+    )
+    assert resp.status == 404, await resp.text()
+    resp = await aiohttp_client.get(f"{CART_PREFIX}/", headers=bearer(tokens["access_token"]))
+    assert (await resp.json())["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_order_from_cart_query_count_does_not_grow_with_cart(aiohttp_client, assert_max_queries):
+    _, admin_tokens = await register_and_login(aiohttp_client, "checkout_budget_admin", "admin")
+    counts = []
+    for size in (1, 10):
+        _, tokens = await register_and_login(aiohttp_client, f"checkout_budget_{size}")
+        await fill_cart(aiohttp_client, tokens["access_token"], admin_tokens["access_token"], size)
+        resp = await aiohttp_client.post(
+            f"{ORDERS_PREFIX}/", json=SHIPPING, headers=bearer(tokens["access_token"])
+        )
+        assert resp.status == 201, await resp.text()
+        assert len((await resp.json())["items"]) == size
+        counts.append(assert_max_queries(resp, 12))
+
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.asyncio
+async def test_cart_sweep_removes_ordered_and_idle_carts(test_session):
+    from datetime import datetime, timedelta
+    from sqlalchemy import select
+    from app.cart.enum import CartEnum
+    from app.cart.models import Cart, CartItem
+    from app.cart.repository import CartRepository
+    from app.catalog.models import Product
+    from app.users.models import User
+
+    now = datetime.utcnow()
+    old, fresh = now - timedelta(days=60), now - timedelta(hours=1)
+    user = User(first_name="Sweep", last_name="User", login=f"sweep_{uuid.uuid4().hex[:8]}", password_hash="x")
+    product = Product(name="Забытый товар", price=10)
+
+    def make_cart(status, updated_at, item_updated_at=None):
+        cart = Cart(user=user, status=status, created_at=updated_at, updated_at=updated_at)
+        if item_updated_at:
+            cart.items = [CartItem(product=product, quantity=1, price_at_add=10,
+                                   created_at=item_updated_at, updated_at=item_updated_at)]
+        return cart
+
+    ordered_old = make_cart(CartEnum.ORDERED, old, old)
+    ordered_fresh = make_cart(CartEnum.ORDERED, fresh, fresh)
+    idle = make_cart(CartEnum.ACTIVE, old, old)
+    # сама корзина давно не менялась, но позицию только что изменили
+    touched = make_cart(CartEnum.ACTIVE, old, fresh)
+    test_session.add_all([user, product, ordered_old, ordered_fresh, idle, touched])
+    await test_session.commit()
+    ids = {cart.id for cart in (ordered_old, ordered_fresh, idle, touched)}
+
+    repo = CartRepository(test_session)
+    assert await repo.delete_ordered_carts(now - timedelta(hours=24), 1) == 1
+    assert await repo.delete_ordered_carts(now - timedelta(hours=24), 1) == 0
+    assert await repo.expire_idle_carts(now - timedelta(days=30), 10) == 1
+
+    test_session.expunge_all()
+    remaining = set((await test_session.execute(select(Cart.id).where(Cart.id.in_(ids)))).scalars())
+    assert remaining == {ordered_fresh.id, touched.id}
+    orphans = await test_session.execute(
+        select(CartItem.id).where(CartItem.cart_id.in_([ordered_old.id, idle.id]))
+    )
+    assert orphans.first() is None
+
+
+@pytest.mark.asyncio
+async def test_cart_view_returns_products_promotions_and_totals(aiohttp_client, assert_max_queries):
+    _, admin_tokens = await register_and_login(aiohttp_client, "cart_view_admin", "admin")
+    _, tokens = await register_and_login(aiohttp_client, "cart_view_user")
+    admin_token, token = admin_tokens["access_token"], tokens["access_token"]
+
+    resp = await aiohttp_client.get(f"{CART_PREFIX}/view", headers=bearer(token))
+    assert resp.status == 200, await resp.text()
+    assert await resp.json() == {"cart_id": None, "lines": [], "subtotal": "0", "discount": "0", "total": "0"}
+
+    promoted, regular = await fill_cart(aiohttp_client, token, admin_token, 2)
+    resp = await aiohttp_client.post(
+        f"{PROMOTIONS_PREFIX}/admin",
+        json={"title": "Минус 10%", "discount_percent": 10,
+              "starts_at": "2000-01-01T00:00:00", "ends_at": "2100-01-01T00:00:00"},
+        headers=bearer(admin_token)
+    )
+    assert resp.status == 200, await resp.text()
+    promotion = await resp.json()
+    resp = await aiohttp_client.post(
+        f"{PROMOTIONS_PREFIX}/admin/{promotion['id']}/products",
+        json={"product_ids": [promoted["id"]]},
+        headers=bearer(admin_token)
+    )
+    assert resp.status == 200, await resp.text()
+
+    resp = await aiohttp_client.get(f"{CART_PREFIX}/view", headers=bearer(token))
+    assert resp.status == 200, await resp.text()
+    view = await resp.json()
+    lines = {line["product_id"]: line for line in view["lines"]}
+    assert lines[promoted["id"]]["product_name"] == "Test Product"
+    assert lines[promoted["id"]]["quantity"] == 2
+    assert float(lines[promoted["id"]]["current_price"]) == 100.50
+    assert lines[promoted["id"]]["discount_percent"] == 10
+    assert float(lines[promoted["id"]]["effective_price"]) == 90.45
+    assert float(lines[promoted["id"]]["line_total"]) == 180.90
+    assert float(lines[regular["id"]]["line_total"]) == 201.00
+    assert float(view["subtotal"]) == 402.00
+    assert float(view["discount"]) == pytest.approx(20.10)
+    assert float(view["total"]) == pytest.approx(381.90)
+    # пользователь по токену + один запрос корзины
+    assert_max_queries(resp, 2)
+
+
+@pytest.mark.asyncio
+async def test_guest_cart_merges_into_user_cart_on_login(aiohttp_client, assert_max_queries):
+    _, admin_tokens = await register_and_login(aiohttp_client, "guest_cart_admin", "admin")
+    user_info, tokens = await register_and_login(aiohttp_client, "guest_cart_user")
+    shared, = await fill_cart(aiohttp_client, tokens["access_token"], admin_tokens["access_token"], 1)
+    guest_only = await create_test_product(aiohttp_client, admin_tokens["access_token"])
+
+    # гость собирает корзину без входа, база не меняется
+    token = None
+    for product_id, quantity in ((shared["id"], 1), (guest_only["id"], 3), (shared["id"], 2)):
+        headers = {"X-Guest-Cart": token} if token else {}
+        resp = await aiohttp_client.post(
+            f"{CART_PREFIX}/guest/items", json={"product_id": product_id, "quantity": quantity}, headers=headers
+        )
+        assert resp.status == 201, await resp.text()
+        token = (await resp.json())["token"]
+    resp = await aiohttp_client.get(f"{CART_PREFIX}/guest", headers={"X-Guest-Cart": token})
+    assert {item["product_id"]: item["quantity"] for item in (await resp.json())["items"]} == {
+        shared["id"]: 3, guest_only["id"]: 3,
+    }
+
+    resp = await aiohttp_client.get(f"{CART_PREFIX}/guest", headers={"X-Guest-Cart": token[:-4] + "AAAA"})
+    assert resp.status == 400, await resp.text()
+
+    resp = await aiohttp_client.post(
+        f"{AUTH_PREFIX}/token", json={"login": user_info["login"], "password": "pwd1"},
+        headers={"X-Guest-Cart": token}
+    )
+    assert resp.status == 200, await resp.text()
+    # пользователь, отметка токена, корзина, один INSERT ... ON CONFLICT и outbox
+    assert_max_queries(resp, 6)
+
+    resp = await aiohttp_client.get(f"{CART_PREFIX}/", headers=bearer(tokens["access_token"]))
+    assert {item["product_id"]: item["quantity"] for item in (await resp.json())["items"]} == {
+        shared["id"]: 2 + 3, guest_only["id"]: 3,
+    }
+
+    # повторный вход с тем же токеном количества не удваивает
+    resp = await aiohttp_client.post(
+        f"{AUTH_PREFIX}/token", json={"login": user_info["login"], "password": "pwd1"},
+        headers={"X-Guest-Cart": token}
+    )
+    assert resp.status == 200, await resp.text()
+    resp = await aiohttp_client.get(f"{CART_PREFIX}/", headers=bearer(tokens["access_token"]))
+    assert {item["product_id"]: item["quantity"] for item in (await resp.json())["items"]} == {
+        shared["id"]: 2 + 3, guest_only["id"]: 3,
+    }
+
+
+@pytest.mark.asyncio
+async def test_guest_cart_merge_creates_cart_in_the_same_transaction(test_session):
+    from sqlalchemy import select
+    from sqlalchemy.exc import DBAPIError
+    from app.cart.enum import CartEnum
+    from app.cart.models import Cart, CartItem, ConsumedGuestCart
+    from app.cart.repository import CartRepository
+    from app.catalog.models import Product
+    from app.users.models import User
+
+    user = User(first_name="Guest", last_name="Merge", login=f"merge_{uuid.uuid4().hex[:8]}", password_hash="x")
+    product = Product(name="Из гостевой корзины", price=10)
+    test_session.add_all([user, product])
+    await test_session.commit()
+    repo = CartRepository(test_session)
+    token_id = uuid.uuid4().hex
+
+    # вставка позиций падает: ни корзины, ни отметки токена не остаётся
+    with pytest.raises(DBAPIError):
+        await repo.merge_items(user.id, {product.id: 2 ** 31}, token_id)
+    await test_session.rollback()
+    assert await repo.get_active_cart_id(user.id) is None
+    assert await test_session.get(ConsumedGuestCart, token_id) is None
+
+    # тот же токен сливается в новую корзину
+    assert await repo.merge_items(user.id, {product.id: 2}, token_id) == 1
+    rows = await test_session.execute(
+        select(CartItem.product_id, CartItem.quantity)
+        .join(Cart, Cart.id == CartItem.cart_id)
+        .where(Cart.user_id == user.id, Cart.status == CartEnum.ACTIVE)
+    )
+    assert dict(rows.all()) == {product.id: 2}
+    assert await test_session.get(ConsumedGuestCart, token_id) is not None
+
+
+@pytest.mark.asyncio
+async def test_write_behind_store_defers_edits_and_recovers_from_journal(test_session, tmp_path):
+    from sqlalchemy import select
+    from app.cart.enum import CartEnum
+    from app.cart.models import Cart, CartItem
+    from app.cart.repository import CartRepository
+    from app.cart.store import WriteBehindCartStore
+    from app.catalog.models import Product
+    from app.users.models import User
+
+    user = User(first_name="Buffer", last_name="User", login=f"buffer_{uuid.uuid4().hex[:8]}", password_hash="x")
+    kept, dropped = Product(name="Остаётся", price=10), Product(name="Удаляется", price=20)
+    cart = Cart(user=user, status=CartEnum.ACTIVE,
+                items=[CartItem(product=dropped, quantity=1, price_at_add=20)])
+    test_session.add_all([user, kept, dropped, cart])
+    await test_session.commit()
+
+    async def stored():
+        rows = await test_session.execute(
+            select(CartItem.product_id, CartItem.quantity).where(CartItem.cart_id == cart.id)
+        )
+        return dict(rows.all())
+
+    repo = CartRepository(test_session)
+    store = WriteBehindCartStore(journal_dir=str(tmp_path))
+    item = await store.add_item(repo, user.id, cart.id, dropped.id, 2, 20)
+    assert item.quantity == 3
+    await store.add_item(repo, user.id, cart.id, kept.id, 1, 10)
+    assert (await store.set_quantity(repo, user.id, cart.id, kept.id, 4)).quantity == 4
+    assert await store.remove_item(repo, user.id, cart.id, dropped.id)
+    assert not await store.remove_item(repo, user.id, cart.id, dropped.id)
+    # правки только в памяти и журнале
+    assert await stored() == {dropped.id: 1}
+
+    # журнал живого процесса другие не трогают
+    other = WriteBehindCartStore(journal_dir=str(tmp_path))
+    assert other.recover() == 0
+    assert len(list(tmp_path.glob("journal-*.jsonl"))) == 1
+
+    # процесс "упал": ОС закрывает его файлы и снимает блокировку,
+    # новый экземпляр забирает журнал и пишет итог одной транзакцией
+    store._close_journal()
+    recovered = WriteBehindCartStore(journal_dir=str(tmp_path))
+    assert recovered.recover() == 1
+    assert await recovered.flush(repo) == 1
+    assert await stored() == {kept.id: 4}
+    assert list(tmp_path.glob("journal-*.jsonl")) == []
+    assert list(tmp_path.glob("journal-*.flushing")) == []
+
+
+@pytest.mark.asyncio
+async def test_write_behind_journal_keeps_only_unwritten_changes(test_session, tmp_path):
+    from sqlalchemy import select
+    from app.cart.enum import CartEnum
+    from app.cart.models import Cart, CartItem
+    from app.cart.repository import CartRepository
+    from app.cart.store import WriteBehindCartStore
+    from app.catalog.models import Product
+    from app.users.models import User
+
+    first, second = (
+        User(first_name="Journal", last_name="User", login=f"journal_{uuid.uuid4().hex[:8]}", password_hash="x")
+        for _ in range(2)
+    )
+    product = Product(name="Журнал", price=10)
+    first_cart, second_cart = Cart(user=first, status=CartEnum.ACTIVE), Cart(user=second, status=CartEnum.ACTIVE)
+    test_session.add_all([first, second, product, first_cart, second_cart])
+    await test_session.commit()
+
+    repo = CartRepository(test_session)
+    store = WriteBehindCartStore(journal_dir=str(tmp_path))
+    await store.add_item(repo, first.id, first_cart.id, product.id, 1, 10)
+    await store.add_item(repo, second.id, second_cart.id, product.id, 2, 10)
+
+    # после flush_user в журнале только корзина второго пользователя
+    assert await store.flush_user(repo, first.id)
+    [journal] = tmp_path.glob("journal-*.jsonl")
+    assert {line.split('"cart": "')[1][:36] for line in journal.read_text().splitlines()} == {str(second_cart.id)}
+
+    # записанное позже мимо журнала не перезаписывается при проигрывании
+    await test_session.execute(
+        CartItem.__table__.update().where(CartItem.cart_id == first_cart.id).values(quantity=5)
+    )
+    await test_session.commit()
+    assert await store.flush(repo) == 1
+    assert await store.flush(repo) == 0
+    assert list(tmp_path.glob("journal-*.jsonl")) == []
+
+    store._close_journal()
+    recovered = WriteBehindCartStore(journal_dir=str(tmp_path))
+    assert recovered.recover() == 0
+    rows = await test_session.execute(
+        select(CartItem.cart_id, CartItem.quantity).where(CartItem.product_id == product.id)
+    )
+    assert dict(rows.all()) == {first_cart.id: 5, second_cart.id: 2}
+
+
+@pytest.mark.asyncio
+async def test_reprice_updates_active_cart_lines_in_batches(test_session):
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+    from sqlalchemy import select, update
+    from app.cart.enum import CartEnum
+    from app.cart.models import Cart, CartItem
+    from app.cart.repository import CartRepository
+    from app.catalog.models import Product
+    from app.events.models import OutboxEvent
+    from app.promotions.models import Promotion, PromotionProduct
+    from app.users.models import User
+
+    now = datetime.utcnow()
+    user = User(first_name="Reprice", last_name="User", login=f"reprice_{uuid.uuid4().hex[:8]}", password_hash="x")
+    promoted, repriced, untouched = Product(name="По акции", price=100), Product(name="Подешевел", price=50), \
+        Product(name="Без изменений", price=30)
+    active = Cart(user=user, status=CartEnum.ACTIVE, updated_at=now - timedelta(days=3), items=[
+        CartItem(product=product, quantity=1, price_at_add=product.price, updated_at=now - timedelta(days=3))
+        for product in (promoted, repriced, untouched)
+    ])
+    ordered = Cart(user=user, status=CartEnum.ORDERED,
+                   items=[CartItem(product=repriced, quantity=1, price_at_add=50)])
+    promotion = Promotion(title="Минус 10%", discount_percent=10,
+                          starts_at=now - timedelta(days=1), ends_at=now + timedelta(days=1))
+    test_session.add_all([user, promoted, repriced, untouched, active, ordered, promotion])
+    await test_session.flush()
+    test_session.add(PromotionProduct(promotion_id=promotion.id, product_id=promoted.id))
+    await test_session.execute(update(Product).where(Product.id == repriced.id).values(price=40))
+    await test_session.commit()
+
+    repo = CartRepository(test_session)
+    assert await repo.reprice_items(now, 1) == 1
+    assert await repo.reprice_items(now, 1) == 1
+    assert await repo.reprice_items(now, 1) == 0
+
+    test_session.expunge_all()
+    rows = await test_session.execute(
+        select(CartItem.cart_id, CartItem.product_id, CartItem.price_at_add, CartItem.updated_at)
+        .where(CartItem.cart_id.in_([active.id, ordered.id]))
+    )
+    prices = {(cart_id, product_id): (price, updated_at) for cart_id, product_id, price, updated_at in rows}
+    assert prices[active.id, promoted.id][0] == Decimal("90.00")
+    assert prices[active.id, repriced.id][0] == Decimal("40.00")
+    assert prices[active.id, untouched.id][0] == Decimal("30.00")
+    # оформленная корзина не пересчитывается, время изменения позиций не сдвигается
+    assert prices[ordered.id, repriced.id][0] == Decimal("50.00")
+    assert all(updated_at < now for (cart_id, _), (_, updated_at) in prices.items() if cart_id == active.id)
+
+    events = await test_session.execute(
+        select(OutboxEvent.payload)
+        .where(OutboxEvent.aggregate_id == active.id, OutboxEvent.event_type == "cart.repriced")
+    )
+    assert {product_id for payload in events.scalars() for product_id in payload["prices"]} == {
+        str(promoted.id), str(repriced.id),
+    }
+
+
+@pytest.mark.asyncio
+async def test_guest_cart_merge_stores_discounted_price(test_session):
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+    from sqlalchemy import select
+    from app.cart.models import CartItem
+    from app.cart.repository import CartRepository
+    from app.catalog.models import Product
+    from app.promotions.models import Promotion, PromotionProduct
+    from app.users.models import User
+
+    now = datetime.utcnow()
+    user = User(first_name="Merge", last_name="Price", login=f"merge_price_{uuid.uuid4().hex[:8]}", password_hash="x")
+    product = Product(name="По акции", price=100)
+    promotion = Promotion(title="Минус 10%", discount_percent=10,
+                          starts_at=now - timedelta(days=1), ends_at=now + timedelta(days=1))
+    test_session.add_all([user, product, promotion])
+    await test_session.flush()
+    test_session.add(PromotionProduct(promotion_id=promotion.id, product_id=product.id))
+    await test_session.commit()
+
+    # слитая позиция получает ту же цену, что и добавленная через add_item
+    repo = CartRepository(test_session)
+    assert await repo.merge_items(user.id, {product.id: 1}, uuid.uuid4().hex) == 1
+    price = await test_session.scalar(select(CartItem.price_at_add).where(CartItem.product_id == product.id))
+    assert price == Decimal("90.00")
@@ -53,7 +53,7 @@ async def create_test_category(aiohttp_client, admin_token: str):
     """Создать тестовую категорию"""
     resp = await aiohttp_client.post(
         f"{CATALOG_PREFIX}/categories",
-        json={"name": f"Test Category {uuid4().hex[:8]}"},
+        json={"name": f"Test Category {uuid.uuid4().hex[:8]}"},
         headers=bearer(admin_token)
     )
     assert resp.status == 201
@@ -69,6 +69,15 @@ async def test_get_products_public_ok_200(aiohttp_client):
     assert isinstance(data, list)
 
 
+@pytest.mark.asyncio
+async def test_get_products_query_budget(aiohttp_client, assert_max_queries):
+    resp = await aiohttp_client.get(f"{CATALOG_PREFIX}/products")
+    assert resp.status == 200, await resp.text()
+
+    # товары + selectin категорий + selectin товаров категорий
+    assert_max_queries(resp, 3)
+
+
 @pytest.mark.asyncio
 async def test_get_product_by_id_ok_200(aiohttp_client):
     _, admin_tokens = await register_and_login(aiohttp_client, "catalog_get_id_admin", "admin")
@@ -288,4 +297,296 @@ async def test_update_category_admin_ok_200(aiohttp_client):
     assert resp.status == 200, await resp.text()
 
     data = await resp.json()
-    assert data["name"] == new_name
\ No newline at end of file
+    assert data["name"] == new_name
+
+@pytest.mark.asyncio
+async def test_get_categories_compressed_gzip(aiohttp_client):
+    _, admin_tokens = await register_and_login(aiohttp_client, "catalog_gzip_admin", "admin")
+
+    for _ in range(10):
+        resp = await aiohttp_client.post(
+            f"{CATALOG_PREFIX}/categories",
+            json={"name": f"Gzip_Category_{uuid.uuid4().hex}"},
+            headers=bearer(admin_tokens["access_token"])
+        )
+        assert resp.status == 201, await resp.text()
+
+    resp = await aiohttp_client.get(
+        f"{CATALOG_PREFIX}/categories",
+        headers={"Accept-Encoding": "gzip"}
+    )
+    assert resp.status == 200, await resp.text()
+    assert resp.headers.get("Content-Encoding") == "gzip"
+
+    data = await resp.json()
+    assert len(data) >= 10
+
+
+@pytest.mark.asyncio
+async def test_import_products_csv_upsert_by_sku(aiohttp_client, test_session):
+    from sqlalchemy import select
+    from app.cart.tasks import CART_REPRICE
+    from app.catalog.models import Product
+    from app.core.tasks import BackgroundTask
+
+    _, admin_tokens = await register_and_login(aiohttp_client, "catalog_import_admin", "admin")
+    category_name = f"Import_Category_{uuid.uuid4().hex[:8]}"
+    sku_prefix = uuid.uuid4().hex[:8]
+
+    csv_body = (
+        "sku,name,price,rating,category\n"
+        f"{sku_prefix}-1,Imported 1,10.50,4,{category_name}\n"
+        f"{sku_prefix}-2,Imported 2,not-a-price,,{category_name}\n"
+        f"{sku_prefix}-3,\"Imported, with comma\",3,,{category_name}\n"
+    )
+    resp = await aiohttp_client.post(
+        f"{CATALOG_PREFIX}/products/import",
+        params={"format": "csv", "create_categories": "true"},
+        data=csv_body.encode(),
+        headers=bearer(admin_tokens["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+    result = await resp.json()
+    assert result["processed"] == 3
+    assert result["inserted"] == 2
+    assert result["failed"] == 1
+    assert result["categories_created"] == 1
+    assert result["errors"][0]["line"] == 3
+    assert result["errors"][0]["sku"] == f"{sku_prefix}-2"
+
+    # повторный импорт обновляет товар по sku, а не создаёт новый
+    resp = await aiohttp_client.post(
+        f"{CATALOG_PREFIX}/products/import",
+        params={"format": "jsonl"},
+        data=f'{{"sku": "{sku_prefix}-1", "name": "Imported 1", "price": 12, "category": "{category_name}"}}\n'.encode(),
+        headers=bearer(admin_tokens["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+    result = await resp.json()
+    assert result["inserted"] == 0
+    assert result["updated"] == 1
+    assert result["failed"] == 0
+
+    # пересчёт корзин ставится только для товаров с изменившейся ценой
+    resp = await aiohttp_client.post(
+        f"{CATALOG_PREFIX}/products/import",
+        params={"format": "csv"},
+        data=(
+            "sku,name,price,category\n"
+            f"{sku_prefix}-1,Imported 1,12,{category_name}\n"
+            f"{sku_prefix}-3,Renamed 3,3,{category_name}\n"
+        ).encode(),
+        headers=bearer(admin_tokens["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+    assert (await resp.json())["updated"] == 1
+
+    repriced = await test_session.execute(
+        select(Product.id).where(Product.sku == f"{sku_prefix}-1")
+    )
+    tasks = await test_session.execute(
+        select(BackgroundTask.payload).where(BackgroundTask.name == CART_REPRICE)
+    )
+    assert [payload["product_ids"] for payload in tasks.scalars()] == [[str(repriced.scalar_one())]]
+
+
+@pytest.mark.asyncio
+async def test_import_products_unknown_category_id_rejects_only_its_row(aiohttp_client):
+    _, admin_tokens = await register_and_login(aiohttp_client, "catalog_import_fk_admin", "admin")
+    sku_prefix = uuid.uuid4().hex[:8]
+    missing_category_id = uuid.uuid4()
+
+    csv_body = (
+        "sku,name,price,category_id\n"
+        f"{sku_prefix}-1,Imported 1,10,\n"
+        f"{sku_prefix}-2,Imported 2,20,{missing_category_id}\n"
+        f"{sku_prefix}-3,Imported 3,30,\n"
+    )
+    resp = await aiohttp_client.post(
+        f"{CATALOG_PREFIX}/products/import",
+        params={"format": "csv"},
+        data=csv_body.encode(),
+        headers=bearer(admin_tokens["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+    result = await resp.json()
+    assert result["inserted"] == 2
+    assert result["failed"] == 1
+    assert result["errors"] == [{
+        "line": 3,
+        "sku": f"{sku_prefix}-2",
+        "error": f"Category not found: {missing_category_id}",
+    }]
+
+
+@pytest.mark.asyncio
+async def test_import_products_requires_admin_403(aiohttp_client):
+    _, user_tokens = await register_and_login(aiohttp_client, "catalog_import_user")
+
+    resp = await aiohttp_client.post(
+        f"{CATALOG_PREFIX}/products/import",
+        data=b"sku,name,price\nX,Y,1\n",
+        headers=bearer(user_tokens["access_token"])
+    )
+    assert resp.status == 403, await resp.text()
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_products_patches_and_filter(aiohttp_client):
+    _, admin_tokens = await register_and_login(aiohttp_client, "catalog_bulk_admin", "admin")
+    headers = bearer(admin_tokens["access_token"])
+    category = await create_test_category(aiohttp_client, admin_tokens["access_token"])
+
+    product_ids = []
+    for price in (10, 20):
+        resp = await aiohttp_client.post(
+            f"{CATALOG_PREFIX}/products",
+            json={"name": f"Bulk {price}", "price": price, "category_id": category["id"]},
+            headers=headers
+        )
+        assert resp.status == 201, await resp.text()
+        product_ids.append((await resp.json())["id"])
+
+    missing_id = str(uuid.uuid4())
+    resp = await aiohttp_client.patch(
+        f"{CATALOG_PREFIX}/products/bulk",
+        json={"patches": [
+            {"id": product_ids[0], "price": 11},
+            {"id": product_ids[1], "price": 21, "name": "Bulk renamed"},
+            {"id": missing_id, "price": 1},
+        ]},
+        headers=headers
+    )
+    assert resp.status == 200, await resp.text()
+    result = await resp.json()
+    assert result["updated"] == 2
+    assert result["not_found"] == [missing_id]
+
+    resp = await aiohttp_client.patch(
+        f"{CATALOG_PREFIX}/products/bulk",
+        json={"filter": {"category_id": category["id"]}, "price_multiplier": 1.1},
+        headers=headers
+    )
+    assert resp.status == 200, await resp.text()
+    assert (await resp.json())["updated"] == 2
+
+    resp = await aiohttp_client.get(f"{CATALOG_PREFIX}/products/{product_ids[1]}")
+    data = await resp.json()
+    assert data["name"] == "Bulk renamed"
+    assert float(data["price"]) == pytest.approx(23.1)
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_products_requires_filter_or_patches_400(aiohttp_client):
+    _, admin_tokens = await register_and_login(aiohttp_client, "catalog_bulk_bad_admin", "admin")
+
+    resp = await aiohttp_client.patch(
+        f"{CATALOG_PREFIX}/products/bulk",
+        json={"price_multiplier": 2},
+        headers=bearer(admin_tokens["access_token"])
+    )
+    assert resp.status == 400, await resp.text()
+
+
+@pytest.mark.asyncio
+async def test_price_history_records_changes_and_price_at(aiohttp_client):
+    _, admin_tokens = await register_and_login(aiohttp_client, "catalog_history_admin", "admin")
+    headers = bearer(admin_tokens["access_token"])
+
+    resp = await aiohttp_client.post(
+        f"{CATALOG_PREFIX}/products",
+        json={"name": "History product", "price": 100},
+        headers=headers
+    )
+    assert resp.status == 201, await resp.text()
+    product = await resp.json()
+
+    resp = await aiohttp_client.put(
+        f"{CATALOG_PREFIX}/products/{product['id']}",
+        json={"price": 120},
+        headers=headers
+    )
+    assert resp.status == 200, await resp.text()
+
+    # изменение без смены цены не пишет историю
+    resp = await aiohttp_client.put(
+        f"{CATALOG_PREFIX}/products/{product['id']}",
+        json={"name": "History product renamed"},
+        headers=headers
+    )
+    assert resp.status == 200, await resp.text()
+
+    resp = await aiohttp_client.get(
+        f"{CATALOG_PREFIX}/products/{product['id']}/price-history",
+        headers=headers
+    )
+    assert resp.status == 200, await resp.text()
+    history = await resp.json()
+    assert [float(h["price"]) for h in history] == [120.0, 100.0]
+
+    resp = await aiohttp_client.get(
+        f"{CATALOG_PREFIX}/prices",
+        params={"product_ids": product["id"], "at": history[1]["valid_from"]},
+        headers=headers
+    )
+    assert resp.status == 200, await resp.text()
+    prices = await resp.json()
+    assert float(prices[0]["price"]) == 100.0
+
+    # "сейчас" по часам базы: только что записанная цена уже действует
+    resp = await aiohttp_client.get(
+        f"{CATALOG_PREFIX}/products/{product['id']}/price-at",
+        headers=headers
+    )
+    assert resp.status == 200, await resp.text()
+    price_now = await resp.json()
+    assert float(price_now["price"]) == 120.0
+    assert price_now["at"] >= history[0]["valid_from"]
+
+
+@pytest.mark.asyncio
+async def test_metrics_use_route_template_for_path_params(aiohttp_client):
+    product_id = uuid.uuid4()
+    resp = await aiohttp_client.get(f"{CATALOG_PREFIX}/products/{product_id}")
+    assert resp.status == 404, await resp.text()
+
+    resp = await aiohttp_client.get("/metrics")
+    text = await resp.text()
+    assert f'route="{CATALOG_PREFIX}/products/{{product_id}}"' in text
+    assert str(product_id) not in text
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_products_oversized_price_422(aiohttp_client):
+    _, admin_tokens = await register_and_login(aiohttp_client, "catalog_bulk_range_admin", "admin")
+    headers = bearer(admin_tokens["access_token"])
+    category = await create_test_category(aiohttp_client, admin_tokens["access_token"])
+
+    resp = await aiohttp_client.patch(
+        f"{CATALOG_PREFIX}/products/bulk",
+        json={"patches": [{"id": str(uuid.uuid4()), "price": "123456789012.00"}]},
+        headers=headers
+    )
+    assert resp.status == 422, await resp.text()
+
+    resp = await aiohttp_client.patch(
+        f"{CATALOG_PREFIX}/products/bulk",
+        json={"filter": {"category_id": category["id"]}, "price_delta": "1e20"},
+        headers=headers
+    )
+    assert resp.status == 422, await resp.text()
+
+    resp = await aiohttp_client.post(
+        f"{CATALOG_PREFIX}/products",
+        json={"name": "Range", "price": 99999999, "category_id": category["id"]},
+        headers=headers
+    )
+    assert resp.status == 201, await resp.text()
+
+    # оба значения в пределах схемы, но цена после умножения не влезает в колонку
+    resp = await aiohttp_client.patch(
+        f"{CATALOG_PREFIX}/products/bulk",
+        json={"filter": {"category_id": category["id"]}, "price_multiplier": 10},
+        headers=headers
+    )
+    assert resp.status == 422, await resp.text()
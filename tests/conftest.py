@@ -1,48 +1,206 @@
+import os
+import re
+from typing import Any
+
+import asyncpg
+import httpx
+import pytest
 import pytest_asyncio
-import aiohttp
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import Base
 from app.core.config import settings
 
+# Тесты всегда идут против тестовой БД. При запуске через pytest-xdist
+# каждый воркер получает свою базу (shop_core_test_gw0, _gw1, ...), чтобы
+# воркеры не делили схему. Настройки меняются до импорта app.core.db,
+# поэтому движок приложения сразу смотрит в нужную базу.
+_XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER")
+_BASE_TEST_DB = settings.db_test.db_name
 
-@pytest_asyncio.fixture(scope="function")
-async def aiohttp_client():
-    session = aiohttp.ClientSession(base_url="http://localhost:8000")
-    try:
-        yield session
-    finally:
-        await session.close()
+settings.app.mode = "test"
+# Фоновые циклы (relay, очередь задач, sweeper, партиции, планировщик акций...)
+# в тестах не запускаются: lifespan приложения не выполняется (см. test_engine),
+# а флаги ниже выключают их на случай запуска вручную. Циклы работают со своими
+# сессиями и коммитили бы мимо откатываемой транзакции теста. Тесты вызывают
+# нужный шаг сами: outbox_relay.publish_batch, archive_orders, ensure_partitions...
+settings.events.relay_enabled = False
+settings.events.listener_enabled = False
+settings.tasks.enabled = False
+settings.orders.archive_after_days = 0
+if _XDIST_WORKER:
+    settings.db_test.db_name = f"{_BASE_TEST_DB}_{_XDIST_WORKER}"
 
+from app.main import app  # noqa: E402
+from app.core.cache import response_cache  # noqa: E402
+from app.core.db import Base, engine, get_session  # noqa: E402
 
-@pytest_asyncio.fixture(scope="function")
-async def test_engine():
-    engine = create_async_engine(settings.db_test.dsl)
+
+class ASGIResponse:
+    """Ответ httpx с интерфейсом aiohttp (resp.status, await resp.json())"""
+
+    def __init__(self, response: httpx.Response):
+        self._response = response
+        self.status = response.status_code
+        self.headers = response.headers
+
+    async def json(self) -> Any:
+        return self._response.json()
+
+    async def text(self) -> str:
+        return self._response.text
+
+    async def read(self) -> bytes:
+        return self._response.content
+
+
+class ASGIClient:
+    """
+    Клиент, вызывающий приложение в том же процессе через httpx.ASGITransport.
+    Повторяет используемую тестами часть API aiohttp.ClientSession,
+    поэтому сами тесты не зависят от транспорта.
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self._client = client
+
+    async def request(self, method: str, url: str, **kwargs) -> ASGIResponse:
+        if "data" in kwargs and isinstance(kwargs["data"], (bytes, str)):
+            kwargs["content"] = kwargs.pop("data")
+        return ASGIResponse(await self._client.request(method, url, **kwargs))
+
+    async def get(self, url: str, **kwargs) -> ASGIResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> ASGIResponse:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> ASGIResponse:
+        return await self.request("PUT", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> ASGIResponse:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> ASGIResponse:
+        return await self.request("DELETE", url, **kwargs)
+
+
+async def _ensure_database(db_name: str) -> None:
+    """Создать базу воркера, если её ещё нет (подключаемся к основной тестовой БД)"""
+    config = settings.db_test
+    conn = await asyncpg.connect(
+        user=config.db_user,
+        password=config.db_password,
+        host=config.db_host,
+        port=config.db_port,
+        database=_BASE_TEST_DB,
+    )
     try:
-        yield engine
+        exists = await conn.fetchval("SELECT 1 FROM pg_database WHERE datname = $1", db_name)
+        if not exists:
+            await conn.execute(f'CREATE DATABASE "{db_name}"')
     finally:
-        await engine.dispose()
+        await conn.close()
 
 
-@pytest_asyncio.fixture(scope="function", autouse=True)
-async def reset_schema_before_each_test(test_engine):
+@pytest_asyncio.fixture(scope="session")
+async def test_engine():
     """
-    Полная очистка схемы между тестами.
-    Это нужно, потому что тесты повторно регистрируют пользователя с тем же логином.
+    Схема создаётся один раз на сессию, а не перед каждым тестом.
+    Изоляция тестов - через откат транзакции (см. db_connection).
+    lifespan приложения не запускается: строки без месячной партиции
+    попадают в DEFAULT-партицию, фоновые циклы тестам не нужны.
     """
-    async with test_engine.begin() as conn:
+    if _XDIST_WORKER:
+        await _ensure_database(settings.db_test.db_name)
+
+    async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
 
-    yield
+    yield engine
 
+    await engine.dispose()
 
-@pytest_asyncio.fixture(scope="function")
-async def test_session(test_engine):
-    async_session_factory = sessionmaker(
-        test_engine, expire_on_commit=False, class_=AsyncSession
+
+@pytest_asyncio.fixture
+async def db_connection(test_engine):
+    """Соединение с открытой транзакцией, которая откатывается после теста"""
+    async with test_engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            yield conn
+        finally:
+            await transaction.rollback()
+
+
+def _make_session(conn) -> AsyncSession:
+    # commit() в репозиториях фиксирует только SAVEPOINT,
+    # внешняя транзакция теста остаётся открытой
+    return AsyncSession(
+        bind=conn,
+        expire_on_commit=False,
+        join_transaction_mode="create_savepoint",
     )
-    async with async_session_factory() as session:
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def override_get_session(db_connection):
+    async def _get_session():
+        async with _make_session(db_connection) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = _get_session
+    response_cache.invalidate("")
+    try:
+        yield
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+        response_cache.invalidate("")
+
+
+@pytest_asyncio.fixture
+async def test_session(db_connection):
+    async with _make_session(db_connection) as session:
         yield session
+
+
+@pytest.fixture
+def session_factory(db_connection):
+    """
+    Фабрика сессий на соединении теста - для кода, который открывает сессии
+    сам (очередь задач, планировщик): его записи тоже откатываются после теста.
+    """
+    return lambda: _make_session(db_connection)
+
+
+@pytest_asyncio.fixture
+async def aiohttp_client():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield ASGIClient(client)
+
+
+_SERVER_TIMING_DB_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+@pytest.fixture
+def assert_max_queries():
+    """
+    Проверка количества SQL-запросов, выполненных эндпоинтом.
+    Число берётся из заголовка Server-Timing, который выставляет QueryProfilingMiddleware.
+
+        assert_max_queries(resp, 2)
+    """
+    def check(resp, max_queries: int) -> int:
+        header = resp.headers.get("Server-Timing", "")
+        match = _SERVER_TIMING_DB_RE.search(header)
+        assert match, f"No db timing in Server-Timing header: {header!r}"
+
+        count = int(match.group(2))
+        assert count <= max_queries, (
+            f"Expected at most {max_queries} queries, got {count}"
+        )
+        return count
+
+    return check
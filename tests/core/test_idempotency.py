@@ -0,0 +1,60 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import idempotency
+from app.core.idempotency import IdempotentRequest
+from app.users.models import User
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_released_after_timeout_and_replay(test_session, monkeypatch):
+    """Тест: повтор, дождавшийся ответа или 409, не оставляет событие в _waiters"""
+    monkeypatch.setattr(idempotency.settings.idempotency, "wait_timeout_seconds", 0.3)
+    monkeypatch.setattr(idempotency.settings.idempotency, "poll_interval_seconds", 0.05)
+    user = User(first_name="Idem", last_name="User", login=f"idem_{uuid.uuid4().hex[:8]}", password_hash="x")
+    test_session.add(user)
+    await test_session.commit()
+    key = uuid.uuid4().hex
+
+    def guard() -> IdempotentRequest:
+        return IdempotentRequest(test_session, user.id, key, "hash")
+
+    original = guard()
+    await original.acquire()
+    assert original.owner
+
+    # исходный запрос "в другом процессе": _wake_waiters здесь не вызовется
+    with pytest.raises(HTTPException) as exc:
+        await guard().acquire()
+    assert exc.value.status_code == 409
+    assert (user.id, key) not in idempotency._waiters
+
+    # ответ сохранён: следующий повтор получает его без ожидания
+    retry = guard()
+    await original.respond({"ok": True})
+    await retry.acquire()
+    assert retry.replay is not None
+    assert (user.id, key) not in idempotency._waiters
+
+
+def test_shared_waiter_is_removed_by_the_last_retry():
+    """Тест: событие ключа живёт, пока его ждёт хотя бы один повтор"""
+    user_id, key = uuid.uuid4(), uuid.uuid4().hex
+    first = idempotency._join_waiter(user_id, key, None)
+    second = idempotency._join_waiter(user_id, key, None)
+    assert first is second and first.count == 2
+    idempotency._leave_waiter(user_id, key, first)
+    assert idempotency._waiters[(user_id, key)] is first
+    idempotency._leave_waiter(user_id, key, second)
+    assert (user_id, key) not in idempotency._waiters
+
+    # разбуженное событие уже убрано: повтор переходит на новое
+    woken = idempotency._join_waiter(user_id, key, None)
+    idempotency._wake_waiters(user_id, key)
+    assert woken.event.is_set()
+    current = idempotency._join_waiter(user_id, key, woken)
+    assert current is not woken and woken.count == 0
+    idempotency._leave_waiter(user_id, key, current)
+    assert (user_id, key) not in idempotency._waiters
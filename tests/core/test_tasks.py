@@ -0,0 +1,154 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from app.core.tasks import BackgroundTask, TaskQueue, TaskStatus
+
+
+@pytest.fixture
+def queue(session_factory):
+    queue = TaskQueue(session_factory)
+    calls = queue.calls = []
+
+    @queue.task("test.record")
+    async def record(payload: dict) -> None:
+        calls.append(payload["n"])
+
+    @queue.task("test.fail")
+    async def fail(payload: dict) -> None:
+        raise RuntimeError("boom")
+
+    return queue
+
+
+async def get_tasks(session, name: str) -> list[BackgroundTask]:
+    result = await session.execute(
+        select(BackgroundTask)
+        .where(BackgroundTask.name == name)
+        .order_by(BackgroundTask.run_after)
+        .execution_options(populate_existing=True)
+    )
+    return list(result.scalars().all())
+
+
+async def make_due(session, task_id) -> None:
+    await session.execute(
+        update(BackgroundTask)
+        .where(BackgroundTask.id == task_id)
+        .values(run_after=datetime.utcnow() - timedelta(seconds=1))
+    )
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_enqueue_is_part_of_caller_transaction(queue, test_session):
+    """Тест: задача появляется только вместе с commit вызывающего"""
+    queue.enqueue(test_session, "test.record", {"n": 1})
+    await test_session.rollback()
+    assert await get_tasks(test_session, "test.record") == []
+
+    queue.enqueue(test_session, "test.record", {"n": 2})
+    await test_session.commit()
+    assert len(await get_tasks(test_session, "test.record")) == 1
+
+    with pytest.raises(ValueError):
+        queue.enqueue(test_session, "test.unknown")
+
+
+@pytest.mark.asyncio
+async def test_claim_takes_only_due_tasks_and_success_deletes(queue, test_session):
+    """Тест: забираются только готовые задачи, выполненная удаляется"""
+    queue.enqueue(test_session, "test.record", {"n": 1})
+    queue.enqueue(test_session, "test.record", {"n": 2}, delay_seconds=3600)
+    await test_session.commit()
+
+    claimed = await queue._claim(10)
+    assert [(task.payload, task.attempts) for task in claimed] == [({"n": 1}, 1)]
+
+    running, delayed = await get_tasks(test_session, "test.record")
+    assert running.status == TaskStatus.RUNNING
+    assert running.locked_until > datetime.utcnow()
+    assert delayed.status == TaskStatus.PENDING
+
+    await queue._run(*claimed[0])
+    assert queue.calls == [1]
+    assert [task.id for task in await get_tasks(test_session, "test.record")] == [delayed.id]
+
+
+@pytest.mark.asyncio
+async def test_failed_task_retries_with_backoff_then_fails(queue, test_session):
+    """Тест: ошибка - повтор с задержкой, после max_attempts - статус failed"""
+    queue.enqueue(test_session, "test.fail", max_attempts=2)
+    await test_session.commit()
+
+    assert await queue.run_once() == 1
+    [task] = await get_tasks(test_session, "test.fail")
+    assert task.status == TaskStatus.PENDING
+    assert task.attempts == 1
+    assert task.locked_until is None
+    assert task.run_after > datetime.utcnow()
+    assert "boom" in task.last_error
+
+    # до run_after задача не берётся
+    assert await queue.run_once() == 0
+
+    await make_due(test_session, task.id)
+    assert await queue.run_once() == 1
+    [task] = await get_tasks(test_session, "test.fail")
+    assert task.status == TaskStatus.FAILED
+    assert task.attempts == 2
+
+    # исчерпавшая попытки задача остаётся в таблице, но больше не выполняется
+    await make_due(test_session, task.id)
+    assert await queue.run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed_and_stale_worker_is_fenced(queue, test_session):
+    """Тест: задачу с истёкшей арендой забирает другой воркер, прежний её больше не трогает"""
+    queue.enqueue(test_session, "test.record", {"n": 1})
+    await test_session.commit()
+
+    [first] = await queue._claim(1)
+    assert await queue.extend_lease(first.id, first.attempts)
+    assert await queue._claim(1) == []
+
+    await test_session.execute(
+        update(BackgroundTask)
+        .where(BackgroundTask.id == first.id)
+        .values(locked_until=datetime.utcnow() - timedelta(seconds=1))
+    )
+    await test_session.commit()
+
+    [second] = await queue._claim(1)
+    assert second.id == first.id
+    assert second.attempts == 2
+
+    assert not await queue.extend_lease(first.id, first.attempts)
+    await queue._finish(first.id, first.attempts, None)
+    [task] = await get_tasks(test_session, "test.record")
+    assert task.status == TaskStatus.RUNNING
+    assert task.attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_lease_is_extended_while_task_runs(queue, test_session, monkeypatch):
+    """Тест: пока задача выполняется, locked_until сдвигается вперёд"""
+    monkeypatch.setattr(queue.config, "lease_seconds", 0.3)
+    queue.enqueue(test_session, "test.record", {"n": 1})
+    await test_session.commit()
+
+    [claimed] = await queue._claim(1)
+    [task] = await get_tasks(test_session, "test.record")
+    first_lock = task.locked_until
+
+    # продление каждую треть аренды: к 0.25 с - два раза
+    keeper = asyncio.create_task(queue._keep_lease(claimed.id, claimed.attempts))
+    await asyncio.sleep(0.25)
+    keeper.cancel()
+    await asyncio.gather(keeper, return_exceptions=True)
+
+    [task] = await get_tasks(test_session, "test.record")
+    assert task.locked_until > first_lock
@@ -0,0 +1,209 @@
+import pytest
+import uuid
+
+from app.events.relay import outbox_relay
+
+EVENTS_PREFIX = "/api/v1/events"
+CART_PREFIX = "/api/v1/cart"
+AUTH_PREFIX = "/api/v1/auth"
+CATALOG_PREFIX = "/api/v1/catalog"
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def register_and_login(aiohttp_client, login_suffix: str, role: str = "user"):
+    login = f"{login_suffix}_{uuid.uuid4().hex[:8]}"
+
+    resp = await aiohttp_client.post(f"{AUTH_PREFIX}/registrate", json={
+        "first_name": "Test",
+        "last_name": "User",
+        "login": login,
+        "password": "pwd1",
+        "role": role,
+    })
+    assert resp.status == 200, await resp.text()
+
+    resp = await aiohttp_client.post(f"{AUTH_PREFIX}/token", json={
+        "login": login,
+        "password": "pwd1",
+    })
+    assert resp.status == 200, await resp.text()
+    return await resp.json()
+
+
+async def add_product_to_cart(aiohttp_client, admin_token: str, user_token: str) -> dict:
+    resp = await aiohttp_client.post(
+        f"{CATALOG_PREFIX}/products",
+        json={"name": "Event Product", "price": 10.0},
+        headers=bearer(admin_token)
+    )
+    assert resp.status == 201, await resp.text()
+    product = await resp.json()
+
+    resp = await aiohttp_client.post(
+        f"{CART_PREFIX}/items",
+        json={"product_id": product["id"], "quantity": 2},
+        headers=bearer(user_token)
+    )
+    assert resp.status == 201, await resp.text()
+    return product
+
+
+@pytest.mark.asyncio
+async def test_events_requires_admin_403(aiohttp_client):
+    tokens = await register_and_login(aiohttp_client, "events_user")
+
+    resp = await aiohttp_client.get(f"{EVENTS_PREFIX}/", headers=bearer(tokens["access_token"]))
+    assert resp.status == 403, await resp.text()
+
+
+@pytest.mark.asyncio
+async def test_cart_events_visible_only_after_publish(aiohttp_client, test_session):
+    admin = await register_and_login(aiohttp_client, "events_admin", "admin")
+    user = await register_and_login(aiohttp_client, "events_cart_user")
+    product = await add_product_to_cart(aiohttp_client, admin["access_token"], user["access_token"])
+
+    resp = await aiohttp_client.get(
+        f"{EVENTS_PREFIX}/", params={"aggregate_type": "cart"},
+        headers=bearer(admin["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+    assert await resp.json() == []
+
+    assert await outbox_relay.publish_batch(test_session) >= 2
+
+    resp = await aiohttp_client.get(
+        f"{EVENTS_PREFIX}/", params={"aggregate_type": "cart", "wait": 1},
+        headers=bearer(admin["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+    events = await resp.json()
+    assert [e["event_type"] for e in events] == ["cart.created", "cart.item_added"]
+    assert events[1]["payload"]["product_id"] == product["id"]
+    assert events[1]["payload"]["quantity"] == 2
+    assert events[0]["published_seq"] < events[1]["published_seq"]
+
+    resp = await aiohttp_client.get(
+        f"{EVENTS_PREFIX}/", params={"after": events[-1]["published_seq"]},
+        headers=bearer(admin["access_token"])
+    )
+    assert resp.status == 200
+    assert await resp.json() == []
+
+
+@pytest.mark.asyncio
+async def test_consumer_ack_moves_offset_forward_only(aiohttp_client, test_session):
+    admin = await register_and_login(aiohttp_client, "events_ack_admin", "admin")
+    user = await register_and_login(aiohttp_client, "events_ack_user")
+    await add_product_to_cart(aiohttp_client, admin["access_token"], user["access_token"])
+    await outbox_relay.publish_batch(test_session)
+
+    resp = await aiohttp_client.get(f"{EVENTS_PREFIX}/", headers=bearer(admin["access_token"]))
+    events = await resp.json()
+    head = events[-1]["published_seq"]
+    consumer = f"warehouse_{uuid.uuid4().hex[:8]}"
+
+    resp = await aiohttp_client.get(
+        f"{EVENTS_PREFIX}/consumers/{consumer}", headers=bearer(admin["access_token"])
+    )
+    assert resp.status == 404
+
+    resp = await aiohttp_client.post(
+        f"{EVENTS_PREFIX}/consumers/{consumer}/ack", json={"seq": head},
+        headers=bearer(admin["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+    data = await resp.json()
+    assert data["last_seq"] == head
+    assert data["lag"] == 0
+
+    # запоздалый ack не откатывает позицию назад
+    resp = await aiohttp_client.post(
+        f"{EVENTS_PREFIX}/consumers/{consumer}/ack", json={"seq": events[0]["published_seq"]},
+        headers=bearer(admin["access_token"])
+    )
+    assert resp.status == 200
+    assert (await resp.json())["last_seq"] == head
+
+    resp = await aiohttp_client.post(
+        f"{EVENTS_PREFIX}/consumers/{consumer}/ack", json={"seq": head + 1},
+        headers=bearer(admin["access_token"])
+    )
+    assert resp.status == 400
+
+
+@pytest.mark.asyncio
+async def test_published_seq_keeps_growing_after_cleanup(test_session, monkeypatch):
+    from app.events.outbox import record_event
+    from app.events.repository import EventRepository
+
+    record_event(test_session, "cart", uuid.uuid4(), "cart.created")
+    await test_session.commit()
+    assert await outbox_relay.publish_batch(test_session) == 1
+    repo = EventRepository(test_session)
+    first_seq = await repo.get_head_seq()
+
+    # очистка удаляет все опубликованные события
+    monkeypatch.setattr(outbox_relay.config, "retention_hours", 0)
+    assert await outbox_relay.cleanup(test_session) >= 1
+    assert await repo.get_visible_seq() == 0
+    # голова берётся из последовательности: ack и догрузка SSE не видят отката
+    assert await repo.get_head_seq() == first_seq
+
+    record_event(test_session, "cart", uuid.uuid4(), "cart.created")
+    await test_session.commit()
+    assert await outbox_relay.publish_batch(test_session) == 1
+
+    # потребитель с last_seq = first_seq видит новое событие
+    events = await repo.get_events_after(first_seq, 10)
+    assert len(events) == 1
+    assert events[0].published_seq > first_seq
+    assert await repo.get_head_seq() == events[0].published_seq
+
+
+@pytest.mark.asyncio
+async def test_listener_retries_when_listen_fails(monkeypatch):
+    import asyncio
+    from app.events import listener as listener_module
+
+    class FakeConnection:
+        def __init__(self, fail: bool):
+            self.fail = fail
+            self.terminated = False
+
+        def add_termination_listener(self, callback) -> None:
+            pass
+
+        async def add_listener(self, channel, callback) -> None:
+            if self.fail:
+                raise OSError("connection reset during LISTEN")
+            listening.set()
+
+        def terminate(self) -> None:
+            self.terminated = True
+
+        async def close(self) -> None:
+            pass
+
+    listening = asyncio.Event()
+    connections = [FakeConnection(fail=True), FakeConnection(fail=False)]
+    attempts = iter(connections)
+
+    async def connect():
+        return next(attempts)
+
+    monkeypatch.setattr(listener_module, "RECONNECT_MIN_SECONDS", 0.01)
+    listener = listener_module.OutboxListener()
+    monkeypatch.setattr(listener, "_connect", connect)
+
+    task = asyncio.create_task(listener._run())
+    try:
+        await asyncio.wait_for(listening.wait(), timeout=1)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert connections[0].terminated
+    assert not connections[1].terminated
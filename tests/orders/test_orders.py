@@ -235,4 +235,404 @@ async def test_get_orders_stats_admin_ok_200(aiohttp_client):
     
     data = await resp.json()
     assert "count" in data
-    assert isinstance(data["count"], int)
\ No newline at end of file
+    assert isinstance(data["count"], int)
+
+
+@pytest.mark.asyncio
+async def test_stream_my_orders_requires_auth_401(aiohttp_client):
+    """Тест: поток статусов заказов требует авторизации"""
+    resp = await aiohttp_client.get(f"{ORDERS_PREFIX}/orders/my/stream")
+
+    assert resp.status == 401, await resp.text()
+
+
+@pytest.mark.asyncio
+async def test_order_stream_resumes_from_last_event_id(test_session):
+    """Тест: по Last-Event-ID приходят пропущенные события только своего пользователя"""
+    from app.events.outbox import record_event
+    from app.events.relay import outbox_relay
+    from app.events.repository import EventRepository
+    from app.orders.stream import order_status_stream
+
+    user_id, other_user_id, order_id = uuid4(), uuid4(), uuid4()
+    record_event(test_session, "order", order_id, "order.created",
+                 {"user_id": str(user_id), "status": "pending"})
+    record_event(test_session, "order", uuid4(), "order.status_changed",
+                 {"user_id": str(other_user_id), "status": "shipped"})
+    record_event(test_session, "order", order_id, "order.status_changed",
+                 {"user_id": str(user_id), "status": "processing"})
+    await test_session.commit()
+    assert await outbox_relay.publish_batch(test_session) == 3
+
+    repo = EventRepository(test_session)
+    events = await repo.get_events_after(0, 10, "order")
+    created, changed = events[0], events[2]
+
+    async def connected() -> bool:
+        return False
+
+    stream = order_status_stream(repo, user_id, created.published_seq, connected)
+    try:
+        assert (await stream.__anext__()).startswith("retry:")
+        backfill = await stream.__anext__()
+    finally:
+        await stream.aclose()
+
+    assert f"id: {changed.published_seq}\n" in backfill
+    assert "event: order.status_changed" in backfill
+    assert '"status":"processing"' in backfill
+    assert "shipped" not in backfill
+    assert f"id: {created.published_seq}\n" not in backfill
+
+
+@pytest.mark.asyncio
+async def test_order_stream_releases_session_without_last_event_id(test_session):
+    """Тест: живой поток без Last-Event-ID не держит транзакцию сессии запроса"""
+    import asyncio
+    from sqlalchemy import select
+    from app.events.repository import EventRepository
+    from app.orders.stream import order_status_stream
+
+    # как после проверки токена: транзакция сессии уже открыта
+    await test_session.execute(select(1))
+    assert test_session.in_transaction()
+
+    async def connected() -> bool:
+        return False
+
+    stream = order_status_stream(EventRepository(test_session), uuid4(), None, connected)
+    assert (await stream.__anext__()).startswith("retry:")
+    waiting = asyncio.create_task(stream.__anext__())
+    try:
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        assert not test_session.in_transaction()
+    finally:
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_my_orders_keyset_pages_without_items(aiohttp_client, test_session):
+    """Тест: история заказов листается курсором, строки без позиций, с items_count"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import select
+    from app.orders.models import Order, OrderItem
+    from app.catalog.models import Product
+    from app.users.models import User
+
+    user_info, user_tokens = await register_and_login(aiohttp_client, "history_user")
+    user = (await test_session.execute(
+        select(User).where(User.login == user_info["login"])
+    )).scalar_one()
+    product = Product(name="История", price=10)
+    test_session.add(product)
+
+    # одинаковый created_at у двух заказов: порядок внутри - по id
+    base = datetime(2026, 1, 1)
+    created = [base, base + timedelta(days=1), base + timedelta(days=1), base + timedelta(days=2), base + timedelta(days=3)]
+    orders = []
+    for index, created_at in enumerate(created):
+        order = Order(id=uuid4(), user_id=user.id, shipping_address="ул. Тестовая, 1",
+                      phone_number="+79991234567", total_amount=10.0 * index, created_at=created_at)
+        order.items = [OrderItem(product=product, quantity=1, price_at_time=10.0, product_name="История")
+                       for _ in range(index)]
+        orders.append(order)
+    test_session.add_all(orders)
+    await test_session.commit()
+    expected = [o.id for o in sorted(orders, key=lambda o: (o.created_at, o.id), reverse=True)]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = await aiohttp_client.get(
+            f"{ORDERS_PREFIX}/orders/my", params=params, headers=bearer(user_tokens["access_token"])
+        )
+        assert resp.status == 200, await resp.text()
+        page = await resp.json()
+        assert all("items" not in row for row in page)
+        seen.extend(page)
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert [row["id"] for row in seen] == [str(order_id) for order_id in expected]
+    counts = {row["id"]: row["items_count"] for row in seen}
+    assert counts == {str(o.id): len(o.items) for o in orders}
+
+    resp = await aiohttp_client.get(
+        f"{ORDERS_PREFIX}/orders/my", params={"cursor": "not-a-cursor"},
+        headers=bearer(user_tokens["access_token"])
+    )
+    assert resp.status == 400, await resp.text()
+
+
+@pytest.mark.asyncio
+async def test_admin_order_search_combines_filters(aiohttp_client, test_session):
+    """Тест: поиск заказов по периоду, покупателю, статусу, товару, телефону и адресу"""
+    from datetime import datetime
+    from sqlalchemy import select
+    from app.orders.models import Order, OrderItem, OrderStatus
+    from app.catalog.models import Product
+    from app.users.models import User
+
+    admin_info, admin_tokens = await register_and_login(aiohttp_client, "search_admin", "admin")
+    user_info, user_tokens = await register_and_login(aiohttp_client, "search_user")
+    user = (await test_session.execute(
+        select(User).where(User.login == user_info["login"])
+    )).scalar_one()
+    wanted, other = Product(name="Искомый", price=5), Product(name="Другой", price=5)
+    test_session.add_all([wanted, other])
+
+    def make_order(phone, address, status, created_at, product):
+        order = Order(id=uuid4(), user_id=user.id, shipping_address=address, phone_number=phone,
+                      status=status, created_at=created_at)
+        order.items = [OrderItem(product=product, quantity=1, price_at_time=5.0, product_name=product.name)]
+        return order
+
+    march = make_order("+79001112233", "Москва, ул. Ленина, 100%", OrderStatus.PENDING, datetime(2026, 3, 5), wanted)
+    april = make_order("+79004445566", "Казань, ул. Баумана, 7", OrderStatus.SHIPPED, datetime(2026, 4, 5), other)
+    may = make_order("+79001119999", "Москва, ул. Тверская, 1", OrderStatus.PENDING, datetime(2026, 5, 5), other)
+    test_session.add_all([march, april, may])
+    await test_session.commit()
+
+    async def search(**params):
+        resp = await aiohttp_client.get(
+            f"{ORDERS_PREFIX}/orders/search", params={"user_id": str(user.id), **params},
+            headers=bearer(admin_tokens["access_token"])
+        )
+        assert resp.status == 200, await resp.text()
+        return [row["id"] for row in await resp.json()]
+
+    assert await search() == [str(may.id), str(april.id), str(march.id)]
+    assert await search(phone="00111") == [str(may.id), str(march.id)]
+    assert await search(address="Москва", status="pending") == [str(may.id), str(march.id)]
+    assert await search(address="100%") == [str(march.id)]
+    assert await search(address="0%") == [str(march.id)]
+    assert await search(product_id=str(wanted.id)) == [str(march.id)]
+    assert await search(created_from="2026-04-01T00:00:00", created_to="2026-05-05T00:00:00") == [str(april.id)]
+    assert await search(phone="00111", created_from="2026-04-01T00:00:00") == [str(may.id)]
+
+    resp = await aiohttp_client.get(
+        f"{ORDERS_PREFIX}/orders/search", params={"phone": "001"},
+        headers=bearer(user_tokens["access_token"])
+    )
+    assert resp.status == 403, await resp.text()
+
+
+@pytest.mark.asyncio
+async def test_orders_land_in_month_partition_and_detach(test_session):
+    """Тест: заказ и позиции попадают в партицию месяца, DETACH убирает их из выборок"""
+    from datetime import date, datetime
+    from sqlalchemy import text
+    from app.orders.models import Order, OrderItem
+    from app.orders.partitions import ensure_partitions, detach_partitions, new_order_id
+    from app.orders.repository import OrderRepository
+    from app.catalog.models import Product
+    from app.users.models import User
+
+    assert await ensure_partitions(test_session, date(2024, 1, 1), date(2024, 2, 1)) == [
+        "orders_2024_01", "orders_2024_02", "order_items_2024_01", "order_items_2024_02",
+    ]
+
+    user = User(first_name="Part", last_name="Ition", login=f"partition_{uuid4().hex[:8]}", password_hash="x")
+    product = Product(name="Архивный", price=1)
+    created_at = datetime(2024, 1, 15, 12, 30, 45, 123456)
+    order = Order(id=new_order_id(created_at), created_at=created_at, user=user,
+                  shipping_address="ул. Тестовая, 1", phone_number="+79991234567")
+    order.items = [OrderItem(product=product, quantity=1, price_at_time=1.0, product_name="Архивный")]
+    test_session.add_all([user, product, order])
+    await test_session.commit()
+
+    async def count(table: str) -> int:
+        return (await test_session.execute(text(f"SELECT count(*) FROM {table}"))).scalar_one()
+
+    assert await count("orders_2024_01") == 1
+    assert await count("order_items_2024_01") == 1
+
+    repo = OrderRepository(test_session)
+    test_session.expunge_all()
+    found = await repo.get_order_by_id(order.id)
+    assert found is not None and len(found.items) == 1
+
+    assert await detach_partitions(test_session, date(2024, 2, 1)) == ["order_items_2024_01", "orders_2024_01"]
+    test_session.expunge_all()
+    assert await repo.get_order_by_id(order.id) is None
+    # отсоединённая таблица остаётся со всеми строками
+    assert await count("orders_2024_01") == 1
+
+
+@pytest.mark.asyncio
+async def test_partition_takes_rows_from_default(test_session, session_factory, monkeypatch):
+    """Тест: строки месяца из DEFAULT переносятся в новую партицию, ошибка месяца не мешает остальным"""
+    from datetime import date, datetime
+    from sqlalchemy import text
+    from app.orders.models import Order, OrderItem
+    from app.orders.partitions import PartitionMaintainer, ensure_partitions, new_order_id
+    from app.catalog.models import Product
+    from app.users.models import User
+
+    user = User(first_name="Def", last_name="Ault", login=f"default_{uuid4().hex[:8]}", password_hash="x")
+    product = Product(name="Будущий", price=1)
+    created_at = datetime(2031, 3, 10, 9, 0, 0)
+    order = Order(id=new_order_id(created_at), created_at=created_at, user=user,
+                  shipping_address="ул. Тестовая, 1", phone_number="+79991234567")
+    order.items = [OrderItem(product=product, quantity=1, price_at_time=1.0, product_name="Будущий")]
+    test_session.add_all([user, product, order])
+    await test_session.commit()
+
+    async def count(table: str) -> int:
+        return (await test_session.execute(text(f"SELECT count(*) FROM {table}"))).scalar_one()
+
+    assert await count("orders_default") >= 1
+
+    assert await ensure_partitions(test_session, date(2031, 3, 1), date(2031, 3, 1)) == [
+        "orders_2031_03", "order_items_2031_03",
+    ]
+    await test_session.commit()
+    assert await count("orders_2031_03") == 1
+    assert await count("order_items_2031_03") == 1
+    in_default = await test_session.execute(
+        text("SELECT count(*) FROM orders_default WHERE id = :id"), {"id": order.id}
+    )
+    assert in_default.scalar_one() == 0
+
+    # ошибка одного месяца не мешает следующим
+    from app.orders import partitions
+    ensure_month = partitions.ensure_month_partitions
+
+    async def failing(conn, month):
+        if month == date(2031, 5, 1):
+            raise RuntimeError("boom")
+        return await ensure_month(conn, month)
+
+    monkeypatch.setattr(partitions, "ensure_month_partitions", failing)
+    maintainer = PartitionMaintainer(session_factory)
+    monkeypatch.setattr(maintainer.config, "partition_premake_months", 2)
+    monkeypatch.setattr(maintainer.config, "partition_retention_months", 0)
+    created, detached = await maintainer.run_once(date(2031, 4, 15))
+    assert created == ["orders_2031_04", "order_items_2031_04", "orders_2031_06", "order_items_2031_06"]
+    assert detached == []
+
+
+@pytest.mark.asyncio
+async def test_archived_orders_served_from_archive(aiohttp_client, test_session, tmp_path, monkeypatch):
+    """Тест: старые выполненные заказы уходят в архив, детали и поиск находят их там"""
+    from datetime import datetime
+    from sqlalchemy import select
+    from app.core.config import settings
+    from app.orders.archive import archive_orders, order_archive
+    from app.orders.models import Order, OrderItem, OrderStatus
+    from app.orders.repository import OrderRepository
+    from app.catalog.models import Product
+    from app.users.models import User
+
+    monkeypatch.setattr(settings.orders, "archive_dir", str(tmp_path))
+    admin_info, admin_tokens = await register_and_login(aiohttp_client, "archive_admin", "admin")
+    user_info, user_tokens = await register_and_login(aiohttp_client, "archive_user")
+    other_info, other_tokens = await register_and_login(aiohttp_client, "archive_other")
+    user = (await test_session.execute(
+        select(User).where(User.login == user_info["login"])
+    )).scalar_one()
+    product = Product(name="Старый товар", price=7)
+    test_session.add(product)
+
+    def make_order(status, created_at, address):
+        order = Order(id=uuid4(), user_id=user.id, shipping_address=address, phone_number="+79005556677",
+                      status=status, created_at=created_at, total_amount=14.0)
+        order.items = [OrderItem(product=product, quantity=2, price_at_time=7.0, product_name=product.name)]
+        return order
+
+    delivered = make_order(OrderStatus.DELIVERED, datetime(2024, 2, 10), "Самара, ул. Архивная, 1")
+    pending = make_order(OrderStatus.PENDING, datetime(2024, 2, 11), "Самара, ул. Текущая, 2")
+    recent = make_order(OrderStatus.DELIVERED, datetime(2026, 5, 1), "Самара, ул. Новая, 3")
+    test_session.add_all([delivered, pending, recent])
+    await test_session.commit()
+
+    repo = OrderRepository(test_session)
+    test_session.expunge_all()
+    assert await archive_orders(repo, order_archive, datetime(2025, 1, 1), 10) == 1
+    test_session.expunge_all()
+    assert await repo.get_order_by_id(delivered.id) is None
+    assert await repo.get_order_by_id(pending.id) is not None
+    assert await archive_orders(repo, order_archive, datetime(2025, 1, 1), 10) == 0
+
+    resp = await aiohttp_client.get(
+        f"{ORDERS_PREFIX}/orders/my/{delivered.id}", headers=bearer(user_tokens["access_token"])
+    )
+    assert resp.status == 200, await resp.text()
+    data = await resp.json()
+    assert data["status"] == "delivered"
+    assert [(item["quantity"], item["subtotal"]) for item in data["items"]] == [(2, 14.0)]
+
+    resp = await aiohttp_client.get(
+        f"{ORDERS_PREFIX}/orders/my/{delivered.id}", headers=bearer(other_tokens["access_token"])
+    )
+    assert resp.status == 404, await resp.text()
+
+    async def search(**params):
+        resp = await aiohttp_client.get(
+            f"{ORDERS_PREFIX}/orders/search", params={"user_id": str(user.id), **params},
+            headers=bearer(admin_tokens["access_token"])
+        )
+        assert resp.status == 200, await resp.text()
+        return resp, [row["id"] for row in await resp.json()]
+
+    _, ids = await search()
+    assert ids == [str(recent.id), str(pending.id), str(delivered.id)]
+    _, ids = await search(address="архивная")
+    assert ids == [str(delivered.id)]
+    _, ids = await search(product_id=str(product.id), status="delivered")
+    assert ids == [str(recent.id), str(delivered.id)]
+    _, ids = await search(status="pending")
+    assert ids == [str(pending.id)]
+
+    # курсор проходит через границу базы и архива
+    resp, ids = await search(limit=2)
+    assert ids == [str(recent.id), str(pending.id)]
+    _, ids = await search(limit=2, cursor=resp.headers["X-Next-Cursor"])
+    assert ids == [str(delivered.id)]
+
+
+@pytest.mark.asyncio
+async def test_search_reads_archive_only_when_page_may_reach_it(monkeypatch):
+    """Тест: полная страница новее границы архива собирается без чтения архива"""
+    from datetime import datetime, timedelta
+    from types import SimpleNamespace
+    from app.core.config import settings
+    from app.orders.service import OrderService
+
+    now = datetime.utcnow()
+    rows = [
+        SimpleNamespace(id=uuid4(), user_id=uuid4(), status="delivered", total_amount=1.0, items_count=1,
+                        shipping_address="-", phone_number="-", notes=None, ordered_at=now,
+                        created_at=now - timedelta(days=n), updated_at=now)
+        for n in range(3)
+    ]
+
+    class Repo:
+        async def search_orders(self, limit, cursor, **filters):
+            return rows[:limit]
+
+    class Archive:
+        calls = 0
+
+        async def search_orders(self, limit, cursor, **filters):
+            Archive.calls += 1
+            return []
+
+    monkeypatch.setattr(settings.orders, "archive_after_days", 30)
+    service = OrderService(Repo(), None, archive=Archive(), cart_store=object())
+
+    assert OrderService._archive_may_fill(rows, 3)
+    assert not OrderService._archive_may_fill(rows, 1)
+    await service.search_orders(limit=1)
+    assert Archive.calls == 0
+    # неполная страница - недостающее может лежать в архиве
+    await service.search_orders(limit=5)
+    assert Archive.calls == 1
+    # страница уходит старше границы архива
+    rows[-1].created_at = now - timedelta(days=31)
+    await service.search_orders(limit=2)
+    assert Archive.calls == 2
@@ -202,3 +202,32 @@ async def test_delete_promotion_as_admin_ok_200(aiohttp_client):
     # Проверяем, что акция удалена
     get_resp = await aiohttp_client.get(f"{PROMOTIONS_PREFIX}/{promo['id']}")
     assert get_resp.status == 404, await get_resp.text()
+
+
+@pytest.mark.asyncio
+async def test_promotion_boundaries_expire_and_schedule(test_session):
+    """Планировщик: выключение закончившихся акций, пересечённые границы и следующая граница."""
+    from app.promotions.models import Promotion
+    from app.promotions.repository import PromotionRepository
+
+    now = datetime.utcnow()
+    ended = Promotion(title="Закончилась", discount_percent=5,
+                      starts_at=now - timedelta(days=2), ends_at=now - timedelta(minutes=1))
+    started = Promotion(title="Началась", discount_percent=10,
+                        starts_at=now - timedelta(minutes=1), ends_at=now + timedelta(hours=2))
+    upcoming = Promotion(title="Скоро", discount_percent=15,
+                         starts_at=now + timedelta(hours=1), ends_at=now + timedelta(days=1))
+    disabled = Promotion(title="Выключена", discount_percent=20, is_active=False,
+                         starts_at=now - timedelta(minutes=1), ends_at=now + timedelta(minutes=30))
+    test_session.add_all([ended, started, upcoming, disabled])
+    await test_session.commit()
+
+    repo = PromotionRepository(test_session)
+    crossed = await repo.get_crossed_promotion_ids(now - timedelta(minutes=5), now)
+    assert set(crossed) == {ended.id, started.id}
+
+    assert await repo.expire_promotions(now) == [ended.id]
+    await test_session.commit()
+    assert {p.id for p in await repo.get_active_promotions()} == {started.id}
+    # выключенная вручную акция границ не задаёт
+    assert await repo.get_next_boundary(now) == upcoming.starts_at
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, text
+
+from app.cart.tasks import CART_REPRICE
+from app.catalog.models import Product
+from app.core.tasks import BackgroundTask
+from app.promotions.models import Promotion, PromotionProduct
+from app.promotions.repository import PromotionRepository
+from app.promotions.scheduler import PromotionScheduler
+
+
+async def repriced_product_ids(session) -> list[set[str]]:
+    result = await session.execute(
+        select(BackgroundTask.payload).where(BackgroundTask.name == CART_REPRICE)
+    )
+    return [set(payload["product_ids"]) for payload in result.scalars()]
+
+
+@pytest.mark.asyncio
+async def test_run_once_processes_boundaries_since_shared_watermark(
+        test_session, test_engine, session_factory, monkeypatch):
+    """Тест: начала и окончания акций с отметки в базе обрабатывает тот, кто взял блокировку"""
+    from app.promotions import scheduler as scheduler_module
+
+    now = datetime.utcnow()
+    started_product, ended_product, running_product = (Product(name=name, price=10) for name in ("А", "Б", "В"))
+    started = Promotion(title="Началась", discount_percent=10,
+                        starts_at=now - timedelta(minutes=30), ends_at=now + timedelta(days=1))
+    ended = Promotion(title="Закончилась", discount_percent=10,
+                      starts_at=now - timedelta(days=2), ends_at=now - timedelta(minutes=10))
+    running = Promotion(title="Идёт", discount_percent=10,
+                        starts_at=now - timedelta(days=2), ends_at=now + timedelta(days=2))
+    test_session.add_all([started_product, ended_product, running_product, started, ended, running])
+    await test_session.flush()
+    test_session.add_all([
+        PromotionProduct(promotion_id=started.id, product_id=started_product.id),
+        PromotionProduct(promotion_id=ended.id, product_id=ended_product.id),
+        PromotionProduct(promotion_id=running.id, product_id=running_product.id),
+    ])
+    # прошлый проход был час назад, затем - простой
+    await PromotionRepository(test_session).set_scheduler_watermark(now - timedelta(hours=1))
+    await test_session.commit()
+
+    invalidated = []
+    monkeypatch.setattr(scheduler_module.response_cache, "invalidate", lambda *prefixes: invalidated.append(prefixes))
+
+    # блокировку держит другой процесс: кэш своего процесса сбрасывается, остальное - нет
+    async with test_engine.connect() as other:
+        await other.execute(text("SELECT pg_advisory_lock(:key)"), {"key": PromotionScheduler.LOCK_KEY})
+        loser = PromotionScheduler(session_factory)
+        await loser.run_once(now - timedelta(hours=1))
+        await loser.run_once(now)
+        await other.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PromotionScheduler.LOCK_KEY})
+    assert invalidated == [("promotions:", "catalog:")]
+    assert await repriced_product_ids(test_session) == []
+    assert await PromotionRepository(test_session).get_scheduler_watermark() == now - timedelta(hours=1)
+
+    # процесс после перезапуска: свой промежуток пуст, но отметка в базе час назад
+    winner = PromotionScheduler(session_factory)
+    assert await winner.run_once(now + timedelta(seconds=1)) == started.ends_at
+    assert await repriced_product_ids(test_session) == [{str(started_product.id), str(ended_product.id)}]
+    refreshed = await test_session.execute(
+        select(Promotion.is_active).where(Promotion.id == ended.id).execution_options(populate_existing=True)
+    )
+    assert refreshed.scalar_one() is False
+    assert await PromotionRepository(test_session).get_scheduler_watermark() == now + timedelta(seconds=1)
+
+    # следующий проход ничего не повторяет
+    await winner.run_once(now + timedelta(seconds=2))
+    assert len(await repriced_product_ids(test_session)) == 1